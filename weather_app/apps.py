@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class WeatherAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'weather_app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save
+        from weather_app.models import HourlyWeatherData
+        from weather_app.services.instrumentation import install_query_counter
+        from weather_app.services.model_handler import ModelHandler
+
+        # the queries of the sampled requests are timed on every connection, whichever thread opens it
+        connection_created.connect(install_query_counter, dispatch_uid='weather_app_query_counter')
+        # records saved outside ModelHandler leave the daily rollup incomplete
+        post_save.connect(ModelHandler.hourly_weather_data_saved, sender=HourlyWeatherData,
+                          dispatch_uid='weather_app_hourly_weather_data_saved')
@@ -0,0 +1,122 @@
+import json
+
+from django.http import HttpResponse
+from django.views import View
+
+from weather_app.renderers import FastJSONRenderer
+from weather_app.services.async_meteo_api_handler import AsyncMeteoApiHandler
+from weather_app.services.executors import run_sync
+from weather_app.services.geocoding_cache import geocoding_cache
+from weather_app.services.ingestion_handler import INGESTION_MODES
+from weather_app.views import WeatherController
+
+
+class AsyncWeatherController(View):
+    """
+    Async version of WeatherController for an ASGI server. The ingestion awaits its Open Meteo requests on the
+    async HTTP client instead of blocking a thread, the ORM work runs in the executor threads. The statistics,
+    batch, stream and background requests run the WeatherController in the executor threads.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.controller = WeatherController()
+        self.messages = self.controller.messages
+        self.meteo_api_handler = AsyncMeteoApiHandler(self.messages, geocoding_cache=geocoding_cache)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # no session authentication, the same as the APIView of WeatherController
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request, type=None):
+        try:
+            parameters = json.loads(request.body or b'{}')
+        except ValueError as e:
+            self.messages.append(f'error : Invalid parameters {e}')
+            return self.respond(None, 400)
+        # any stream or background value but false is answered, or rejected, by the WeatherController
+        if type == 'batch' or not isinstance(parameters, dict) or parameters.get('stream', False) is not False or \
+                parameters.get('background', False) is not False:
+            return await run_sync(self.run_controller, request, type)
+
+        status = 200
+        start_date = None
+        end_date = None
+        city_name = None
+        try:
+            start_date = parameters['start_date']
+            if start_date is None:
+                self.messages.append('error : start_date is null')
+                status = 400
+            end_date = parameters['end_date']
+            if end_date is None:
+                self.messages.append('error : end_date is null')
+                status = 400
+            city_name = parameters['city_name']
+            if city_name is None:
+                self.messages.append('error : city_name is null')
+                status = 400
+        except Exception as e:
+            self.messages.append(f'error : Invalid parameters {e}')
+            status = 400
+
+        mode = parameters.get('mode', 'insert')
+        update_changed = self.controller.get_flag(parameters, 'update_changed')
+        if mode not in INGESTION_MODES:
+            self.messages.append(f'error : Invalid mode {mode}')
+            status = 400
+        if update_changed is None:
+            status = 400
+        if status != 200:
+            return self.respond(None, status)
+        counts_only = parameters.get('response_format', 'rows') == 'counts'
+
+        ingestion_handler = self.controller.ingestion_handler
+        coordinates = await self.meteo_api_handler.get_coordinates(city_name=city_name)
+        if not coordinates:
+            self.messages.append('No coordinates for city name')
+            return self.respond(None, status)
+        date_ranges = await run_sync(ingestion_handler.get_date_ranges, city_name, start_date, end_date,
+                                     mode, update_changed)
+        temperatures, precipitations, times = await self.meteo_api_handler.get_hourly_weather_data_for_ranges(
+            latitude=coordinates['lat'],
+            longitude=coordinates['lon'],
+            date_ranges=date_ranges)
+        location_model, hourly_weather_data_models, updated_models = await run_sync(
+            ingestion_handler.store,
+            city_name=city_name,
+            coordinates=coordinates,
+            temperatures=temperatures,
+            precipitations=precipitations,
+            times=times,
+            mode=mode,
+            update_changed=update_changed
+        )
+        result_data = await run_sync(self.controller.ingestion_result_data, location_model,
+                                     hourly_weather_data_models, updated_models, mode, counts_only)
+        return self.respond(result_data, status)
+
+    async def get(self, request, type, job_id=None):
+        return await run_sync(self.run_controller, request, type, job_id)
+
+    def run_controller(self, request, type=None, job_id=None):
+        """
+        Answers the request with the synchronous WeatherController, rendered in the calling thread.
+        :param request:
+        :param type:
+        :param job_id:
+        :return:
+        """
+        kwargs = {'type': type} if job_id is None else {'type': type, 'job_id': job_id}
+        return WeatherController.as_view()(request, **kwargs).render()
+
+    def respond(self, result_data, status):
+        response = {
+            'message': self.messages,
+            'status': status,
+            'result_data': result_data
+        }
+        return HttpResponse(FastJSONRenderer().render(response), status=status, content_type='application/json')
@@ -0,0 +1,4 @@
+"""
+Standalone performance benchmarks for the weather_app. They are not collected by pytest, run them as modules:
+python -m weather_app.benchmarks.<benchmark>
+"""
@@ -0,0 +1,92 @@
+"""
+Compares the ingestion throughput of the WSGI view, served by a fixed pool of worker threads, against the
+ASGI view awaiting its Open Meteo requests, under concurrent requests for distinct cities against the stub
+upstream with latency.
+python -m weather_app.benchmarks.bench_asgi --requests 64 --workers 8 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.benchmarks.utils import setup_django, benchmark_database, timer
+
+
+def request_body(index: int, mode: str):
+    return json.dumps({'start_date': '2025-10-01', 'end_date': '2025-10-07', 'city_name': f'{mode}-{index}',
+                       'response_format': 'counts'})
+
+
+def run_wsgi(requests: int, workers: int):
+    from django.test import Client
+
+    def post(index):
+        client = Client(raise_request_exception=False)
+        return client.post('/weather_app/weather_data/', data=request_body(index, 'wsgi'),
+                           content_type='application/json').status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(post, range(requests)))
+
+
+def run_asgi(requests: int):
+    from django.test import AsyncClient
+
+    async def post(index):
+        response = await AsyncClient().post('/weather_app/async/weather_data/', data=request_body(index, 'asgi'),
+                                            content_type='application/json')
+        return response.status_code
+
+    async def post_all():
+        return await asyncio.gather(*(post(index) for index in range(requests)))
+
+    return asyncio.run(post_all())
+
+
+def run(requests: int, workers: int, latency: float):
+    from django.test import override_settings
+    from weather_app.services.geocoding_cache import geocoding_cache
+
+    result = dict()
+    statuses = dict()
+    with StubUpstream(latency=latency) as upstream, \
+            override_settings(OPEN_METEO_GEOCODING_URL=upstream.geocoding_url,
+                              OPEN_METEO_ARCHIVE_URL=upstream.archive_url):
+        geocoding_cache.clear()
+        with timer(result, 'wsgi'):
+            statuses['wsgi'] = run_wsgi(requests, workers)
+        with timer(result, 'asgi'):
+            statuses['asgi'] = run_asgi(requests)
+    return result, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=8, help='worker threads of the WSGI server')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds of every upstream answer')
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.db import connection
+    if connection.vendor == 'sqlite':
+        # concurrent ingestions wait for the sqlite write lock instead of failing at once. Before Django 5.1
+        # transactions can't start IMMEDIATE and some of them fail on sqlite, PostgreSQL has no such limit
+        options = connection.settings_dict.setdefault('OPTIONS', {})
+        options['timeout'] = 60
+        if django.VERSION >= (5, 1):
+            options['transaction_mode'] = 'IMMEDIATE'
+    with benchmark_database():
+        result, statuses = run(args.requests, args.workers, args.latency)
+
+    for mode, seconds in result.items():
+        failed = sum(status != 200 for status in statuses[mode])
+        print(f'{mode:>8}: {args.requests} requests in {seconds:.3f}s -> '
+              f'{args.requests / seconds:,.1f} requests/s, {failed} failed')
+    print(f'{"speedup":>8}: x{result["wsgi"] / result["asgi"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
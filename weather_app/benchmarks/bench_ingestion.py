@@ -0,0 +1,56 @@
+"""
+Compares the hourly weather data ingestion throughput of the row by row insert against the bulk insert.
+python -m weather_app.benchmarks.bench_ingestion --hours 8760
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from weather_app.benchmarks.utils import setup_django, benchmark_database, rows_per_second, timer
+
+
+def build_columns(hours: int, start: datetime = datetime(2024, 1, 1)):
+    times = [(start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M') for i in range(hours)]
+    temperatures = [round(15 + 10 * ((i % 24) - 12) / 12, 1) for i in range(hours)]
+    precipitations = [0.2 if i % 17 == 0 else 0.0 for i in range(hours)]
+    return temperatures, precipitations, times
+
+
+def run(hours: int, batch_size: int):
+    from weather_app.services.model_handler import ModelHandler
+
+    temperatures, precipitations, times = build_columns(hours)
+    result = dict()
+    messages = list()
+    handler = ModelHandler(messages)
+
+    row_location = handler.insert_location('RowByRow', 40.0, -3.0)
+    with timer(result, 'row_by_row'):
+        for i in range(hours):
+            handler.insert_hourly_weather_data(temperatures[i], precipitations[i], times[i], row_location)
+
+    bulk_location = handler.insert_location('Bulk', 41.0, -4.0)
+    with timer(result, 'bulk'):
+        handler.insert_hourly_weather_data_bulk(temperatures, precipitations, times, bulk_location,
+                                                batch_size=batch_size)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=int, default=8760)
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--in-memory', action='store_true', help='use an in-memory sqlite database')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database(in_memory=args.in_memory):
+        result = run(args.hours, args.batch_size)
+
+    for mode, seconds in result.items():
+        print(f'{mode:>12}: {args.hours} rows in {seconds:.3f}s -> '
+              f'{rows_per_second(args.hours, seconds):,.0f} rows/s')
+    print(f'{"speedup":>12}: x{result["row_by_row"] / result["bulk"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares the general statistics of a large series of several locations computed in the request thread against
+the statistics process pool, and the latency of the small requests served by another thread meanwhile.
+python -m weather_app.benchmarks.bench_processes --rows 1000000 4000000 --locations 16 --processes 4
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from weather_app.benchmarks.utils import setup_django, benchmark_database, timer
+
+
+def small_request_latencies(handler, series, stop: threading.Event):
+    """
+    Calculates the temperature statistics of a small series again and again until stop is set.
+    :param handler:
+    :param series:
+    :param stop:
+    :return: list of seconds of every calculation
+    """
+    latencies = list()
+    while not stop.is_set():
+        start = time.perf_counter()
+        handler.calculate_temperature_statistics(series, 30, 0)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(rows: int, locations: int):
+    from weather_app.benchmarks.bench_statistics import build_data
+    from weather_app.models import Location
+    from weather_app.services.columnar_storage import HourlySeries
+    from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+    from weather_app.services.process_statistics_handler import ProcessStatisticsHandler
+
+    location_ids = [Location.objects.create(locality=f'Location {i}', lat=40.0, long=-3.0).id
+                    for i in range(locations)]
+    _, series = build_data(rows, location_ids)
+    small = HourlySeries(*(column[:24 * 7] for column in (series.location_ids, series.times, series.temperatures,
+                                                          series.precipitations)))
+    handlers = {'thread': NumpyStatisticsHandler([]), 'processes': ProcessStatisticsHandler([], min_rows=1)}
+    # the processes are spawned by the first calculation, not measured
+    handlers['processes'].calculate_precipitation_statistics(small)
+
+    result, answers, latencies = dict(), dict(), dict()
+    for mode, handler in handlers.items():
+        stop = threading.Event()
+        background = dict()
+        thread = threading.Thread(target=lambda: background.update(
+            latencies=small_request_latencies(NumpyStatisticsHandler([]), small, stop)))
+        thread.start()
+        with timer(result, mode):
+            answers[mode] = json.dumps(handler.calculate_general_statistics(series, 0, 30), default=float)
+        stop.set()
+        thread.join()
+        latencies[mode] = background['latencies']
+    Location.objects.all().delete()
+    return result, latencies, answers['thread'] == answers['processes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 4000000])
+    parser.add_argument('--locations', type=int, default=16)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.WEATHER_STATISTICS_PROCESSES = args.processes
+    with benchmark_database(in_memory=True):
+        for rows in args.rows:
+            result, latencies, identical = run(rows, args.locations)
+            for mode, seconds in result.items():
+                print(f'{rows:>8} rows {mode:>10}: general statistics in {seconds:.3f}s, small requests meanwhile '
+                      f'{len(latencies[mode])} with median {statistics.median(latencies[mode]) * 1000:.2f}ms '
+                      f'and max {max(latencies[mode]) * 1000:.2f}ms')
+            print(f'{rows:>8} rows {"speedup":>10}: x{result["thread"] / result["processes"]:.1f}, '
+                  f'identical JSON: {identical}')
+
+
+if __name__ == '__main__':
+    main()
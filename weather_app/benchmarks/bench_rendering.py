@@ -0,0 +1,68 @@
+"""
+Compares the rendering time and payload size of the hourly weather data of a POST response: the
+HourlyWeatherDataSerializer with the default JSONRenderer against the lean rows with the fast JSON, columnar
+and CSV renderers, and the same for a temperature statistics payload.
+python -m weather_app.benchmarks.bench_rendering --rows 10000 100000
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from weather_app.benchmarks.utils import setup_django, timer
+
+
+def build_records(rows: int):
+    from weather_app.models import HourlyWeatherData
+
+    start = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    return [HourlyWeatherData(id=i + 1, temperature=round(15 + (i % 24) * 0.35, 1),
+                              precipitation=None if i % 13 == 0 else round((i % 7) * 0.15, 2),
+                              date=start + timedelta(hours=i), location_id=1)
+            for i in range(rows)]
+
+
+def run(rows: int):
+    from rest_framework.renderers import JSONRenderer
+
+    from weather_app.renderers import FastJSONRenderer, ColumnarJSONRenderer, CSVRenderer
+    from weather_app.serializers import HourlyWeatherDataSerializer, hourly_weather_data_rows
+    from weather_app.services.columnar_storage import HourlySeries
+    from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+
+    records = build_records(rows)
+    result, sizes = dict(), dict()
+    with timer(result, 'serializer + json'):
+        data = {'result_data': {'hourly_weather_data': HourlyWeatherDataSerializer(records, many=True).data}}
+        sizes['serializer + json'] = len(JSONRenderer().render(data))
+    for name, renderer in (('rows + fast json', FastJSONRenderer()), ('rows + columnar', ColumnarJSONRenderer()),
+                           ('rows + csv', CSVRenderer())):
+        with timer(result, name):
+            data = {'result_data': {'hourly_weather_data': hourly_weather_data_rows(records)}}
+            sizes[name] = len(renderer.render(data))
+
+    series = HourlySeries(np.ones(rows, dtype=np.int64),
+                          np.array([int(record.date.timestamp()) for record in records], dtype=np.int64),
+                          np.array([record.temperature for record in records], dtype=np.float64),
+                          np.array([record.precipitation for record in records], dtype=np.float64))
+    statistics = {'result_data': NumpyStatisticsHandler([]).calculate_temperature_statistics(series, 30, 0)}
+    for name, renderer in (('statistics json', JSONRenderer()), ('statistics fast json', FastJSONRenderer())):
+        with timer(result, name):
+            sizes[name] = len(renderer.render(statistics))
+    return result, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    setup_django()
+    for rows in args.rows:
+        result, sizes = run(rows)
+        for name, seconds in result.items():
+            print(f'{rows:>8} rows {name:>20}: {seconds * 1000:>9.1f} ms, {sizes[name] / 1024:>9.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
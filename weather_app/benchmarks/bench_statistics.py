@@ -0,0 +1,95 @@
+"""
+Compares the statistics of the pandas calculations (DataFrame built from the records of every request) against
+the numpy engine (arrays of the hourly series) and checks both answer the same JSON.
+python -m weather_app.benchmarks.bench_statistics --rows 1000 100000 1000000
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+from weather_app.benchmarks.utils import setup_django, benchmark_database, rows_per_second, timer
+
+LOCATIONS = 4
+
+
+def build_data(rows: int, location_ids):
+    """
+    Builds the same hourly data as the records the ORM returns and as an HourlySeries, split in locations.
+    :param rows:
+    :param location_ids:
+    :return:
+    """
+    from weather_app.services.columnar_storage import HourlySeries
+
+    generator = np.random.default_rng(0)
+    per_location = rows // len(location_ids)
+    start = int(datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp())
+    times = np.tile(start + np.arange(per_location, dtype=np.int64) * 3600, len(location_ids))
+    series = HourlySeries(np.repeat(np.array(location_ids, dtype=np.int64), per_location), times,
+                          np.round(generator.uniform(-10, 35, len(times)), 1),
+                          np.where(generator.random(len(times)) < 0.2, np.round(generator.uniform(0, 5, len(times)), 2),
+                                   0.0))
+    records = [{'id': i, 'location_id': location_id, 'date': datetime.fromtimestamp(time, timezone.utc),
+                'temperature': temperature, 'precipitation': precipitation}
+               for i, (location_id, time, temperature, precipitation) in
+               enumerate(zip(series.location_ids.tolist(), times.tolist(), series.temperatures.tolist(),
+                             series.precipitations.tolist()))]
+    return records, series
+
+
+def first_location(records, series, location_id):
+    from weather_app.services.columnar_storage import HourlySeries
+
+    selected = series.location_ids == location_id
+    return ([record for record in records if record['location_id'] == location_id],
+            HourlySeries(*(column[selected] for column in (series.location_ids, series.times, series.temperatures,
+                                                           series.precipitations))))
+
+
+def run(rows: int):
+    from weather_app.models import Location
+    from weather_app.services.meteo_api_handler import MeteoApiHandler
+    from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+
+    location_ids = [Location.objects.create(locality=f'Location {i}', lat=40.0, long=-3.0).id
+                    for i in range(LOCATIONS)]
+    records, series = build_data(rows, location_ids)
+    location_records, location_series = first_location(records, series, location_ids[0])
+    engines = {'pandas': (MeteoApiHandler([]), location_records, records),
+               'numpy': (NumpyStatisticsHandler([]), location_series, series)}
+
+    result, answers = dict(), dict()
+    for engine, (handler, location_data, all_data) in engines.items():
+        with timer(result, (engine, 'temperature')):
+            temperature = handler.calculate_temperature_statistics(location_data, 30, 0)
+        with timer(result, (engine, 'precipitation')):
+            precipitation = handler.calculate_precipitation_statistics(location_data)
+        with timer(result, (engine, 'general_statistics')):
+            general_statistics = handler.calculate_general_statistics(all_data, 0, 30)
+        answers[engine] = json.dumps([temperature, precipitation, general_statistics], default=float)
+    Location.objects.all().delete()
+    return result, answers['pandas'] == answers['numpy'], len(location_records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database(in_memory=True):
+        for rows in args.rows:
+            result, identical, location_rows = run(rows)
+            for statistics in ('temperature', 'precipitation', 'general_statistics'):
+                measured = location_rows if statistics != 'general_statistics' else rows
+                pandas_seconds, numpy_seconds = result[('pandas', statistics)], result[('numpy', statistics)]
+                print(f'{rows:>8} rows {statistics:>18}: pandas {rows_per_second(measured, pandas_seconds):>12,.0f} '
+                      f'rows/s, numpy {rows_per_second(measured, numpy_seconds):>12,.0f} rows/s, '
+                      f'x{pandas_seconds / numpy_seconds:.1f}')
+            print(f'{rows:>8} rows {"identical JSON":>18}: {identical}')
+
+
+if __name__ == '__main__':
+    main()
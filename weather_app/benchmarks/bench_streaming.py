@@ -0,0 +1,71 @@
+"""
+Compares the peak Python memory of the buffered ingestion (response.json() and full lists) against the streaming
+ingestion for growing date ranges, against the local stub of Open Meteo.
+python -m weather_app.benchmarks.bench_streaming --days 30 365 1825
+"""
+import argparse
+import tracemalloc
+from datetime import date, timedelta
+
+from weather_app.benchmarks.utils import setup_django, benchmark_database, rows_per_second, timer
+
+
+def peak_memory(result: dict, key: str, function):
+    tracemalloc.start()
+    with timer(result, key):
+        function()
+    result[key + '_peak'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+
+def run(days: int):
+    from weather_app.benchmarks.stub_upstream import StubUpstream
+    from django.test.utils import override_settings
+    from weather_app.services.http_client import HttpClient
+    from weather_app.services.ingestion_handler import IngestionHandler
+    from weather_app.services.meteo_api_handler import MeteoApiHandler
+    from weather_app.services.model_handler import ModelHandler
+
+    start_date = date(2015, 1, 1)
+    end_date = start_date + timedelta(days=days - 1)
+    result = dict()
+    with StubUpstream() as stub, override_settings(OPEN_METEO_GEOCODING_URL=stub.geocoding_url,
+                                                   OPEN_METEO_ARCHIVE_URL=stub.archive_url):
+        messages = list()
+        handler = IngestionHandler(messages, ModelHandler(messages),
+                                   MeteoApiHandler(messages, http_client=HttpClient()))
+        coordinates = handler.meteo_api_handler.get_coordinates('Madrid')
+
+        def buffered():
+            temperatures, precipitations, times = handler.meteo_api_handler.get_hourly_weather_data(
+                coordinates['lat'], coordinates['lon'], str(start_date), str(end_date))
+            location = handler.store_location('Buffered', coordinates, 'insert')
+            handler.store_hourly_weather_data(location, temperatures, precipitations, times, 'insert', False)
+
+        def streaming():
+            handler.ingest_stream('Streaming', coordinates, str(start_date), str(end_date), 'insert', False)
+
+        peak_memory(result, 'buffered', buffered)
+        peak_memory(result, 'streaming', streaming)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365, 1825])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    # with DEBUG every query is kept in connection.queries and would dominate the peak of the streaming path
+    settings.DEBUG = False
+    for days in args.days:
+        with benchmark_database(in_memory=True):
+            result = run(days)
+        for mode in ('buffered', 'streaming'):
+            print(f'{days:>6} days {mode:>10}: {rows_per_second(days * 24, result[mode]):,.0f} rows/s, '
+                  f'peak {result[mode + "_peak"] / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
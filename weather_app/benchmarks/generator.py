@@ -0,0 +1,114 @@
+"""
+Synthetic hourly weather data written straight into the database, without requests to Open Meteo: N locations
+with M years each of temperatures following the seasons, the daily cycle and persistent weather anomalies, and
+precipitation in wet spells with a few missing hours.
+python -m weather_app.benchmarks.generator --locations 10 --years 5 --start-year 2020
+"""
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+HOUR = 3600
+
+
+def location_coordinates(index: int):
+    """
+    Deterministic coordinates spread over the Iberian peninsula.
+    :param index:
+    :return:
+    """
+    return round(36.5 + (index * 1.37) % 7, 4), round(-8.5 + (index * 2.11) % 11.5, 4)
+
+
+def generate_hourly(latitude: float, start_year: int, years: int, seed: int = 0):
+    """
+    Generates the hourly series of one location from January 1 of start_year, UTC.
+    :param latitude: colder and with wider seasons to the north
+    :param start_year:
+    :param years:
+    :param seed:
+    :return: tuple with the aware datetimes, the temperatures and the precipitations (None when missing)
+    """
+    generator = np.random.default_rng(seed)
+    start = int(datetime(start_year, 1, 1, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(start_year + years, 1, 1, tzinfo=timezone.utc).timestamp())
+    times = np.arange(start, end, HOUR, dtype=np.int64)
+    hours = len(times)
+    day_of_year = (times - start) / HOUR / 24 % 365.25
+    hour_of_day = times // HOUR % 24
+
+    mean = 17 - 0.6 * (latitude - 36)
+    amplitude = 9 + 0.2 * (latitude - 36)
+    seasonal = mean - amplitude * np.cos(2 * np.pi * (day_of_year - 15) / 365.25)
+    daily = 5 * np.sin(2 * np.pi * (hour_of_day - 9) / 24)
+    # weather anomalies last for days: a slow autoregressive noise
+    anomaly = np.empty(hours)
+    shocks = generator.normal(0, 0.25, hours)
+    anomaly[0] = 0.0
+    for i in range(1, hours):
+        anomaly[i] = 0.995 * anomaly[i - 1] + shocks[i]
+    temperatures = np.round(seasonal + daily + anomaly + generator.normal(0, 0.4, hours), 1)
+
+    # wet and dry spells: a two state chain, wetter in winter
+    wet_chance = 0.008 + 0.006 * np.cos(2 * np.pi * day_of_year / 365.25)
+    transitions = generator.random(hours)
+    wet = np.empty(hours, dtype=bool)
+    wet[0] = False
+    for i in range(1, hours):
+        wet[i] = transitions[i] < (0.85 if wet[i - 1] else wet_chance[i])
+    amounts = np.round(generator.gamma(0.8, 1.2, hours), 1)
+    precipitations = np.where(wet, amounts, 0.0)
+    missing = generator.random(hours) < 0.002
+
+    dates = [datetime.fromtimestamp(time, timezone.utc) for time in times.tolist()]
+    return dates, temperatures.tolist(), [None if absent else value
+                                          for absent, value in zip(missing.tolist(), precipitations.tolist())]
+
+
+def populate(locations: int, years: int, start_year: int = 2020, seed: int = 0, prefix: str = 'Generated'):
+    """
+    Creates the locations with their hourly weather data through ModelHandler, so the configured storage
+    and the daily rollup are written as by an ingestion.
+    :param locations:
+    :param years:
+    :param start_year:
+    :param seed:
+    :param prefix: the localities are named '{prefix} {index}'
+    :return: list of the locality names
+    """
+    from weather_app.services.model_handler import ModelHandler
+
+    messages = list()
+    model_handler = ModelHandler(messages)
+    localities = list()
+    for index in range(locations):
+        locality = f'{prefix} {index}'
+        latitude, longitude = location_coordinates(index)
+        location = model_handler.insert_location(locality, latitude, longitude)
+        dates, temperatures, precipitations = generate_hourly(latitude, start_year, years, seed=seed + index)
+        model_handler.insert_hourly_weather_data_bulk(temperatures, precipitations, dates, location)
+        localities.append(locality)
+    errors = [message for message in messages if message.startswith('error')]
+    if errors:
+        raise RuntimeError(f'Generated data not stored: {errors}')
+    return localities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--locations', type=int, default=10)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--start-year', type=int, default=2020)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--prefix', default='Generated')
+    args = parser.parse_args()
+
+    from weather_app.benchmarks.utils import setup_django
+    setup_django()
+    localities = populate(args.locations, args.years, args.start_year, args.seed, args.prefix)
+    print(f'{len(localities)} locations with {args.years} years of hourly data: {", ".join(localities)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+Load generator of the weather app: worker threads replay a mix of requests against an HTTP server at a target
+concurrency and record the latency, status and errors of every request by endpoint. The mix is read from a request
+log (JSON lines with method, path, query and data, as written by InstrumentationMiddleware with LOG_BODY) or built
+from the generated localities. Entry point: python manage.py load_test
+"""
+import http.client
+import itertools
+import json
+import math
+import random
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+from weather_app.services.instrumentation import DURATION_BUCKETS
+
+# share of every endpoint in the generated mix
+DEFAULT_WEIGHTS = {
+    'temperature': 30,
+    'precipitation': 25,
+    'general_statistics': 15,
+    'temperature_cities': 5,
+    'timeseries': 10,
+    'weather_data': 5,
+}
+
+
+def read_request_log(path: str):
+    """
+    Reads the requests of a request log, lines that are not a JSON object with method and path are skipped,
+    so a log with other records or the lines of a log formatter prefix can be given as is.
+    :param path:
+    :return: list of dicts with method, path, query and data
+    """
+    entries = list()
+    with open(path) as log:
+        for line in log:
+            start = line.find('{')
+            if start < 0:
+                continue
+            try:
+                record = json.loads(line[start:])
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or 'method' not in record or 'path' not in record:
+                continue
+            entries.append({'method': record['method'], 'path': record['path'], 'query': record.get('query', ''),
+                            'data': record.get('data')})
+    return entries
+
+
+def build_mix(localities: list, start_year: int, years: int, size: int = 500, seed: int = 0,
+              weights: dict = None):
+    """
+    Builds a request log over the generated localities: statistics of a month, a year or the whole range with
+    random thresholds, answered by the configured backend, and ingestions of a week already stored.
+    :param localities:
+    :param start_year:
+    :param years:
+    :param size: requests of the mix, they are replayed in a loop
+    :param seed:
+    :param weights: share of every kind of request, DEFAULT_WEIGHTS when None
+    :return: list of dicts with method, path, query and data
+    """
+    generator = random.Random(seed)
+    weights = weights or DEFAULT_WEIGHTS
+    kinds = list(weights)
+    first_day = date(start_year, 1, 1)
+    last_day = date(start_year + years - 1, 12, 31)
+
+    def date_range():
+        window = generator.choice(['month', 'year', 'all'])
+        if window == 'all':
+            return first_day.isoformat(), last_day.isoformat()
+        year = generator.randrange(start_year, start_year + years)
+        if window == 'year':
+            return f'{year}-01-01', f'{year}-12-31'
+        month = generator.randrange(1, 13)
+        end = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return f'{year}-{month:02d}-01', end.isoformat()
+
+    entries = list()
+    for kind in generator.choices(kinds, [weights[kind] for kind in kinds], k=size):
+        start_date, end_date = date_range()
+        city_name = generator.choice(localities)
+        thresholds = {'threshold_high': generator.choice([25, 30, 35]), 'threshold_low': generator.choice([0, 5])}
+        if kind == 'weather_data':
+            day = first_day + timedelta(days=generator.randrange((last_day - first_day).days - 6))
+            entries.append({'method': 'POST', 'path': '/weather_app/weather_data/', 'query': '',
+                            'data': {'city_name': city_name, 'start_date': day.isoformat(),
+                                     'end_date': (day + timedelta(days=6)).isoformat(),
+                                     'response_format': 'counts'}})
+        elif kind == 'temperature_cities':
+            entries.append({'method': 'GET', 'path': '/weather_app/temperature/', 'query': '',
+                            'data': {'city_names': generator.sample(localities, min(3, len(localities))),
+                                     'start_date': start_date, 'end_date': end_date, **thresholds}})
+        elif kind == 'timeseries':
+            entries.append({'method': 'GET', 'path': '/weather_app/timeseries/', 'query': '',
+                            'data': {'city_name': city_name, 'start_date': start_date, 'end_date': end_date,
+                                     'bucket': generator.choice(['day', 'week', 'month']),
+                                     'aggregates': ['mean', 'min', 'max']}})
+        else:
+            entries.append({'method': 'GET', 'path': f'/weather_app/{kind}/', 'query': '',
+                            'data': {'city_name': city_name, 'start_date': start_date, 'end_date': end_date,
+                                     **thresholds}})
+    return entries
+
+
+def endpoint_name(path: str):
+    """
+    Name of the url of a path, as labelled in the metrics, or the path when it doesn't resolve.
+    :param path:
+    :return:
+    """
+    from django.urls import Resolver404, resolve
+
+    try:
+        return resolve(path).url_name or path
+    except Resolver404:
+        return path
+
+
+def percentile(ordered: list, fraction: float):
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies: list, statuses: dict, errors: dict, seconds: float, buckets: tuple = DURATION_BUCKETS):
+    """
+    Summarizes the requests of an endpoint, a request is an error when it failed or its status is not 2xx.
+    :param latencies: seconds of every answered request
+    :param statuses: count by HTTP status
+    :param errors: count by exception of the requests without answer
+    :param seconds: duration of the load test
+    :param buckets: upper bounds of the latency histogram, seconds
+    :return:
+    """
+    ordered = sorted(latencies)
+    requests = len(ordered) + sum(errors.values())
+    failed = sum(errors.values()) + sum(count for status, count in statuses.items() if not 200 <= status < 300)
+    summary = {
+        'requests': requests,
+        'errors': failed,
+        'error_rate': failed / requests if requests else 0.0,
+        'throughput_rps': requests / seconds if seconds else 0.0,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'exceptions': dict(errors)
+    }
+    if not ordered:
+        return summary
+    counts = [0] * (len(buckets) + 1)
+    for latency in ordered:
+        counts[next((i for i, bound in enumerate(buckets) if latency <= bound), len(buckets))] += 1
+    summary.update({
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p90_ms': percentile(ordered, 0.90) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'histogram': [[str(bound), count] for bound, count in zip(buckets + ('+Inf',), counts)]
+    })
+    return summary
+
+
+class LoadTest:
+    """
+    Closed loop load: every worker thread sends the next request of the mix as soon as its previous one is
+    answered, until the number of requests or the duration is reached. Every request opens its own connection.
+    """
+
+    def __init__(self, url: str, entries: list, concurrency: int, requests: int = None, duration: float = None,
+                 timeout: float = 60):
+        if not entries:
+            raise ValueError('The load test needs at least one request')
+        if requests is None and duration is None:
+            raise ValueError('The load test needs a number of requests or a duration')
+        target = urlparse(url)
+        self.host = target.hostname
+        self.port = target.port or 80
+        self.prefix = target.path.rstrip('/')
+        self.entries = entries
+        self.endpoints = [endpoint_name(entry['path']) for entry in entries]
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+        self._deadline = None
+        self.results = dict()
+
+    def send(self, entry: dict):
+        """
+        Sends a request and reads the whole answer.
+        :param entry:
+        :return: HTTP status
+        """
+        path = self.prefix + entry['path'] + (f'?{entry["query"]}' if entry.get('query') else '')
+        body = json.dumps(entry['data']).encode() if entry.get('data') is not None else None
+        headers = {'Connection': 'close'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(entry['method'], path, body, headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def record(self, endpoint: str, seconds: float, status: int = None, error: str = None):
+        with self._lock:
+            latencies, statuses, errors = self.results.setdefault(endpoint, (list(), dict(), dict()))
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+                return
+            latencies.append(seconds)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    def work(self):
+        while True:
+            index = next(self._next)
+            if self.requests is not None and index >= self.requests:
+                return
+            if self._deadline is not None and time.perf_counter() >= self._deadline:
+                return
+            entry = self.entries[index % len(self.entries)]
+            start = time.perf_counter()
+            try:
+                status = self.send(entry)
+            except (OSError, http.client.HTTPException) as e:
+                self.record(self.endpoints[index % len(self.entries)], time.perf_counter() - start,
+                            error=type(e).__name__)
+                continue
+            self.record(self.endpoints[index % len(self.entries)], time.perf_counter() - start, status)
+
+    def run(self):
+        """
+        Runs the load test.
+        :return: dict with the summary of all the requests and the summaries by endpoint
+        """
+        started = time.perf_counter()
+        if self.duration is not None:
+            self._deadline = started + self.duration
+        workers = [threading.Thread(target=self.work, daemon=True) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - started
+
+        totals = (list(), dict(), dict())
+        for latencies, statuses, errors in self.results.values():
+            totals[0].extend(latencies)
+            for status, count in statuses.items():
+                totals[1][status] = totals[1].get(status, 0) + count
+            for error, count in errors.items():
+                totals[2][error] = totals[2].get(error, 0) + count
+        return {'seconds': seconds,
+                'total': summarize(*totals, seconds),
+                'endpoints': {endpoint: summarize(*self.results[endpoint], seconds)
+                              for endpoint in sorted(self.results)}}
+
+
+@contextmanager
+def local_server(host: str = '127.0.0.1', port: int = 0):
+    """
+    Serves the Django application with the threaded WSGI server of runserver, without its request log.
+    :param host:
+    :param port: 0 for a free port
+    :return: url of the server
+    """
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler, allow_reuse_address=False)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def report(results: dict):
+    """
+    Lines of the summary of every endpoint and its latency histogram.
+    :param results: output of LoadTest.run
+    :return:
+    """
+    lines = list()
+    for name, summary in [('total', results['total'])] + list(results['endpoints'].items()):
+        line = f'{name:>22}: {summary["requests"]:>7} requests {summary["throughput_rps"]:>8.1f}/s ' \
+               f'errors {summary["error_rate"]:>6.1%}'
+        if 'p50_ms' in summary:
+            line += f'  p50 {summary["p50_ms"]:>9.1f}ms  p90 {summary["p90_ms"]:>9.1f}ms  ' \
+                    f'p99 {summary["p99_ms"]:>9.1f}ms  max {summary["max_ms"]:>9.1f}ms'
+        lines.append(line)
+        if name == 'total' or 'histogram' not in summary:
+            continue
+        answered = sum(count for _, count in summary['histogram'])
+        for bound, count in summary['histogram']:
+            if count:
+                lines.append(f'{"<= " + bound + "s":>32} {count:>7} {"#" * math.ceil(40 * count / answered)}')
+    return lines
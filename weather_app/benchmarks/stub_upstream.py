@@ -0,0 +1,158 @@
+"""
+Local fake of the Open Meteo geocoding and archive APIs for tests, benchmarks and load tests.
+python -m weather_app.benchmarks.stub_upstream --port 8080 --latency 0.05
+"""
+import argparse
+import json
+import math
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def fake_coordinates(name: str):
+    """
+    Deterministic coordinates for a city name, names starting with 'unknown' have no results.
+    :param name:
+    :return:
+    """
+    if name.lower().startswith('unknown'):
+        return None
+    checksum = zlib.crc32(name.lower().encode())
+    return round(36 + (checksum % 800) / 100, 4), round(-9 + (checksum // 800 % 1200) / 100, 4)
+
+
+def fake_hourly(latitude: float, longitude: float, start_date: str, end_date: str):
+    """
+    Deterministic hourly series with a daily temperature cycle and sparse precipitation.
+    :param latitude:
+    :param longitude:
+    :param start_date:
+    :param end_date:
+    :return:
+    """
+    start = datetime.combine(date.fromisoformat(start_date), datetime.min.time())
+    hours = ((date.fromisoformat(end_date) - start.date()).days + 1) * 24
+    seed = int(abs(latitude * 100 + longitude * 10))
+    times, temperatures, precipitations = list(), list(), list()
+    for i in range(hours):
+        moment = start + timedelta(hours=i)
+        times.append(moment.strftime('%Y-%m-%dT%H:%M'))
+        temperatures.append(round(15 + 8 * math.sin((moment.hour - 9) / 24 * 2 * math.pi) + seed % 7, 1))
+        precipitations.append(round((i * 7 + seed) % 31 / 10, 1) if (i + seed) % 13 == 0 else 0.0)
+    return {'time': times, 'temperature_2m': temperatures, 'precipitation': precipitations}
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            status = server.fail_next.pop(0) if server.fail_next else None
+        if server.latency:
+            time.sleep(server.latency)
+        if status is not None:
+            return self.send_json({'error': True, 'reason': 'injected failure'}, status)
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.endswith('/search'):
+            coordinates = fake_coordinates(query.get('name', ''))
+            body = {'results': [{'latitude': coordinates[0], 'longitude': coordinates[1]}]} if coordinates else {}
+            return self.send_json(body)
+        if url.path.endswith('/archive'):
+            latitudes = [float(value) for value in query['latitude'].split(',')]
+            longitudes = [float(value) for value in query['longitude'].split(',')]
+            blocks = [{'latitude': latitude, 'longitude': longitude,
+                       'hourly': fake_hourly(latitude, longitude, query['start_date'], query['end_date'])}
+                      for latitude, longitude in zip(latitudes, longitudes)]
+            return self.send_json(blocks if len(blocks) > 1 else blocks[0])
+        return self.send_json({'error': True, 'reason': 'not found'}, 404)
+
+    def send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubUpstream:
+    """
+    Threaded HTTP server faking both Open Meteo APIs, usable as a context manager.
+    latency delays every answer and fail_next holds HTTP statuses returned by the next requests.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.server = ThreadingHTTPServer((host, port), StubUpstreamHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.latency = latency
+        self.server.fail_next = list()
+        self.server.request_count = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def geocoding_url(self):
+        return f'{self.url}/v1/search'
+
+    @property
+    def archive_url(self):
+        return f'{self.url}/v1/archive'
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    def fail(self, *statuses):
+        with self.server.lock:
+            self.server.fail_next.extend(statuses)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every answer')
+    args = parser.parse_args()
+
+    upstream = StubUpstream(args.host, args.port, args.latency)
+    print(f'Geocoding: {upstream.geocoding_url}\nArchive: {upstream.archive_url}')
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
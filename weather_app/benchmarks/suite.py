@@ -0,0 +1,346 @@
+"""
+Benchmark suite of the weather app: generates N locations with M years of hourly data in a throwaway database,
+fakes Open Meteo with the stub upstream and times the ingestion, every statistics endpoint and the serialization
+through the Django test client. The results are written as JSON and can be compared against a stored baseline,
+exiting with status 1 when a scenario got slower than the tolerance.
+python -m weather_app.benchmarks.suite --locations 4 --years 2 --repeat 5 --output baseline.json
+python -m weather_app.benchmarks.suite --locations 4 --years 2 --repeat 5 --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from weather_app.benchmarks.generator import populate
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.benchmarks.utils import setup_django, benchmark_database
+
+SCENARIOS = dict()
+
+
+def scenario(name: str):
+    """
+    Registers a function timing one iteration of a scenario, it takes the SuiteContext.
+    :param name:
+    :return:
+    """
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+
+class SuiteContext:
+    """
+    State shared by the scenarios: the test client, the generated localities and their date range.
+    """
+
+    def __init__(self, localities: list, start_year: int, years: int):
+        from django.test import Client
+
+        self.client = Client()
+        self.localities = localities
+        self.start_date = f'{start_year}-01-01'
+        self.end_date = f'{start_year + years - 1}-12-31'
+        self.iteration = 0
+        self._records = None
+        self._rows_response = None
+
+    def request(self, method: str, endpoint: str, data: dict):
+        response = self.client.generic(method, f'/weather_app/{endpoint}/', json.dumps(data),
+                                       content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f'{method} {endpoint} answered {response.status_code}: {response.content[:500]}')
+        return response
+
+    def statistics(self, endpoint: str, **extra):
+        return self.request('GET', endpoint, {'start_date': self.start_date, 'end_date': self.end_date,
+                                              'city_name': self.localities[0], 'threshold_high': 30,
+                                              'threshold_low': 0, **extra})
+
+    def ingest(self, start_date: str, end_date: str, **extra):
+        # a new city every iteration, so every request stores its hours
+        return self.request('POST', 'weather_data', {'start_date': start_date, 'end_date': end_date,
+                                                     'city_name': f'Ingested {self.iteration}',
+                                                     'response_format': 'counts', **extra})
+
+    @property
+    def records(self):
+        """
+        Hourly weather data records of the first locality, unsaved ones built from the series for the
+        columnar storage.
+        :return:
+        """
+        from weather_app.models import HourlyWeatherData
+        from weather_app.services.model_handler import ModelHandler
+
+        if self._records is None:
+            model_handler = ModelHandler([])
+            if model_handler.storage == 'rows':
+                self._records = list(HourlyWeatherData.objects.filter(location__locality=self.localities[0])
+                                     .order_by('date'))
+            else:
+                series = model_handler.get_hourly_series(self.localities[0])
+                self._records = [HourlyWeatherData(location_id=location_id,
+                                                   date=datetime.fromtimestamp(time, timezone.utc),
+                                                   temperature=temperature,
+                                                   precipitation=None if precipitation != precipitation
+                                                   else precipitation)
+                                 for location_id, time, temperature, precipitation in
+                                 zip(series.location_ids.tolist(), series.times.tolist(),
+                                     series.temperatures.tolist(), series.precipitations.tolist())]
+        return self._records
+
+    @property
+    def rows_response(self):
+        """
+        Response of the hourly weather data rows of the first locality, built once for the renderers.
+        :return:
+        """
+        from weather_app.serializers import hourly_weather_data_rows
+
+        if self._rows_response is None:
+            self._rows_response = {'message': [], 'status': 200,
+                                   'result_data': {'hourly_weather_data': hourly_weather_data_rows(self.records)}}
+        return self._rows_response
+
+
+@scenario('ingest_week')
+def ingest_week(context):
+    context.ingest('2024-03-01', '2024-03-07')
+
+
+@scenario('ingest_year')
+def ingest_year(context):
+    context.ingest('2023-01-01', '2023-12-31')
+
+
+@scenario('ingest_year_stream')
+def ingest_year_stream(context):
+    context.ingest('2023-01-01', '2023-12-31', stream=True)
+
+
+@scenario('temperature')
+def temperature(context):
+    context.statistics('temperature')
+
+
+@scenario('temperature_numpy')
+def temperature_numpy(context):
+    context.statistics('temperature', backend='numpy')
+
+
+@scenario('temperature_pandas')
+def temperature_pandas(context):
+    context.statistics('temperature', backend='pandas')
+
+
+@scenario('temperature_database')
+def temperature_database(context):
+    context.statistics('temperature', backend='database')
+
+
+@scenario('temperature_cities')
+def temperature_cities(context):
+    context.request('GET', 'temperature', {'start_date': context.start_date, 'end_date': context.end_date,
+                                           'city_names': context.localities, 'threshold_high': 30,
+                                           'threshold_low': 0})
+
+
+@scenario('precipitation')
+def precipitation(context):
+    context.statistics('precipitation')
+
+
+@scenario('precipitation_numpy')
+def precipitation_numpy(context):
+    context.statistics('precipitation', backend='numpy')
+
+
+@scenario('general_statistics')
+def general_statistics(context):
+    context.statistics('general_statistics')
+
+
+@scenario('timeseries_day')
+def timeseries_day(context):
+    context.statistics('timeseries', bucket='day', aggregates=['mean', 'min', 'max', 'sum'])
+
+
+@scenario('timeseries_week_database')
+def timeseries_week_database(context):
+    context.statistics('timeseries', bucket='week', aggregates=['mean', 'min', 'max', 'sum'], backend='database')
+
+
+@scenario('serialize_rows')
+def serialize_rows(context):
+    from weather_app.serializers import hourly_weather_data_rows
+    hourly_weather_data_rows(context.records)
+
+
+@scenario('serialize_json')
+def serialize_json(context):
+    from weather_app.renderers import FastJSONRenderer
+    FastJSONRenderer().render(context.rows_response)
+
+
+@scenario('serialize_columnar')
+def serialize_columnar(context):
+    from weather_app.renderers import ColumnarJSONRenderer
+    ColumnarJSONRenderer().render(context.rows_response)
+
+
+@scenario('serialize_csv')
+def serialize_csv(context):
+    from weather_app.renderers import CSVRenderer
+    CSVRenderer().render(context.rows_response)
+
+
+def summarize(runs: list):
+    """
+    Summarizes the seconds of the runs of a scenario.
+    :param runs:
+    :return:
+    """
+    ordered = sorted(runs)
+    return {
+        'runs': len(ordered),
+        'min_s': ordered[0],
+        'median_s': statistics.median(ordered),
+        'p95_s': ordered[math.ceil(0.95 * len(ordered)) - 1],
+        'mean_s': statistics.fmean(ordered)
+    }
+
+
+def run_scenarios(context, names: list, repeat: int, warmup: int):
+    """
+    Times the scenarios on the current database, the result cache is cleared before every run.
+    :param context: SuiteContext
+    :param names:
+    :param repeat: timed runs of every scenario
+    :param warmup: runs of every scenario before timing it
+    :return: dict of summaries by scenario
+    """
+    from weather_app.services.result_cache import result_cache
+
+    results = dict()
+    for name in names:
+        runs = list()
+        for iteration in range(warmup + repeat):
+            result_cache.clear()
+            start = time.perf_counter()
+            SCENARIOS[name](context)
+            elapsed = time.perf_counter() - start
+            context.iteration += 1
+            if iteration >= warmup:
+                runs.append(elapsed)
+        results[name] = summarize(runs)
+    return results
+
+
+def run_suite(names: list, locations: int, years: int, start_year: int, repeat: int, warmup: int,
+              latency: float, storage: str = None):
+    """
+    Generates the data and times the scenarios against the stub upstream, on the current database.
+    :param names:
+    :param locations:
+    :param years:
+    :param start_year:
+    :param repeat:
+    :param warmup:
+    :param latency: seconds of every stub upstream answer
+    :param storage: WEATHER_STORAGE_BACKEND, the setting when None
+    :return: dict with the meta data of the run and the summaries by scenario
+    """
+    from django.conf import settings
+    from django.test import override_settings
+
+    storage = storage or settings.WEATHER_STORAGE_BACKEND
+    with StubUpstream(latency=latency) as upstream, \
+            override_settings(OPEN_METEO_GEOCODING_URL=upstream.geocoding_url,
+                              OPEN_METEO_ARCHIVE_URL=upstream.archive_url,
+                              WEATHER_STORAGE_BACKEND=storage,
+                              WEATHER_INSTRUMENTATION={**settings.WEATHER_INSTRUMENTATION, 'LOG': False}):
+        started = time.perf_counter()
+        localities = populate(locations, years, start_year)
+        generation = time.perf_counter() - started
+        context = SuiteContext(localities, start_year, years)
+        scenarios = run_scenarios(context, names, repeat, warmup)
+    return {'meta': meta(locations=locations, years=years, start_year=start_year, repeat=repeat, warmup=warmup,
+                         latency=latency, storage=storage, generation_s=generation),
+            'scenarios': scenarios}
+
+
+def meta(**parameters):
+    import django
+    import numpy
+    import pandas
+
+    return {'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'django': django.get_version(), 'numpy': numpy.__version__,
+            'pandas': pandas.__version__, 'platform': platform.platform(), **parameters}
+
+
+def compare(results: dict, baseline: dict, tolerance: float, metric: str = 'median_s'):
+    """
+    Compares the scenarios of a run against a baseline run.
+    :param results: output of run_suite
+    :param baseline: output of run_suite
+    :param tolerance: a scenario is a regression when it is more than this fraction slower than the baseline
+    :param metric: summary compared
+    :return: list of comparisons of the scenarios of both runs
+    """
+    comparisons = list()
+    for name, summary in results['scenarios'].items():
+        reference = baseline['scenarios'].get(name)
+        if reference is None:
+            continue
+        ratio = summary[metric] / reference[metric] if reference[metric] else float('inf')
+        comparisons.append({'scenario': name, 'baseline_s': reference[metric], 'current_s': summary[metric],
+                            'ratio': ratio, 'regression': ratio > 1 + tolerance})
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--locations', type=int, default=4)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--start-year', type=int, default=2020)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of every stub upstream answer')
+    parser.add_argument('--storage', choices=['rows', 'columnar'], default=None)
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--compare', help='JSON file of a baseline run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run_suite(args.scenarios, args.locations, args.years, args.start_year, args.repeat, args.warmup,
+                            args.latency, args.storage)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    for name, summary in results['scenarios'].items():
+        print(f'{name:>26}: median {summary["median_s"] * 1000:>10.2f}ms  min {summary["min_s"] * 1000:>10.2f}ms  '
+              f'p95 {summary["p95_s"] * 1000:>10.2f}ms')
+    if not args.compare:
+        return
+    with open(args.compare) as baseline_file:
+        comparisons = compare(results, json.load(baseline_file), args.tolerance)
+    for comparison in comparisons:
+        flag = 'REGRESSION' if comparison['regression'] else 'ok'
+        print(f'{comparison["scenario"]:>26}: x{comparison["ratio"]:.2f} of the baseline {flag}')
+    if any(comparison['regression'] for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
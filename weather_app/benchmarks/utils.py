@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+
+
+def setup_django():
+    """
+    Configures Django for a benchmark launched outside manage.py.
+    :return:
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_project.settings')
+    # naive API times are stored as they come, the per row warning would only add noise to the timings
+    warnings.filterwarnings('ignore', message='DateTimeField .* received a naive datetime')
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(in_memory: bool = False):
+    """
+    Creates a throwaway database with all migrations applied and destroys it on exit.
+    By default the sqlite database lives in a temporary file so commits pay the real disk cost.
+    :param in_memory:
+    :return:
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    directory = tempfile.TemporaryDirectory()
+    if connection.vendor == 'sqlite' and not in_memory:
+        test_settings['NAME'] = os.path.join(directory.name, 'benchmark.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        directory.cleanup()
+
+
+def rows_per_second(rows: int, seconds: float):
+    return rows / seconds if seconds else float('inf')
+
+
+@contextmanager
+def timer(result: dict, key: str):
+    """
+    Stores the elapsed wall time of the block in result[key].
+    :param result:
+    :param key:
+    :return:
+    """
+    start = time.perf_counter()
+    yield
+    result[key] = time.perf_counter() - start
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from weather_app.models import DailyWeatherSummary, HourlyWeatherData, Location
+from weather_app.services.columnar_storage import ColumnarStorage, RowSeriesReader
+
+
+class Command(BaseCommand):
+    help = 'Copies the HourlyWeatherData records into HourlySeriesBlock blocks, for WEATHER_STORAGE_BACKEND columnar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locality', action='append', help='only copy this locality (repeatable)')
+        parser.add_argument('--delete-rows', action='store_true',
+                            help='delete the copied HourlyWeatherData records, and their DailyWeatherSummary rollup, '
+                                 'of every location')
+
+    def handle(self, *args, **options):
+        locations = Location.objects.order_by('id')
+        if options['locality']:
+            locations = locations.filter(locality__in=options['locality'])
+            missing = set(options['locality']) - set(locations.values_list('locality', flat=True))
+            if missing:
+                raise CommandError(f'Unknown localities: {", ".join(sorted(missing))}')
+
+        reader = RowSeriesReader()
+        storage = ColumnarStorage()
+        for location in locations:
+            with transaction.atomic():
+                series = reader.read(location.id)
+                dates = [datetime.fromtimestamp(int(value), dt_timezone.utc) for value in series.times]
+                inserted, updated, _ = storage.write(location, series.temperatures, series.precipitations, dates,
+                                                     update_changed=True)
+                if options['delete_rows']:
+                    HourlyWeatherData.objects.filter(location=location).delete()
+                    DailyWeatherSummary.objects.filter(location=location).delete()
+            self.stdout.write(f'{location.locality}: {len(inserted) + len(updated)} hours copied of {len(series)}')
@@ -0,0 +1,81 @@
+import json
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from weather_app.benchmarks.generator import populate
+from weather_app.benchmarks.load_test import LoadTest, build_mix, local_server, read_request_log, report
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.benchmarks.utils import benchmark_database
+
+
+class Command(BaseCommand):
+    help = ('Replays a mix of requests against the weather app at a target concurrency and reports the latency '
+            'percentiles, throughput, error rate and latency histogram of every endpoint. Without --url the app is '
+            'served locally on a throwaway copy of the configured database, with generated data and the stub '
+            'Open Meteo upstream.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='base url of a running server, the app is started locally when missing')
+        parser.add_argument('--log', help='request log replayed, JSON lines with method, path, query and data; '
+                                          'the log of WEATHER_INSTRUMENTATION with LOG_BODY can be given as is')
+        parser.add_argument('--concurrency', type=int, default=8, help='requests in flight')
+        parser.add_argument('--requests', type=int, default=None, help='requests sent, 500 without --duration')
+        parser.add_argument('--duration', type=float, default=None, help='seconds of load')
+        parser.add_argument('--timeout', type=float, default=60, help='seconds waited for an answer')
+        parser.add_argument('--locations', type=int, default=4, help='generated locations of the local server')
+        parser.add_argument('--years', type=int, default=2, help='generated years of every location')
+        parser.add_argument('--start-year', type=int, default=2020)
+        parser.add_argument('--mix-size', type=int, default=500, help='requests of the generated mix')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--latency', type=float, default=0.0, help='seconds of every stub upstream answer')
+        parser.add_argument('--output', help='JSON file of the results')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        requests = options['requests']
+        if requests is None and options['duration'] is None:
+            requests = 500
+        entries = read_request_log(options['log']) if options['log'] else None
+        if options['log'] and not entries:
+            raise CommandError(f'No requests in {options["log"]}')
+        if entries is None and options['url']:
+            raise CommandError('--url needs a --log, the generated mix only exists on the local server')
+
+        with ExitStack() as stack:
+            url = options['url']
+            meta = {'url': url, 'concurrency': options['concurrency'], 'requests': requests,
+                    'duration': options['duration'], 'log': options['log']}
+            if url is None:
+                stack.enter_context(benchmark_database())
+                upstream = stack.enter_context(StubUpstream(latency=options['latency']))
+                stack.enter_context(override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, '127.0.0.1'],
+                    OPEN_METEO_GEOCODING_URL=upstream.geocoding_url, OPEN_METEO_ARCHIVE_URL=upstream.archive_url,
+                    WEATHER_INSTRUMENTATION={**settings.WEATHER_INSTRUMENTATION, 'LOG': False}))
+                localities = populate(options['locations'], options['years'], options['start_year'])
+                if entries is None:
+                    entries = build_mix(localities, options['start_year'], options['years'],
+                                        options['mix_size'], options['seed'])
+                url = stack.enter_context(local_server())
+                meta.update({'database': connection.vendor, 'storage': settings.WEATHER_STORAGE_BACKEND,
+                             'statistics_backend': settings.WEATHER_STATISTICS_BACKEND,
+                             'locations': options['locations'], 'years': options['years'],
+                             'latency': options['latency']})
+                self.stdout.write(f'Serving {len(localities)} generated locations on {url} ({connection.vendor})')
+
+            load_test = LoadTest(url, entries, options['concurrency'], requests, options['duration'],
+                                 options['timeout'])
+            results = {'meta': meta, **load_test.run()}
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        self.stdout.write(f'{results["total"]["requests"]} requests in {results["seconds"]:.1f}s '
+                          f'with {options["concurrency"]} in flight')
+        for line in report(results):
+            self.stdout.write(line)
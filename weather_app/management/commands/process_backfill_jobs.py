@@ -0,0 +1,66 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from weather_app.services.backfill_handler import BackfillHandler
+from weather_app.services.geocoding_cache import geocoding_cache
+from weather_app.services.ingestion_handler import IngestionHandler
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+
+
+def work(burst: bool, poll_interval: float):
+    """
+    Loop of one worker process: processes the queued backfill jobs and waits poll_interval seconds
+    when the queue is empty, or returns in burst mode.
+    :param burst:
+    :param poll_interval:
+    :return: number of processed jobs
+    """
+    messages = list()
+    ingestion_handler = IngestionHandler(messages, ModelHandler(messages),
+                                         MeteoApiHandler(messages, geocoding_cache=geocoding_cache))
+    backfill_handler = BackfillHandler(messages, ingestion_handler)
+    processed = 0
+    while True:
+        jobs = backfill_handler.run()
+        processed += jobs
+        if not jobs:
+            if burst:
+                return processed
+            time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Processes the queued BackfillJob records with one or more worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.WEATHER_BACKFILL_WORKERS,
+                            help='worker processes claiming jobs from the queue')
+        parser.add_argument('--burst', action='store_true', help='exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=settings.WEATHER_BACKFILL_POLL_INTERVAL,
+                            help='seconds waited when the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            processed = work(options['burst'], options['poll_interval'])
+            self.stdout.write(f'{processed} backfill jobs processed')
+            return
+
+        # the children must open their own database connections
+        connections.close_all()
+        processes = [multiprocessing.Process(target=work, args=(options['burst'], options['poll_interval']),
+                                             daemon=True)
+                     for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        self.stdout.write(f'{len(processes)} backfill workers finished')
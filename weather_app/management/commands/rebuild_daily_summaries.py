@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from weather_app.models import Location
+from weather_app.services.model_handler import ModelHandler
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the DailyWeatherSummary rollup from the HourlyWeatherData records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locality', action='append', help='only rebuild this locality (repeatable)')
+        parser.add_argument('--days', type=int, default=366,
+                            help='days recomputed per step, bounds the hourly records held in memory')
+
+    def handle(self, *args, **options):
+        messages = list()
+        model_handler = ModelHandler(messages)
+        locations = Location.objects.order_by('id')
+        if options['locality']:
+            locations = locations.filter(locality__in=options['locality'])
+            missing = set(options['locality']) - set(locations.values_list('locality', flat=True))
+            if missing:
+                raise CommandError(f'Unknown localities: {", ".join(sorted(missing))}')
+
+        for location in locations:
+            bounds = location.hourly_data.aggregate(first=Min('date'), last=Max('date'))
+            if bounds['first'] is None:
+                location.daily_summaries.all().delete()
+                Location.objects.filter(id=location.id).update(daily_summaries_complete=True)
+                continue
+            first_day = model_handler.to_day(bounds['first'])
+            last_day = model_handler.to_day(bounds['last'])
+            location.daily_summaries.exclude(day__range=(first_day, last_day)).delete()
+            summaries = 0
+            day = first_day
+            while day <= last_day:
+                step_last_day = min(day + timedelta(days=options['days'] - 1), last_day)
+                summaries += len(model_handler.refresh_daily_summaries(location, day, step_last_day))
+                day = step_last_day + timedelta(days=1)
+            Location.objects.filter(id=location.id).update(daily_summaries_complete=True)
+            self.stdout.write(f'{location.locality}: {summaries} daily summaries')
@@ -0,0 +1,117 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from weather_app.services.instrumentation import RequestProfile, activate, deactivate, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware:
+    """
+    Counts every request in the process metrics and records the phases of a share of them, WEATHER_INSTRUMENTATION
+    SAMPLE_RATE, which get a Server-Timing header and a structured log line. With LOG_BODY the log line also holds
+    the query string and the JSON body, so the log can be replayed by the load_test command. Serves WSGI and ASGI
+    requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config = settings.WEATHER_INSTRUMENTATION
+        if not config.get('ENABLED', True):
+            return self.get_response(request)
+        profile = self.sample(config, request)
+        token = activate(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            deactivate(token)
+        return self.finish(config, request, response, profile, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        config = settings.WEATHER_INSTRUMENTATION
+        if not config.get('ENABLED', True):
+            return await self.get_response(request)
+        profile = self.sample(config, request)
+        token = activate(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            deactivate(token)
+        return self.finish(config, request, response, profile, time.perf_counter() - start)
+
+    @staticmethod
+    def sample(config: dict, request):
+        """
+        Decides whether the phases of the request are recorded.
+        :param config:
+        :param request:
+        :return: a new RequestProfile or None
+        """
+        sample_rate = config.get('SAMPLE_RATE', 1.0)
+        if sample_rate < 1 and random.random() >= sample_rate:
+            return None
+        if config.get('LOG', True) and config.get('LOG_BODY', False):
+            # read before the view, the parsers of rest framework consume the stream
+            request.body
+        return RequestProfile()
+
+    @staticmethod
+    def replay_fields(request):
+        """
+        Query string and JSON body of a sampled request, for the request log.
+        :param request:
+        :return:
+        """
+        fields = {'query': request.META.get('QUERY_STRING', '')}
+        try:
+            fields['data'] = json.loads(request.body) if request.body else None
+        except ValueError:
+            fields['data'] = None
+        return fields
+
+    def finish(self, config: dict, request, response, profile, seconds: float):
+        """
+        Counts the request and reports the phases of a sampled one.
+        :param config:
+        :param request:
+        :param response:
+        :param profile:
+        :param seconds: duration of the request
+        :return: the response
+        """
+        match = request.resolver_match
+        endpoint = match.url_name if match is not None and match.url_name else 'unmatched'
+        metrics.observe(endpoint, request.method, response.status_code, seconds, profile)
+        if profile is None:
+            return response
+        if config.get('SERVER_TIMING', True):
+            response['Server-Timing'] = profile.server_timing(seconds)
+        if config.get('LOG', True):
+            record = {
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'ms': round(seconds * 1000, 3),
+                'phases': profile.as_dict()
+            }
+            if config.get('LOG_BODY', False):
+                record.update(self.replay_fields(request))
+            logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0004_geocodingcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyWeatherSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('hours', models.IntegerField()),
+                ('temperature_min', models.FloatField()),
+                ('temperature_min_date', models.DateTimeField()),
+                ('temperature_max', models.FloatField()),
+                ('temperature_max_date', models.DateTimeField()),
+                ('temperature_mean', models.FloatField()),
+                ('temperature_sum', models.FloatField()),
+                ('precipitation_hours', models.IntegerField()),
+                ('precipitation_sum', models.FloatField()),
+                ('precipitation_max', models.FloatField(blank=True, null=True)),
+                ('precipitation_max_date', models.DateTimeField(blank=True, null=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='weather_app.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'day'), name='unique_location_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0006_backfilljob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hourlyweatherdata',
+            index=models.Index(fields=['location', 'date', 'temperature', 'precipitation'], name='hourly_location_date_cover'),
+        ),
+    ]
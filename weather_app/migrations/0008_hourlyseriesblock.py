@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0007_hourlyweatherdata_covering_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySeriesBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('temperatures', models.BinaryField()),
+                ('precipitations', models.BinaryField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_blocks', to='weather_app.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'month'), name='unique_location_month')],
+            },
+        ),
+    ]
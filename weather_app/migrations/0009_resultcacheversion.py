@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0008_hourlyseriesblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultCacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('locality', models.CharField(max_length=100)),
+                ('year', models.IntegerField()),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('locality', 'year'), name='unique_result_cache_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:31
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def record_daily_summaries_coverage(apps, schema_editor):
+    # the rollup of a location is complete when its days hold every hourly record
+    Location = apps.get_model('weather_app', 'Location')
+    for location in Location.objects.all():
+        stored_hours = location.hourly_data.count()
+        summarized_hours = location.daily_summaries.aggregate(hours=Sum('hours'))['hours'] or 0
+        if stored_hours == summarized_hours:
+            Location.objects.filter(id=location.id).update(daily_summaries_complete=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0009_resultcacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='daily_summaries_complete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(record_daily_summaries_coverage, migrations.RunPython.noop),
+    ]
@@ -11,6 +11,8 @@ class Location(models.Model):
     lat = models.FloatField()
     long = models.FloatField()
     elevation = models.FloatField(null=True, blank=True)
+    # the daily rollup covers every hourly record, false once a record is saved outside ModelHandler
+    daily_summaries_complete = models.BooleanField(default=False)
 
     def __str__(self):
         return self.locality
@@ -40,4 +42,143 @@ class HourlyWeatherData(models.Model):
                 name='unique_location_date'
             )
         ]
+        indexes = [
+            # covers the statistics reads: location and date range lookups answered from the index alone
+            models.Index(fields=['location', 'date', 'temperature', 'precipitation'],
+                         name='hourly_location_date_cover')
+        ]
+
+
+class DailyWeatherSummary(models.Model):
+    """
+    Daily rollup of the hourly weather data of a location, kept up to date by the ingestion.
+    """
+    day = models.DateField()
+    hours = models.IntegerField()
+    temperature_min = models.FloatField()
+    temperature_min_date = models.DateTimeField()
+    temperature_max = models.FloatField()
+    temperature_max_date = models.DateTimeField()
+    temperature_mean = models.FloatField()
+    temperature_sum = models.FloatField()
+    precipitation_hours = models.IntegerField()
+    precipitation_sum = models.FloatField()
+    precipitation_max = models.FloatField(null=True, blank=True)
+    precipitation_max_date = models.DateTimeField(null=True, blank=True)
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="daily_summaries")
+
+    def __str__(self):
+        return f"{self.day} - {self.location.locality}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['location', 'day'],
+                name='unique_location_day'
+            )
+        ]
+
+
+class HourlySeriesBlock(models.Model):
+    """
+    Hourly weather data of a location for one UTC month, used instead of the HourlyWeatherData rows
+    when WEATHER_STORAGE_BACKEND is 'columnar'. The columns are little endian float32 arrays with one value
+    per hour of the month from its first hour, NaN for the hours not stored.
+    """
+    month = models.DateField()
+    temperatures = models.BinaryField()
+    precipitations = models.BinaryField()
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="series_blocks")
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.location.locality}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['location', 'month'],
+                name='unique_location_month'
+            )
+        ]
+
+
+class GeocodingCacheEntry(models.Model):
+    """
+    Geocoding API answer for a normalized city name. Null coordinates cache a name without results.
+    """
+    name = models.CharField(max_length=100)
+    lat = models.FloatField(null=True, blank=True)
+    long = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name'],
+                name='unique_geocoding_name'
+            )
+        ]
+
+
+class ResultCacheVersion(models.Model):
+    """
+    Version of the hourly rows of a locality in a year, bumped in the transaction writing them. The cached
+    statistics are keyed on the versions of the rows they depend on.
+    """
+    locality = models.CharField(max_length=100)
+    year = models.IntegerField()
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.locality} {self.year}: {self.version}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['locality', 'year'],
+                name='unique_result_cache_version'
+            )
+        ]
+
+
+class BackfillJob(models.Model):
+    """
+    Archive ingestion of a city run in background by the process_backfill_jobs workers.
+    next_date is the first day not committed yet, it moves forward in the same transaction as the hourly
+    records of every chunk so a job taken again after a crash resumes from there.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    city_name = models.CharField(max_length=100)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    mode = models.CharField(max_length=10, default='insert')
+    update_changed = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    next_date = models.DateField()
+    chunks_done = models.IntegerField(default=0)
+    inserted_hours = models.IntegerField(default=0)
+    updated_hours = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name="backfill_jobs")
+
+    def __str__(self):
+        return f"{self.city_name} {self.start_date} - {self.end_date} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='backfill_job_status_idx')
+        ]
@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from weather_app.services.instrumentation import phase
+
+try:
+    import orjson
+except ImportError:  # optional, the standard encoder of JSONRenderer is used without it
+    orjson = None
+
+"""
+Renderers of the weather app responses, negotiated with the Accept header or the format query parameter:
+'json' (default), 'columnar' (lists of records as one list per field) and 'csv'.
+"""
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed. The indented output of the browsable API and
+    the payloads orjson can't encode go through the standard encoder.
+    """
+
+    ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('serialize'):
+            if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+                return super().render(data, accepted_media_type, renderer_context)
+            try:
+                return orjson.dumps(data, option=self.ORJSON_OPTIONS)
+            except TypeError:
+                return super().render(data, accepted_media_type, renderer_context)
+
+
+def to_columns(records: list):
+    """
+    Converts a list of records into a dict with the list of values of every field, nested records as well.
+    :param records: dicts with the same keys
+    :return:
+    """
+    columns = dict()
+    for key in records[0]:
+        values = [record[key] for record in records]
+        columns[key] = to_columns(values) if isinstance(values[0], dict) else values
+    return columns
+
+
+def is_table(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(record, dict) for record in value)
+
+
+def columnar(value):
+    """
+    Converts every list of records inside the value into columns.
+    :param value:
+    :return:
+    """
+    if is_table(value):
+        return to_columns(value)
+    if isinstance(value, dict):
+        return {key: columnar(item) for key, item in value.items()}
+    return value
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """
+    Renders the lists of records of result_data, such as the hourly weather data or the timeseries points,
+    as one list per field: {"date": [...], "temperature": [...]}.
+    """
+
+    media_type = 'application/vnd.weather.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('serialize'):
+            if isinstance(data, dict) and 'result_data' in data:
+                data = {**data, 'result_data': columnar(data['result_data'])}
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Renders the lists of records of result_data as CSV rows, nested fields joined with dots. Several lists
+    are told apart by a 'table' column; a result without lists is one row, a response without result its messages.
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('serialize'):
+            return self.render_rows(data)
+
+    def render_rows(self, data):
+        if data is None:
+            return b''
+        result_data = data.get('result_data') if isinstance(data, dict) and 'result_data' in data else data
+        if result_data is None:
+            rows = [{'message': message} for message in data.get('message', list())]
+        else:
+            tables = list(self.tables(result_data))
+            rows = [self.flatten(result_data)] if not tables else \
+                [{**({'table': name} if len(tables) > 1 else dict()), **self.flatten(record)}
+                 for name, records in tables for record in records]
+
+        fieldnames = list(dict.fromkeys(field for row in rows for field in row))
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+    def tables(self, value, path: str = ''):
+        """
+        Finds the lists of records of the value.
+        :param value:
+        :param path: dotted path of the value
+        :return: generator of tuples with the path and the records of every list
+        """
+        if is_table(value):
+            yield path, value
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                yield from self.tables(item, f'{path}.{key}' if path else str(key))
+
+    def flatten(self, record, prefix: str = ''):
+        row = dict()
+        for key, value in (record.items() if isinstance(record, dict) else (('value', record),)):
+            field = f'{prefix}.{key}' if prefix else str(key)
+            if isinstance(value, dict):
+                row.update(self.flatten(value, field))
+            else:
+                row[field] = json.dumps(value) if isinstance(value, list) else value
+        return row
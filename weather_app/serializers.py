@@ -1,5 +1,10 @@
-from rest_framework import serializers
-from weather_app.models import Location, HourlyWeatherData
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from weather_app.models import Location, HourlyWeatherData, BackfillJob
 
 """
 Serializers are useful to convert models into JSON data. 
@@ -16,3 +21,47 @@ class HourlyWeatherDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = HourlyWeatherData
         fields = '__all__'
+
+def hourly_weather_data_rows(hourly_weather_data):
+    """
+    Serializes hourly weather data records as HourlyWeatherDataSerializer(many=True) does, reading the
+    attributes directly instead of running every serializer field on every record.
+    :param hourly_weather_data: records
+    :return: list of dicts
+    """
+    date_representation = iso_datetime_representation()
+    return [{'id': record.id,
+             'temperature': record.temperature,
+             'precipitation': record.precipitation,
+             'date': date_representation(record.date),
+             'location': record.location_id}
+            for record in hourly_weather_data]
+
+def iso_datetime_representation():
+    """
+    Obtains the to_representation of a DateTimeField. With time zone support and the ISO 8601 format it is
+    done in the current time zone looked up once, the field looks it up for every value.
+    :return:
+    """
+    field = serializers.DateTimeField()
+    if not settings.USE_TZ or (api_settings.DATETIME_FORMAT or '').lower() != ISO_8601:
+        return field.to_representation
+    current_timezone = timezone.get_current_timezone()
+    if timezone.get_current_timezone_name() == 'UTC':
+        # same offsets, the datetimes read from the database already are in this tzinfo
+        current_timezone = dt_timezone.utc
+
+    def to_representation(value):
+        if not value or isinstance(value, str):
+            return field.to_representation(value)
+        value = value.astimezone(current_timezone) if timezone.is_aware(value) else \
+            timezone.make_aware(value, current_timezone)
+        representation = value.isoformat()
+        return representation[:-6] + 'Z' if representation.endswith('+00:00') else representation
+    return to_representation
+
+class BackfillJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = BackfillJob
+        exclude = ['worker', 'lease_expires_at']
@@ -0,0 +1,201 @@
+import codecs
+import json
+import math
+import re
+from array import array
+from datetime import datetime, timedelta
+
+
+EPOCH = datetime(1970, 1, 1)
+SCALAR_END = re.compile(r'[,\]}\s]')
+HOURLY_COLUMNS = ('time', 'temperature_2m', 'precipitation')
+
+
+class JsonStreamReader:
+    """
+    Pull parser reading JSON values from an iterator of text chunks without loading the whole document.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = next(self._chunks, None)
+        while chunk == '':
+            chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} at stream position {self.pos}')
+        self.pos += 1
+
+    def read_scalar(self):
+        """
+        Reads a string, number, boolean or null.
+        :return:
+        """
+        if self.peek() != '"':
+            # a number split between two chunks would be decoded short, so wait for its delimiter
+            while not self.eof and not SCALAR_END.search(self.buffer, self.pos):
+                self.fill()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self):
+        """
+        Yields the keys of an object, the caller must read or skip the value of every key.
+        :return:
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_scalar()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def iter_array(self):
+        """
+        Yields once per element of an array, the caller must read or skip every element.
+        :return:
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+    def read_value(self):
+        char = self.peek()
+        if char == '{':
+            return {key: self.read_value() for key in self.iter_object()}
+        if char == '[':
+            return [self.read_value() for _ in self.iter_array()]
+        return self.read_scalar()
+
+    def skip_value(self):
+        char = self.peek()
+        if char == '{':
+            for _ in self.iter_object():
+                self.skip_value()
+        elif char == '[':
+            for _ in self.iter_array():
+                self.skip_value()
+        else:
+            self.read_scalar()
+
+
+class HourlyColumns:
+    """
+    Hourly archive columns held in typed arrays: 8 bytes per value instead of one Python object per value.
+    Times are seconds since the epoch of the naive API times, missing values are NaN.
+    """
+
+    def __init__(self):
+        self.times = array('q')
+        self.temperatures = array('d')
+        self.precipitations = array('d')
+
+    def __len__(self):
+        return len(self.times)
+
+    def iter_chunks(self, chunk_size: int):
+        """
+        Yields (temperatures, precipitations, times) lists of up to chunk_size rows, in the API format.
+        :param chunk_size:
+        :return:
+        """
+        for first in range(0, len(self.times), chunk_size):
+            last = first + chunk_size
+            yield ([None if math.isnan(value) else value for value in self.temperatures[first:last]],
+                   [None if math.isnan(value) else value for value in self.precipitations[first:last]],
+                   [EPOCH + timedelta(seconds=seconds) for seconds in self.times[first:last]])
+
+
+def parse_archive_stream(chunks):
+    """
+    Parses an archive API answer incrementally from its text chunks into HourlyColumns.
+    :param chunks: iterator of str
+    :return:
+    """
+    reader = JsonStreamReader(chunks)
+    columns = HourlyColumns()
+    targets = {
+        'temperature_2m': columns.temperatures,
+        'precipitation': columns.precipitations
+    }
+    error = None
+    for key in reader.iter_object():
+        if key == 'hourly':
+            for column in reader.iter_object():
+                if column == 'time':
+                    for _ in reader.iter_array():
+                        moment = datetime.fromisoformat(reader.read_scalar())
+                        columns.times.append((moment - EPOCH) // timedelta(seconds=1))
+                elif column in targets:
+                    target = targets[column]
+                    for _ in reader.iter_array():
+                        value = reader.read_scalar()
+                        target.append(math.nan if value is None else value)
+                else:
+                    reader.skip_value()
+        elif key == 'reason':
+            error = reader.read_value()
+        else:
+            reader.skip_value()
+    if error is not None:
+        raise ValueError(f'Archive API error: {error}')
+    if not len(columns.times) == len(columns.temperatures) == len(columns.precipitations):
+        raise ValueError('Archive API answer has hourly columns of different lengths')
+    return columns
+
+
+def iter_text(byte_chunks, encoding: str = 'utf-8'):
+    """
+    Decodes an iterator of byte chunks, keeping multi-byte characters split between chunks intact.
+    :param byte_chunks:
+    :param encoding:
+    :return:
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import httpx
+from django.conf import settings
+
+from weather_app.services.http_client import RETRY_STATUSES
+from weather_app.services.instrumentation import phase
+
+# errors of a failed upstream request
+UPSTREAM_ERRORS = (httpx.HTTPError, ValueError, KeyError)
+
+
+class AsyncHttpClient:
+    """
+    Async HTTP client of the Open Meteo requests of the ASGI views, keeping up to max_concurrency requests
+    in flight from one event loop with httpx, without holding a thread: pooled keep-alive connections,
+    connect and read timeouts and exponential backoff retries on 429 and 5xx answers, like HttpClient.
+    """
+
+    def __init__(self, max_concurrency: int = None, connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_factor: float = None):
+        self.max_concurrency = max_concurrency or settings.HTTP_CLIENT_ASYNC_MAX_CONCURRENCY
+        self.connect_timeout = connect_timeout or settings.HTTP_CLIENT_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.HTTP_CLIENT_READ_TIMEOUT
+        self.max_retries = settings.HTTP_CLIENT_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = settings.HTTP_CLIENT_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self._loop = None
+        self._semaphore = None
+        self._client = None
+
+    def bind(self):
+        """
+        Creates the semaphore and the httpx client of the running event loop, they can't be shared between
+        loops. An ASGI server runs a single loop, so they are created once.
+        :return: the running loop
+        """
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return loop
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        transport = httpx.AsyncHTTPTransport(retries=self.max_retries,
+                                             limits=httpx.Limits(max_connections=self.max_concurrency,
+                                                                 max_keepalive_connections=self.max_concurrency))
+        self._client = httpx.AsyncClient(transport=transport,
+                                         timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout))
+        return loop
+
+    async def get_json(self, url: str, params: dict = None, raise_for_status: bool = False):
+        """
+        Sends a GET request, waiting while max_concurrency requests are in flight, and decodes its JSON answer.
+        The answer of the last attempt is returned even if its status is an error, like HttpClient.
+        :param url:
+        :param params:
+        :param raise_for_status: raise httpx.HTTPStatusError instead when the last attempt is an error
+        :return:
+        """
+        self.bind()
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                with phase('upstream'):
+                    response = await self._client.get(url, params=params)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    if raise_for_status:
+                        response.raise_for_status()
+                    return response.json()
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_async_client():
+    """
+    Obtains the async HTTP client shared by the whole process, created on first use from the settings.
+    :return:
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = AsyncHttpClient()
+        return _default_client
@@ -0,0 +1,113 @@
+import asyncio
+
+from django.conf import settings
+
+from weather_app.services.async_http_client import UPSTREAM_ERRORS, get_default_async_client
+from weather_app.services.executors import run_sync
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+
+
+class AsyncMeteoApiHandler:
+    """
+    Handler of the Open Meteo geocoding and archive queries of the async views. The requests are awaited on the
+    async HTTP client, so one event loop keeps many of them in flight; the answers are read as MeteoApiHandler
+    reads them and the geocoding cache, which reads the database, runs in the executor threads.
+    """
+
+    def __init__(self, messages: list, geocoding_cache=None, async_http_client=None):
+        self.messages = messages
+        self.geocoding_cache = geocoding_cache
+        self.async_http_client = async_http_client or get_default_async_client()
+
+    async def get_coordinates(self, city_name):
+        """
+        Obtains latitude and longitude by city name, from the geocoding cache if any or from API.
+        A failed request is not cached, only an answer without results is cached as a name without coordinates.
+        :param city_name:
+        :return:
+        """
+        if self.geocoding_cache is not None:
+            coordinates = await run_sync(self.geocoding_cache.get, city_name)
+            if coordinates is not self.geocoding_cache.MISS:
+                if coordinates is None:
+                    self.messages.append(f"No coordinates for {city_name}")
+                return coordinates
+
+        try:
+            coordinates = await self.request_coordinates(city_name)
+        except UPSTREAM_ERRORS as e:
+            self.messages.append(f"error : Geocoding API error {e}")
+            return None
+        if self.geocoding_cache is not None and city_name is not None:
+            await run_sync(self.geocoding_cache.set, city_name, coordinates)
+        if coordinates is None:
+            self.messages.append(f"No coordinates for {city_name}")
+        return coordinates
+
+    async def request_coordinates(self, city_name):
+        data = await self.async_http_client.get_json(settings.OPEN_METEO_GEOCODING_URL,
+                                                     params=MeteoApiHandler.geocoding_params(city_name),
+                                                     raise_for_status=True)
+        return MeteoApiHandler.coordinates_from(data)
+
+    async def get_hourly_weather_data(self, latitude, longitude, start_date, end_date):
+        data = await self.async_http_client.get_json(settings.OPEN_METEO_ARCHIVE_URL,
+                                                     params=MeteoApiHandler.archive_params(latitude, longitude,
+                                                                                           start_date, end_date))
+        return MeteoApiHandler.hourly_columns(data)
+
+    async def get_hourly_weather_data_chunk(self, latitude, longitude, start_date, end_date, retries: int):
+        """
+        Obtains the hourly weather data of one chunk retrying it on its own, with exponential backoff,
+        when the request fails or the answer is not valid.
+        :param latitude:
+        :param longitude:
+        :param start_date:
+        :param end_date:
+        :param retries:
+        :return:
+        """
+        for attempt in range(retries + 1):
+            try:
+                return await self.get_hourly_weather_data(latitude, longitude, start_date, end_date)
+            except UPSTREAM_ERRORS:
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(settings.HTTP_CLIENT_BACKOFF_FACTOR * 2 ** attempt)
+
+    async def get_hourly_weather_data_for_ranges(self, latitude, longitude, date_ranges, chunk=None,
+                                                 max_workers: int = None, retries: int = None):
+        """
+        Obtains hourly weather data only for the given date sub-ranges and merges them in order, fetching up to
+        max_workers chunks at the same time. The chunks still failing after their retries are left out, as
+        MeteoApiHandler.get_hourly_weather_data_for_ranges does.
+        :param latitude:
+        :param longitude:
+        :param date_ranges: list of (start_date, end_date) tuples
+        :param chunk: 'month', 'year' or a number of days
+        :param max_workers:
+        :param retries:
+        :return:
+        """
+        chunk = chunk or settings.OPEN_METEO_ARCHIVE_CHUNK
+        workers = asyncio.Semaphore(max_workers or settings.OPEN_METEO_ARCHIVE_CHUNK_WORKERS)
+        retries = settings.OPEN_METEO_ARCHIVE_CHUNK_RETRIES if retries is None else retries
+        windows = [window for start_date, end_date in date_ranges
+                   for window in MeteoApiHandler.split_date_range_by(start_date, end_date, chunk)]
+
+        async def fetch(window):
+            async with workers:
+                return await self.get_hourly_weather_data_chunk(latitude, longitude, window[0], window[1], retries)
+
+        answers = await asyncio.gather(*(fetch(window) for window in windows), return_exceptions=True)
+        temperatures, precipitations, times = list(), list(), list()
+        for window, columns in zip(windows, answers):
+            if isinstance(columns, UPSTREAM_ERRORS):
+                self.messages.append(f'error : archive chunk {window[0]} - {window[1]} failed: {columns}')
+                continue
+            if isinstance(columns, BaseException):
+                raise columns
+            temperatures.extend(columns[0])
+            precipitations.extend(columns[1])
+            times.extend(columns[2])
+        return temperatures, precipitations, times
@@ -0,0 +1,176 @@
+import os
+import socket
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from weather_app.models import BackfillJob
+from weather_app.services.ingestion_handler import IngestionHandler
+
+
+class BackfillLeaseLost(Exception):
+    """
+    The lease of the job expired and another worker took it, the chunk being written is rolled back.
+    """
+
+
+class BackfillHandler:
+    """
+    Handler of the database backed queue of background archive ingestions.
+    Workers claim a job with a conditional update, so no row locks are needed and any database works, and keep
+    it leased while they commit its chunks. A job whose lease expired, because its worker died, is claimed again
+    and resumes from the first day not committed.
+    """
+
+    def __init__(self, messages: list, ingestion_handler: IngestionHandler, worker: str = None):
+        self.messages = messages
+        self.ingestion_handler = ingestion_handler
+        self.worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+
+    def enqueue(self, city_name, start_date, end_date, mode='insert', update_changed=False):
+        """
+        Records a pending backfill job, ValueError when start_date is after end_date.
+        :param city_name:
+        :param start_date:
+        :param end_date:
+        :param mode:
+        :param update_changed:
+        :return:
+        """
+        model_handler = self.ingestion_handler.model_handler
+        start_day = model_handler.parse_day(start_date)
+        end_day = model_handler.parse_day(end_date)
+        if start_day > end_day:
+            raise ValueError(f'start_date {start_day} is after end_date {end_day}')
+        return BackfillJob.objects.create(city_name=city_name,
+                                          start_date=start_day,
+                                          end_date=end_day,
+                                          mode=mode,
+                                          update_changed=update_changed,
+                                          next_date=start_day)
+
+    @staticmethod
+    def claimable():
+        # a pending job may wait for its retry delay in lease_expires_at
+        return Q(status__in=(BackfillJob.PENDING, BackfillJob.RUNNING)) & \
+            (Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=timezone.now()))
+
+    def lease_expires_at(self):
+        return timezone.now() + timedelta(seconds=settings.WEATHER_BACKFILL_LEASE_SECONDS)
+
+    def claim(self):
+        """
+        Takes the oldest pending job, or a running one whose lease expired, for this worker.
+        Jobs claimed too many times are failed instead of being retried forever.
+        :return: the claimed job or None when the queue is empty
+        """
+        while True:
+            job_ids = list(BackfillJob.objects.filter(self.claimable()).order_by('id')
+                           .values_list('id', flat=True)[:10])
+            if not job_ids:
+                return None
+            for job_id in job_ids:
+                claimed = BackfillJob.objects.filter(self.claimable(), id=job_id).update(
+                    status=BackfillJob.RUNNING, worker=self.worker, lease_expires_at=self.lease_expires_at(),
+                    attempts=F('attempts') + 1, updated_at=timezone.now())
+                if not claimed:
+                    continue  # taken by another worker in between
+                job = BackfillJob.objects.get(id=job_id)
+                if job.attempts > settings.WEATHER_BACKFILL_MAX_ATTEMPTS:
+                    self.finish(job, BackfillJob.FAILED, job.error or 'too many attempts')
+                    continue
+                return job
+
+    def run(self, max_jobs: int = None):
+        """
+        Processes jobs until the queue is empty or max_jobs were processed.
+        :param max_jobs:
+        :return: number of processed jobs
+        """
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            job = self.claim()
+            if job is None:
+                break
+            self.process(job)
+            processed += 1
+        return processed
+
+    def process(self, job):
+        """
+        Ingests a claimed job chunk by chunk from its next_date. Every chunk and the progress of the job are
+        committed together, a chunk failing after its retries puts the job back in the queue to be resumed later.
+        :param job:
+        :return:
+        """
+        del self.messages[:]
+        ingestion_handler = self.ingestion_handler
+        meteo_api_handler = ingestion_handler.meteo_api_handler
+        try:
+            if job.location is None:
+                coordinates = meteo_api_handler.get_coordinates(city_name=job.city_name)
+                if coordinates is None and self.errors():
+                    raise ValueError(self.errors())  # retried later, the geocoding request failed
+                if coordinates is None:
+                    return self.finish(job, BackfillJob.FAILED, f'No coordinates for {job.city_name}')
+                with transaction.atomic():
+                    location = ingestion_handler.store_location(job.city_name, coordinates, job.mode)
+                    if location is None:
+                        return self.finish(job, BackfillJob.FAILED, self.errors() or 'Location not stored')
+                    self.save_progress(job, location=location)
+                job.location = location
+
+            # chunks are fetched one after the other, the worker processes give the parallelism
+            date_ranges = ingestion_handler.get_date_ranges(job.city_name, job.next_date, job.end_date, job.mode,
+                                                            job.update_changed)
+            for range_start, range_end in date_ranges:
+                for chunk_start, chunk_end in meteo_api_handler.split_date_range_by(
+                        range_start, range_end, settings.OPEN_METEO_ARCHIVE_CHUNK):
+                    temperatures, precipitations, times = meteo_api_handler.get_hourly_weather_data_chunk(
+                        job.location.lat, job.location.long, chunk_start, chunk_end,
+                        settings.OPEN_METEO_ARCHIVE_CHUNK_RETRIES)
+                    with transaction.atomic():
+                        inserted, updated = ingestion_handler.store_hourly_weather_data(
+                            job.location, temperatures, precipitations, times, job.mode, job.update_changed)
+                        if self.errors():
+                            raise ValueError(self.errors())
+                        self.save_progress(job, next_date=date.fromisoformat(chunk_end) + timedelta(days=1),
+                                           chunks_done=F('chunks_done') + 1,
+                                           inserted_hours=F('inserted_hours') + len(inserted),
+                                           updated_hours=F('updated_hours') + len(updated))
+            self.finish(job, BackfillJob.DONE, '')
+        except BackfillLeaseLost:
+            self.messages.append(f'error : lease of job {job.id} lost')
+        except Exception as e:
+            self.finish(job, BackfillJob.PENDING, str(e),
+                        retry_at=timezone.now() + timedelta(seconds=settings.WEATHER_BACKFILL_RETRY_DELAY))
+
+    def save_progress(self, job, **fields):
+        """
+        Updates the job while this worker still holds it and extends its lease.
+        :param job:
+        :param fields:
+        :return:
+        """
+        saved = BackfillJob.objects.filter(id=job.id, worker=self.worker, status=BackfillJob.RUNNING).update(
+            lease_expires_at=self.lease_expires_at(), updated_at=timezone.now(), **fields)
+        if not saved:
+            raise BackfillLeaseLost(job.id)
+
+    def finish(self, job, status, error, retry_at=None):
+        """
+        Leaves the job done, failed, or pending to be retried from retry_at, if this worker still holds it.
+        :param job:
+        :param status:
+        :param error:
+        :param retry_at:
+        :return:
+        """
+        BackfillJob.objects.filter(id=job.id, worker=self.worker).update(
+            status=status, error=error, lease_expires_at=retry_at, updated_at=timezone.now())
+
+    def errors(self):
+        return '; '.join(message for message in self.messages if message.startswith('error'))
@@ -0,0 +1,249 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from weather_app.models import HourlyWeatherData, HourlySeriesBlock
+from weather_app.services.instrumentation import phase
+
+"""
+Storage of the hourly weather series: the HourlyWeatherData rows (default) or HourlySeriesBlock blocks
+holding a month of one location as float32 arrays with an implicit hourly time axis.
+Both are read through the same interface into HourlySeries numpy arrays.
+"""
+
+HOUR = 3600
+BLOCK_DTYPE = np.dtype('<f4')
+
+
+class HourlySeries:
+    """
+    Hourly weather data as numpy arrays ordered by location and time: epoch seconds (UTC) as int64,
+    temperatures and precipitations as float64 with NaN for a null precipitation.
+    """
+
+    def __init__(self, location_ids, times, temperatures, precipitations):
+        self.location_ids = location_ids
+        self.times = times
+        self.temperatures = temperatures
+        self.precipitations = precipitations
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0), np.empty(0))
+
+    @classmethod
+    def concatenate(cls, series):
+        if not series:
+            return cls.empty()
+        return cls(*(np.concatenate(columns) for columns in zip(*((part.location_ids, part.times,
+                                                                   part.temperatures, part.precipitations)
+                                                                  for part in series))))
+
+    def to_frame(self):
+        """
+        Builds the DataFrame the pandas statistics expect, with the aware UTC dates the ORM returns.
+        :return:
+        """
+        with phase('dataframe'):
+            return pd.DataFrame({'location_id': self.location_ids,
+                                 'date': pd.to_datetime(self.times, unit='s', utc=True),
+                                 'temperature': self.temperatures,
+                                 'precipitation': self.precipitations})
+
+
+def epoch(value):
+    return int(value.timestamp())
+
+
+def month_start(value):
+    """
+    Obtains the first day of the UTC month of an aware datetime or a date.
+    :param value:
+    :return:
+    """
+    if isinstance(value, datetime):
+        value = value.astimezone(dt_timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def month_hours(month):
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return (next_month - month).days * 24
+
+
+def month_epoch(month):
+    return epoch(datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc))
+
+
+def decode(data):
+    """
+    Decodes a float32 block column. Open Meteo values have at most WEATHER_COLUMNAR_DECIMALS decimals,
+    rounding gives back the float64 the row storage holds.
+    :param data:
+    :return:
+    """
+    values = np.frombuffer(data, dtype=BLOCK_DTYPE).astype(np.float64)
+    return np.round(values, settings.WEATHER_COLUMNAR_DECIMALS)
+
+
+def encode(values):
+    return values.astype(BLOCK_DTYPE).tobytes()
+
+
+class RowSeriesReader:
+    """
+    Reads the HourlyWeatherData rows into an HourlySeries.
+    """
+
+    def read(self, location_id=None, start=None, end=None, location_ids=None):
+        """
+        :param location_id: id, or scalar subquery of the id, of the location; all locations when None
+        :param start: aware datetime or None
+        :param end: aware datetime or None
+        :param location_ids: ids, or subquery of the ids, of several locations read with one query
+        :return:
+        """
+        rows = HourlyWeatherData.objects.order_by('location_id', 'date')
+        if location_id is not None:
+            rows = rows.filter(location_id=location_id)
+        if location_ids is not None:
+            rows = rows.filter(location_id__in=location_ids)
+        if start is not None:
+            rows = rows.filter(date__gte=start)
+        if end is not None:
+            rows = rows.filter(date__lte=end)
+        rows = list(rows.values_list('location_id', 'date', 'temperature', 'precipitation'))
+        if not rows:
+            return HourlySeries.empty()
+        location_ids, dates, temperatures, precipitations = zip(*rows)
+        return HourlySeries(np.array(location_ids, dtype=np.int64),
+                            np.array([epoch(value) for value in dates], dtype=np.int64),
+                            np.array(temperatures, dtype=np.float64),
+                            np.array(precipitations, dtype=np.float64))
+
+
+class ColumnarStorage:
+    """
+    Reads and writes the HourlySeriesBlock blocks. An hour is stored when its temperature is not NaN.
+    """
+
+    def read(self, location_id=None, start=None, end=None, location_ids=None):
+        """
+        Decodes the blocks of the months overlapping start..end into an HourlySeries.
+        :param location_id: id, or scalar subquery of the id, of the location; all locations when None
+        :param start: aware datetime or None
+        :param end: aware datetime or None
+        :param location_ids: ids, or subquery of the ids, of several locations read with one query
+        :return:
+        """
+        blocks = HourlySeriesBlock.objects.order_by('location_id', 'month')
+        if location_id is not None:
+            blocks = blocks.filter(location_id=location_id)
+        if location_ids is not None:
+            blocks = blocks.filter(location_id__in=location_ids)
+        if start is not None:
+            blocks = blocks.filter(month__gte=month_start(start))
+        if end is not None:
+            blocks = blocks.filter(month__lte=month_start(end))
+        first = epoch(start) if start is not None else None
+        last = epoch(end) if end is not None else None
+
+        series = list()
+        for location_id, month, temperatures, precipitations in blocks.values_list(
+                'location_id', 'month', 'temperatures', 'precipitations'):
+            temperatures = decode(temperatures)
+            times = month_epoch(month) + np.arange(len(temperatures), dtype=np.int64) * HOUR
+            stored = ~np.isnan(temperatures)
+            if first is not None:
+                stored &= times >= first
+            if last is not None:
+                stored &= times <= last
+            series.append(HourlySeries(np.full(int(stored.sum()), location_id, dtype=np.int64), times[stored],
+                                       temperatures[stored], decode(precipitations)[stored]))
+        return HourlySeries.concatenate(series)
+
+    def write(self, location, temperatures, precipitations, dates, update_changed=False, insert_only=False):
+        """
+        Merges hourly values into the month blocks of the location, reading and rewriting every touched block
+        once inside one transaction. Missing hours are inserted; stored hours are skipped (insert_only counts
+        them as conflicts) or, with update_changed, overwritten when their values differ.
+        :param location:
+        :param temperatures:
+        :param precipitations:
+        :param dates: aware datetimes on the hour
+        :param update_changed:
+        :param insert_only:
+        :return: tuple with the inserted and the updated hours as unsaved HourlyWeatherData and the conflicts
+        """
+        times = np.array([epoch(value) for value in dates], dtype=np.int64)
+        temperatures = np.array(temperatures, dtype=np.float64)
+        precipitations = np.array(precipitations, dtype=np.float64)
+        # the first value of a repeated hour wins, like the row storage; hours without temperature are not stored
+        times, first = np.unique(times, return_index=True)
+        temperatures, precipitations = temperatures[first], precipitations[first]
+        valid = ~np.isnan(temperatures)
+        times, temperatures, precipitations = times[valid], temperatures[valid], precipitations[valid]
+        if not len(times):
+            return list(), list(), 0
+
+        decimals = settings.WEATHER_COLUMNAR_DECIMALS
+        time_months = times.astype('datetime64[s]').astype('datetime64[M]')
+        inserted, updated, conflicts = list(), list(), 0
+        with transaction.atomic():
+            first_month, last_month = (month.item() for month in time_months[[0, -1]])
+            blocks = {block.month: block for block in
+                      HourlySeriesBlock.objects.filter(location=location, month__range=(first_month, last_month))}
+            new_blocks, changed_blocks = list(), list()
+            for month in np.unique(time_months):
+                selected = time_months == month
+                month = month.item()
+                month_times = times[selected]
+                block = blocks.get(month)
+                if block is None:
+                    block = HourlySeriesBlock(location=location, month=month)
+                    block_temperatures = np.full(month_hours(month), np.nan)
+                    block_precipitations = np.full(month_hours(month), np.nan)
+                else:
+                    block_temperatures = decode(block.temperatures).copy()
+                    block_precipitations = decode(block.precipitations).copy()
+                offsets = (month_times - month_epoch(month)) // HOUR
+                month_temperatures = temperatures[selected]
+                month_precipitations = precipitations[selected]
+
+                stored = ~np.isnan(block_temperatures[offsets])
+                write = ~stored
+                changed = np.zeros(len(offsets), dtype=bool)
+                if update_changed and not insert_only:
+                    rounded_precipitations = np.round(month_precipitations, decimals)
+                    changed = stored & ((block_temperatures[offsets] != np.round(month_temperatures, decimals)) |
+                                        ~((block_precipitations[offsets] == rounded_precipitations) |
+                                          (np.isnan(block_precipitations[offsets]) &
+                                           np.isnan(rounded_precipitations))))
+                    write |= changed
+                if insert_only:
+                    conflicts += int(stored.sum())
+                if not write.any():
+                    continue
+
+                block_temperatures[offsets[write]] = month_temperatures[write]
+                block_precipitations[offsets[write]] = month_precipitations[write]
+                block.temperatures = encode(block_temperatures)
+                block.precipitations = encode(block_precipitations)
+                (new_blocks if block.pk is None else changed_blocks).append(block)
+                for i in np.flatnonzero(write):
+                    record = HourlyWeatherData(temperature=float(month_temperatures[i]),
+                                               precipitation=None if np.isnan(month_precipitations[i])
+                                               else float(month_precipitations[i]),
+                                               date=datetime.fromtimestamp(int(month_times[i]), dt_timezone.utc),
+                                               location=location)
+                    (updated if changed[i] else inserted).append(record)
+
+            HourlySeriesBlock.objects.bulk_create(new_blocks)
+            HourlySeriesBlock.objects.bulk_update(changed_blocks, ['temperatures', 'precipitations'])
+        return inserted, updated, conflicts
@@ -0,0 +1,249 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncHour, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+
+# SQL truncations of the time buckets, in UTC
+TRUNCATIONS = {'hour': TruncHour, 'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth, 'quarter': TruncQuarter,
+               'year': TruncYear}
+AGGREGATE_FUNCTIONS = {'mean': Avg, 'min': Min, 'max': Max, 'sum': Sum, 'count': Count}
+
+
+class DatabaseStatisticsHandler:
+    """
+    Handler that calculates the weather statistics with SQL aggregates instead of loading the rows in pandas.
+    Its results are the same payloads as the pandas calculations of MeteoApiHandler.
+    """
+
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    @staticmethod
+    def round(value, digits: int):
+        # numpy rounding, as the pandas backend rounds numpy floats
+        return round(np.float64(value), digits)
+
+    @classmethod
+    def round_mean(cls, value):
+        # the summation drift of AVG is dropped first, so a mean like 8.575 rounds as in the other backends
+        return cls.round(cls.round(value, 10), 2)
+
+    @staticmethod
+    def beyond(threshold, above: bool):
+        """
+        Filter of the hours above, or below, the threshold. Nothing is beyond a missing threshold, as in pandas.
+        :param threshold:
+        :param above:
+        :return:
+        """
+        if threshold is None:
+            return Q(id__isnull=True)  # no hour
+        return Q(temperature__gt=threshold) if above else Q(temperature__lt=threshold)
+
+    def calculate_temperature_statistics(self, weather_data, threshold_high: float, threshold_low: float):
+        """
+        Calculates all temperature statistics from a queryset of database weather data
+        :param weather_data:
+        :param threshold_high:
+        :param threshold_low:
+        :return:
+        """
+        aggregates = weather_data.aggregate(
+            average=Avg('temperature'),
+            hours_above=Count('id', filter=self.beyond(threshold_high, True)),
+            hours_below=Count('id', filter=self.beyond(threshold_low, False))
+        )
+        avg_by_day = (weather_data.annotate(day=TruncDate('date'))
+                      .values('day')
+                      .annotate(average=Avg('temperature'))
+                      .order_by('day'))
+        max_row = weather_data.order_by('-temperature', 'id').values('temperature', 'date').first()
+        min_row = weather_data.order_by('temperature', 'id').values('temperature', 'date').first()
+
+        temperature_data = {
+            "temperature": {
+                "average": self.round(aggregates['average'], 1),
+                "average_by_day": {row['day'].isoformat(): self.round_mean(row['average']) for row in avg_by_day},
+                "max": {
+                    "value": self.round(max_row['temperature'], 1),
+                    "date_time": max_row['date'].isoformat(timespec='minutes')
+                },
+                "min": {
+                    "value": self.round(min_row['temperature'], 1),
+                    "date_time": min_row['date'].isoformat(timespec='minutes')
+                },
+                "hours_above_threshold": aggregates['hours_above'],
+                "hours_below_threshold": aggregates['hours_below']
+            }
+        }
+        return temperature_data
+
+    def calculate_precipitation_statistics(self, weather_data):
+        """
+        Calculates all precipitation statistics from a queryset of database weather data
+        :param weather_data:
+        :return:
+        """
+        aggregates = weather_data.aggregate(total=Sum('precipitation'), average=Avg('precipitation'))
+        total_by_day = {row['day'].isoformat(): row['total'] or 0.0 for row in
+                        weather_data.annotate(day=TruncDate('date'))
+                        .values('day')
+                        .annotate(total=Sum('precipitation'))
+                        .order_by('day')}
+        max_row = (weather_data.filter(precipitation__isnull=False)
+                   .order_by('-precipitation', 'id')
+                   .values('precipitation', 'date')
+                   .first())
+
+        precipitation_data = {
+            "precipitation": {
+                "total": self.round(aggregates['total'] or 0.0, 2),
+                "total_by_day": {k: self.round(v, 2) for k, v in total_by_day.items()},
+                "days_with_precipitation": sum(1 for v in total_by_day.values() if v > 0),
+                "max": {
+                    "value": max_row['precipitation'],
+                    "date": max_row['date'].date().isoformat()
+                },
+                "average": self.round(aggregates['average'], 2)
+            }
+        }
+        return precipitation_data
+
+    @staticmethod
+    def first_rows(weather_data, field: str, values: dict):
+        """
+        Obtains the first record (lowest id) of every location whose field equals the value of the location,
+        with one query for all locations.
+        :param weather_data:
+        :param field:
+        :param values: dict of value by location id
+        :return: dict of record values by location id
+        """
+        conditions = [Q(location_id=location_id, **{field: value}) for location_id, value in values.items()
+                      if value is not None]
+        rows = dict()
+        if not conditions:
+            return rows
+        for row in (weather_data.filter(reduce(or_, conditions))
+                    .order_by('location_id', 'id')
+                    .values('location_id', field, 'date')):
+            rows.setdefault(row['location_id'], row)
+        return rows
+
+    def calculate_temperature_statistics_by_location(self, weather_data, threshold_high: float,
+                                                     threshold_low: float):
+        """
+        Calculates the temperature statistics of every location from a queryset of database weather data of
+        several locations, with aggregates grouped by location instead of one set of queries per location.
+        :param weather_data:
+        :param threshold_high:
+        :param threshold_low:
+        :return: dict of statistics by location id
+        """
+        aggregates = {row['location_id']: row for row in
+                      weather_data.values('location_id')
+                      .annotate(average=Avg('temperature'),
+                                maximum=Max('temperature'),
+                                minimum=Min('temperature'),
+                                hours_above=Count('id', filter=self.beyond(threshold_high, True)),
+                                hours_below=Count('id', filter=self.beyond(threshold_low, False)))
+                      .order_by('location_id')}
+        avg_by_day = defaultdict(dict)
+        for row in (weather_data.annotate(day=TruncDate('date'))
+                    .values('location_id', 'day')
+                    .annotate(average=Avg('temperature'))
+                    .order_by('location_id', 'day')):
+            avg_by_day[row['location_id']][row['day'].isoformat()] = self.round_mean(row['average'])
+        max_rows = self.first_rows(weather_data, 'temperature',
+                                   {location_id: row['maximum'] for location_id, row in aggregates.items()})
+        min_rows = self.first_rows(weather_data, 'temperature',
+                                   {location_id: row['minimum'] for location_id, row in aggregates.items()})
+
+        temperature_data = dict()
+        for location_id, row in aggregates.items():
+            max_row, min_row = max_rows[location_id], min_rows[location_id]
+            temperature_data[location_id] = {
+                "temperature": {
+                    "average": self.round(row['average'], 1),
+                    "average_by_day": avg_by_day[location_id],
+                    "max": {
+                        "value": self.round(max_row['temperature'], 1),
+                        "date_time": max_row['date'].isoformat(timespec='minutes')
+                    },
+                    "min": {
+                        "value": self.round(min_row['temperature'], 1),
+                        "date_time": min_row['date'].isoformat(timespec='minutes')
+                    },
+                    "hours_above_threshold": row['hours_above'],
+                    "hours_below_threshold": row['hours_below']
+                }
+            }
+        return temperature_data
+
+    def calculate_precipitation_statistics_by_location(self, weather_data):
+        """
+        Calculates the precipitation statistics of every location from a queryset of database weather data of
+        several locations, with aggregates grouped by location instead of one set of queries per location.
+        :param weather_data:
+        :return: dict of statistics by location id
+        """
+        aggregates = {row['location_id']: row for row in
+                      weather_data.values('location_id')
+                      .annotate(total=Sum('precipitation'), average=Avg('precipitation'),
+                                maximum=Max('precipitation'))
+                      .order_by('location_id')}
+        total_by_day = defaultdict(dict)
+        for row in (weather_data.annotate(day=TruncDate('date'))
+                    .values('location_id', 'day')
+                    .annotate(total=Sum('precipitation'))
+                    .order_by('location_id', 'day')):
+            total_by_day[row['location_id']][row['day'].isoformat()] = row['total'] or 0.0
+        max_rows = self.first_rows(weather_data, 'precipitation',
+                                   {location_id: row['maximum'] for location_id, row in aggregates.items()})
+
+        precipitation_data = dict()
+        for location_id, row in aggregates.items():
+            max_row = max_rows[location_id]
+            location_by_day = total_by_day[location_id]
+            precipitation_data[location_id] = {
+                "precipitation": {
+                    "total": self.round(row['total'] or 0.0, 2),
+                    "total_by_day": {k: self.round(v, 2) for k, v in location_by_day.items()},
+                    "days_with_precipitation": sum(1 for v in location_by_day.values() if v > 0),
+                    "max": {
+                        "value": max_row['precipitation'],
+                        "date": max_row['date'].date().isoformat()
+                    },
+                    "average": self.round(row['average'], 2)
+                }
+            }
+        return precipitation_data
+
+    def calculate_timeseries(self, weather_data, bucket: str, aggregates: list, variables: list):
+        """
+        Aggregates a queryset of database weather data of one location in time buckets with one grouped query.
+        Missing values are skipped, a bucket without values has a None mean, min and max and a 0 sum.
+        :param weather_data:
+        :param bucket: one of time_buckets.BUCKETS
+        :param aggregates: names of time_buckets.AGGREGATES
+        :param variables: names of time_buckets.VARIABLES
+        :return: list of points with the start of the bucket and the aggregates of every variable
+        """
+        rows = (weather_data.annotate(bucket=TRUNCATIONS[bucket]('date', tzinfo=dt_timezone.utc))
+                .values('bucket')
+                .annotate(**{f'{variable}_{aggregate}': AGGREGATE_FUNCTIONS[aggregate](variable)
+                             for variable in variables for aggregate in aggregates})
+                .order_by('bucket'))
+        points = list()
+        for row in rows:
+            point = {'start': row['bucket'].isoformat(timespec='minutes')}
+            for variable in variables:
+                point[variable] = {aggregate: row[f'{variable}_{aggregate}'] for aggregate in aggregates}
+                if 'sum' in aggregates and point[variable]['sum'] is None:
+                    point[variable]['sum'] = 0.0
+            points.append(point)
+        return points
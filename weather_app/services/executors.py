@@ -0,0 +1,90 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from weather_app.services.instrumentation import propagate
+
+"""
+Executors of the blocking work: the ORM and the statistics of the async views run in a pool of threads
+so the event loop only waits for them, the statistics of large series in a pool of processes so they
+don't hold the GIL of the request threads.
+"""
+
+_executor = None
+_executor_lock = threading.Lock()
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Obtains the thread pool shared by the whole process, created on first use from the settings.
+    :return:
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.WEATHER_ASYNC_EXECUTOR_WORKERS,
+                                           thread_name_prefix='weather-sync')
+        return _executor
+
+
+def call_closing_connections(function, *args, **kwargs):
+    try:
+        return function(*args, **kwargs)
+    finally:
+        # the pool threads outlive the request, their connections are closed as at the end of a request
+        close_old_connections()
+
+
+async def run_sync(function, *args, **kwargs):
+    """
+    Runs a blocking function in the executor threads and waits for its result without blocking the loop.
+    :param function:
+    :param args:
+    :param kwargs:
+    :return:
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(),
+                                      propagate(partial(call_closing_connections, function, *args, **kwargs)))
+
+
+def setup_worker_process():
+    # spawned processes import the apps from scratch
+    import django
+    django.setup()
+
+
+def get_process_pool():
+    """
+    Obtains the process pool of the statistics shared by the whole process, created on first use with
+    WEATHER_STATISTICS_PROCESSES processes. The processes are spawned, not forked, as forking a process
+    running request threads can copy locks held by them.
+    :return: the pool or None when WEATHER_STATISTICS_PROCESSES is 0
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None and settings.WEATHER_STATISTICS_PROCESSES:
+            _process_pool = ProcessPoolExecutor(max_workers=settings.WEATHER_STATISTICS_PROCESSES,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=setup_worker_process)
+        return _process_pool
+
+
+def discard_process_pool(pool):
+    """
+    Drops a broken process pool, the next get_process_pool creates a new one.
+    :param pool:
+    :return:
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False)
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from weather_app.models import Location, GeocodingCacheEntry
+
+
+class GeocodingCache:
+    """
+    Layered cache of the geocoding API answers: a per-process LRU, then the stored Location records and the
+    GeocodingCacheEntry table. A None value is a cached name without results (negative caching).
+    """
+
+    MISS = object()
+
+    def __init__(self, max_size: int = None, ttl: float = None, negative_ttl: float = None):
+        self.max_size = max_size if max_size is not None else settings.GEOCODING_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.GEOCODING_CACHE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else settings.GEOCODING_NEGATIVE_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(city_name: str):
+        return city_name.strip().lower()
+
+    def get(self, city_name):
+        """
+        Obtains the cached coordinates of the city, None for a cached name without results or MISS.
+        :param city_name:
+        :return:
+        """
+        if city_name is None:
+            return self.MISS
+        key = self.normalize(city_name)
+        coordinates = self._get_local(key)
+        if coordinates is not self.MISS:
+            return coordinates
+
+        location = Location.objects.filter(locality=city_name).only('lat', 'long').first()
+        if location is not None:
+            coordinates = {'lat': location.lat, 'lon': location.long}
+            self._set_local(key, coordinates, self.ttl)
+            return coordinates
+
+        entry = GeocodingCacheEntry.objects.filter(name=key).first()
+        if entry is not None:
+            found = entry.lat is not None
+            ttl = self.ttl if found else self.negative_ttl
+            age = (timezone.now() - entry.updated_at).total_seconds()
+            if not ttl or age < ttl:
+                coordinates = {'lat': entry.lat, 'lon': entry.long} if found else None
+                self._set_local(key, coordinates, ttl - age if ttl else None)
+                return coordinates
+        return self.MISS
+
+    def set(self, city_name, coordinates):
+        """
+        Stores the geocoding API answer of the city in every layer.
+        :param city_name:
+        :param coordinates: dict with lat and lon or None when the API has no results
+        :return:
+        """
+        key = self.normalize(city_name)
+        GeocodingCacheEntry.objects.update_or_create(
+            name=key,
+            defaults={'lat': coordinates['lat'] if coordinates else None,
+                      'long': coordinates['lon'] if coordinates else None})
+        self._set_local(key, coordinates, self.ttl if coordinates else self.negative_ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return self.MISS
+            coordinates, expires_at = cached
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return self.MISS
+            self._entries.move_to_end(key)
+            return coordinates
+
+    def _set_local(self, key, coordinates, ttl):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._entries[key] = (coordinates, time.monotonic() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+geocoding_cache = GeocodingCache()
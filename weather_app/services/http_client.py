@@ -0,0 +1,147 @@
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from weather_app.services.instrumentation import phase
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ConnectionCounters:
+    """
+    Thread safe counters of the HTTP requests sent and of the connections opened to send them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def add_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def add_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    @property
+    def reused_connections(self):
+        return self.requests - self.new_connections
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections
+        }
+
+
+def counting_pool_class(pool_class, counters: ConnectionCounters):
+    """
+    Builds a urllib3 connection pool class that reports every request and every new connection to counters.
+    :param pool_class:
+    :param counters:
+    :return:
+    """
+    class CountingConnectionPool(pool_class):
+
+        def _new_conn(self):
+            counters.add_new_connection()
+            return super()._new_conn()
+
+        def _make_request(self, *args, **kwargs):
+            counters.add_request()
+            return super()._make_request(*args, **kwargs)
+
+    return CountingConnectionPool
+
+
+class PooledTransport(HTTPAdapter):
+    """
+    Requests adapter with keep-alive connection pools that counts reused and new connections.
+    """
+
+    def __init__(self, pool_size: int, max_retries, counters: ConnectionCounters = None):
+        self.counters = counters or ConnectionCounters()
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting_pool_class(HTTPConnectionPool, self.counters),
+            'https': counting_pool_class(HTTPSConnectionPool, self.counters)
+        }
+
+
+class HttpClient:
+    """
+    Shared HTTP client of the Open Meteo handlers: pooled keep-alive connections, connect and read timeouts,
+    exponential backoff retries on 429 and 5xx answers and a limit of requests in flight at the same time.
+    """
+
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_factor: float = None, transport: HTTPAdapter = None,
+                 max_concurrency: int = None):
+        self.pool_size = pool_size or settings.HTTP_CLIENT_POOL_SIZE
+        self.max_concurrency = max_concurrency or settings.HTTP_CLIENT_MAX_CONCURRENCY
+        self._concurrency = threading.BoundedSemaphore(self.max_concurrency)
+        self.timeout = (connect_timeout or settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+                        read_timeout or settings.HTTP_CLIENT_READ_TIMEOUT)
+        if max_retries is None:
+            max_retries = settings.HTTP_CLIENT_MAX_RETRIES
+        if backoff_factor is None:
+            backoff_factor = settings.HTTP_CLIENT_BACKOFF_FACTOR
+        retries = Retry(total=max_retries,
+                        backoff_factor=backoff_factor,
+                        status_forcelist=RETRY_STATUSES,
+                        allowed_methods=frozenset(['GET']),
+                        respect_retry_after_header=True,
+                        raise_on_status=False)
+        self.transport = transport or PooledTransport(pool_size=self.pool_size, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount('http://', self.transport)
+        self.session.mount('https://', self.transport)
+
+    def get(self, url: str, params: dict = None, **kwargs):
+        """
+        Sends a GET request through the pooled session, waiting while max_concurrency requests are in flight.
+        :param url:
+        :param params:
+        :return:
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        with self._concurrency, phase('upstream'):
+            return self.session.get(url, params=params, **kwargs)
+
+    def stats(self):
+        """
+        Obtains the connection counters of the transport, empty for a transport that doesn't count them.
+        :return:
+        """
+        counters = getattr(self.transport, 'counters', None)
+        return counters.as_dict() if counters is not None else dict()
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Obtains the HTTP client shared by the whole process, created on first use from the settings.
+    :return:
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+from weather_app.services.instrumentation import propagate
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+
+
+INGESTION_MODES = ('insert', 'upsert')
+
+
+class IngestionHandler:
+    """
+    Handler that loads the archive weather data of cities into the database.
+    Upstream requests of many cities run concurrently in a thread pool, database writes stay in the caller thread.
+    """
+
+    def __init__(self, messages: list, model_handler: ModelHandler, meteo_api_handler: MeteoApiHandler,
+                 max_workers: int = None, group_size: int = None):
+        self.messages = messages
+        self.model_handler = model_handler
+        self.meteo_api_handler = meteo_api_handler
+        self.max_workers = max_workers or settings.WEATHER_INGEST_MAX_WORKERS
+        self.group_size = group_size or settings.OPEN_METEO_ARCHIVE_MAX_LOCATIONS
+
+    def get_date_ranges(self, city_name, start_date, end_date, mode, update_changed, model_handler=None):
+        """
+        Obtains the date ranges to request to the archive: in upsert mode without update_changed
+        only the days with hours not stored yet.
+        :param city_name:
+        :param start_date:
+        :param end_date:
+        :param mode:
+        :param update_changed:
+        :param model_handler:
+        :return: list of (start_date, end_date) tuples
+        """
+        model_handler = model_handler or self.model_handler
+        if mode == 'upsert' and not update_changed:
+            return model_handler.get_missing_date_ranges(location=model_handler.get_location(city_name),
+                                                         start_date=start_date,
+                                                         end_date=end_date)
+        return [(start_date, end_date)]
+
+    def store(self, city_name, coordinates, temperatures, precipitations, times, mode, update_changed,
+              model_handler=None):
+        """
+        Writes the location and the hourly weather data column arrays of one city. Without hours, because every
+        chunk failed or the date range is empty, no location is written and the failure is reported.
+        :param city_name:
+        :param coordinates:
+        :param temperatures:
+        :param precipitations:
+        :param times:
+        :param mode:
+        :param update_changed:
+        :param model_handler:
+        :return: tuple with the location, the inserted records and the updated records
+        """
+        model_handler = model_handler or self.model_handler
+        if not times:
+            location = model_handler.get_location(city_name) if mode == 'upsert' else None
+            if location is None:
+                model_handler.messages.append(f'error : No hourly weather data for {city_name}')
+                return None, None, list()
+            return location, list(), list()
+        location = self.store_location(city_name, coordinates, mode, model_handler=model_handler)
+        if location is None:
+            return None, None, list()
+        inserted, updated = self.store_hourly_weather_data(location, temperatures, precipitations, times, mode,
+                                                           update_changed, model_handler=model_handler)
+        return location, inserted, updated
+
+    def store_location(self, city_name, coordinates, mode, model_handler=None):
+        """
+        Writes the location of one city, reusing the stored one in upsert mode.
+        :param city_name:
+        :param coordinates:
+        :param mode:
+        :param model_handler:
+        :return:
+        """
+        model_handler = model_handler or self.model_handler
+        if mode == 'upsert':
+            return model_handler.upsert_location(locality=city_name,
+                                                 latitude=coordinates['lat'],
+                                                 longitude=coordinates['lon'])
+        return model_handler.insert_location(locality=city_name,
+                                             latitude=coordinates['lat'],
+                                             longitude=coordinates['lon'])
+
+    def store_hourly_weather_data(self, location, temperatures, precipitations, times, mode, update_changed,
+                                  model_handler=None):
+        """
+        Writes hourly weather data column arrays of a stored location.
+        :param location:
+        :param temperatures:
+        :param precipitations:
+        :param times:
+        :param mode:
+        :param update_changed:
+        :param model_handler:
+        :return: tuple with the inserted records and the updated records
+        """
+        model_handler = model_handler or self.model_handler
+        if mode == 'upsert':
+            return model_handler.upsert_hourly_weather_data(temperatures=temperatures,
+                                                            precipitations=precipitations,
+                                                            times=times,
+                                                            location=location,
+                                                            update_changed=update_changed)
+        inserted = model_handler.insert_hourly_weather_data_bulk(temperatures=temperatures,
+                                                                 precipitations=precipitations,
+                                                                 times=times,
+                                                                 location=location)
+        return inserted, list()
+
+    def ingest_stream(self, city_name, coordinates, start_date, end_date, mode, update_changed):
+        """
+        Loads one city streaming the archive answers: every chunk of hours is written with the bulk path
+        as soon as it is parsed and only the counts are kept. A new location is only written with its first
+        hours, so a request whose windows all fail leaves nothing behind.
+        :param city_name:
+        :param coordinates:
+        :param start_date:
+        :param end_date:
+        :param mode:
+        :param update_changed:
+        :return: tuple with the location, the number of inserted hours and the number of updated hours
+        """
+        date_ranges = self.get_date_ranges(city_name, start_date, end_date, mode, update_changed)
+        location = self.model_handler.get_location(city_name) if mode == 'upsert' else None
+        inserted_hours = 0
+        updated_hours = 0
+        for temperatures, precipitations, times in self.meteo_api_handler.iter_hourly_weather_data(
+                latitude=coordinates['lat'], longitude=coordinates['lon'], date_ranges=date_ranges):
+            if location is None:
+                location = self.store_location(city_name, coordinates, mode)
+                if location is None:
+                    return None, 0, 0
+            inserted, updated = self.store_hourly_weather_data(location, temperatures, precipitations, times,
+                                                               mode, update_changed)
+            inserted_hours += len(inserted)
+            updated_hours += len(updated)
+        return location, inserted_hours, updated_hours
+
+    def ingest_many(self, city_names, start_date, end_date, mode='insert', update_changed=False):
+        """
+        Loads many cities: geocoding and grouped multi-location archive requests fan out to the thread pool
+        and every answer is written with the bulk database path as soon as it arrives.
+        :param city_names:
+        :param start_date:
+        :param end_date:
+        :param mode:
+        :param update_changed:
+        :return: list with the status of every city, in the order of city_names
+        """
+        statuses = {city_name: {'city_name': city_name, 'status': 'error', 'inserted_hours': 0,
+                                'updated_hours': 0, 'message': list()}
+                    for city_name in dict.fromkeys(city_names)}
+        coordinates = dict()
+        cache = self.meteo_api_handler.geocoding_cache
+        for city_name in statuses:
+            cached = cache.get(city_name) if cache is not None else None
+            if cache is not None and cached is not cache.MISS:
+                coordinates[city_name] = cached
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            geocoding = {executor.submit(propagate(self.meteo_api_handler.request_coordinates), city_name): city_name
+                         for city_name in statuses if city_name not in coordinates}
+            for future in as_completed(geocoding):
+                city_name = geocoding[future]
+                try:
+                    coordinates[city_name] = future.result()
+                except Exception as e:
+                    statuses[city_name]['message'].append(f'error: {e}')
+                    continue
+                if cache is not None:
+                    cache.set(city_name, coordinates[city_name])
+
+            # cities needing the same date ranges share archive requests of up to group_size coordinates
+            pending = dict()
+            for city_name, status in statuses.items():
+                if city_name not in coordinates:
+                    continue
+                if coordinates[city_name] is None:
+                    status['message'].append(f'No coordinates for {city_name}')
+                    continue
+                date_ranges = self.get_date_ranges(city_name, start_date, end_date, mode, update_changed,
+                                                   model_handler=ModelHandler(status['message']))
+                pending.setdefault(tuple(date_ranges), list()).append(city_name)
+
+            archive = dict()
+            for date_ranges, group_city_names in pending.items():
+                for first in range(0, len(group_city_names), self.group_size):
+                    group = group_city_names[first:first + self.group_size]
+                    get_ranges = propagate(self.meteo_api_handler.get_hourly_weather_data_multi_for_ranges)
+                    future = executor.submit(get_ranges,
+                                             locations=[(coordinates[city_name]['lat'],
+                                                         coordinates[city_name]['lon']) for city_name in group],
+                                             date_ranges=list(date_ranges),
+                                             group_size=self.group_size)
+                    archive[future] = group
+
+            for future in as_completed(archive):
+                group = archive[future]
+                try:
+                    hourly_weather_data = future.result()
+                except Exception as e:
+                    for city_name in group:
+                        statuses[city_name]['message'].append(f'error: {e}')
+                    continue
+                for city_name, (temperatures, precipitations, times) in zip(group, hourly_weather_data):
+                    status = statuses[city_name]
+                    location, inserted, updated = self.store(city_name, coordinates[city_name], temperatures,
+                                                             precipitations, times, mode, update_changed,
+                                                             model_handler=ModelHandler(status['message']))
+                    if location is not None:
+                        status['status'] = 'ok'
+                        status['inserted_hours'] = len(inserted)
+                        status['updated_hours'] = len(updated)
+        return list(statuses.values())
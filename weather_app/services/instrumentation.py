@@ -0,0 +1,222 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+"""
+Request instrumentation of the weather app. InstrumentationMiddleware counts every request and its duration in
+the process metrics; a sampled request also gets a RequestProfile, found through a context variable, where the
+code records the time of its phases: 'upstream' (Open Meteo requests), 'db' (every ORM query, counted by a
+database execute wrapper), 'load' (weather data read for the statistics), 'dataframe' (DataFrames of the pandas
+calculations), 'statistics' and 'serialize'. Outside a sampled request recording a phase is a context variable
+lookup.
+"""
+
+_profile = contextvars.ContextVar('weather_request_profile', default=None)
+# phases open in the context, a nested phase of the same name is not recorded twice
+_open_phases = contextvars.ContextVar('weather_open_phases', default=frozenset())
+
+# upper bounds of the request duration histogram, seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestProfile:
+    """
+    Time and number of calls of every phase of a request. The phases may be recorded from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = dict()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {name: {'ms': round(seconds * 1000, 3), 'calls': calls}
+                    for name, (seconds, calls) in self.phases.items()}
+
+    def server_timing(self, total: float):
+        """
+        Builds the Server-Timing header of the phases and the whole request.
+        :param total: seconds of the request
+        :return:
+        """
+        with self._lock:
+            metrics = [f'{name};dur={seconds * 1000:.3f};desc="{calls} calls"'
+                       for name, (seconds, calls) in self.phases.items()]
+        return ', '.join(metrics + [f'total;dur={total * 1000:.3f}'])
+
+
+def current_profile():
+    return _profile.get()
+
+
+def activate(profile):
+    """
+    Makes the profile the one of the current context, the token resets it.
+    :param profile: RequestProfile or None
+    :return: token
+    """
+    return _profile.set(profile)
+
+
+def deactivate(token):
+    _profile.reset(token)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Records the wall time of the block as the phase name of the current request profile, if there is one.
+    :param name:
+    :return:
+    """
+    profile = _profile.get()
+    open_phases = _open_phases.get()
+    if profile is None or name in open_phases:
+        yield
+        return
+    token = _open_phases.set(open_phases | {name})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+        _open_phases.reset(token)
+
+
+def propagate(function):
+    """
+    Wraps a function submitted to a thread pool so it records its phases in the profile of the submitting
+    request. A context can't be entered by two threads, every submission needs its own wrapper.
+    :param function:
+    :return:
+    """
+    if _profile.get() is None:
+        return function
+    context = contextvars.copy_context()
+
+    @wraps(function)
+    def run(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return run
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper recording every query of a sampled request as the 'db' phase.
+    """
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add('db', time.perf_counter() - start)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # connection_created is sent again when a closed connection reconnects
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in values.items()) + '}'
+
+
+class Metrics:
+    """
+    Counters of the requests of the process, exposed in the Prometheus text format: requests by endpoint,
+    method and status, a histogram of their duration by endpoint and the totals of the phases of the sampled
+    requests. Every process of a server keeps its own counters.
+    """
+
+    def __init__(self, buckets: tuple = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = dict()
+        self.durations = dict()
+        self.phases = dict()
+        self.sampled = 0
+
+    def observe(self, endpoint: str, method: str, status: int, seconds: float, profile: RequestProfile = None):
+        """
+        Counts a request.
+        :param endpoint: name of the url
+        :param method:
+        :param status:
+        :param seconds: duration of the request
+        :param profile: phases of a sampled request
+        :return:
+        """
+        key = (endpoint, method, status)
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.durations.setdefault(endpoint, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            if profile is not None:
+                self.sampled += 1
+                for name, (phase_seconds, calls) in profile.phases.items():
+                    totals = self.phases.setdefault(name, [0.0, 0])
+                    totals[0] += phase_seconds
+                    totals[1] += calls
+
+    def render(self):
+        """
+        Obtains the metrics in the Prometheus text exposition format.
+        :return:
+        """
+        with self._lock:
+            lines = ['# HELP weather_requests_total Requests answered by endpoint, method and status.',
+                     '# TYPE weather_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'weather_requests_total{labels(endpoint=endpoint, method=method, status=status)} '
+                             f'{count}')
+            lines += ['# HELP weather_request_duration_seconds Duration of the requests by endpoint.',
+                      '# TYPE weather_request_duration_seconds histogram']
+            for endpoint, (counts, total, count) in sorted(self.durations.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'weather_request_duration_seconds_bucket{labels(endpoint=endpoint, le=bound)} '
+                                 f'{bucket_count}')
+                lines.append(f'weather_request_duration_seconds_bucket{labels(endpoint=endpoint, le="+Inf")} {count}')
+                lines.append(f'weather_request_duration_seconds_sum{labels(endpoint=endpoint)} {total}')
+                lines.append(f'weather_request_duration_seconds_count{labels(endpoint=endpoint)} {count}')
+            lines += ['# HELP weather_sampled_requests_total Requests whose phases were recorded.',
+                      '# TYPE weather_sampled_requests_total counter',
+                      f'weather_sampled_requests_total {self.sampled}',
+                      '# HELP weather_phase_seconds_total Time of the phases of the sampled requests.',
+                      '# TYPE weather_phase_seconds_total counter']
+            lines += [f'weather_phase_seconds_total{labels(phase=name)} {seconds}'
+                      for name, (seconds, _) in sorted(self.phases.items())]
+            lines += ['# HELP weather_phase_calls_total Calls of the phases of the sampled requests, '
+                      'the db phase counts the queries.',
+                      '# TYPE weather_phase_calls_total counter']
+            lines += [f'weather_phase_calls_total{labels(phase=name)} {calls}'
+                      for name, (_, calls) in sorted(self.phases.items())]
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self.requests.clear()
+            self.durations.clear()
+            self.phases.clear()
+            self.sampled = 0
+
+
+metrics = Metrics()
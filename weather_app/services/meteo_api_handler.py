@@ -1,43 +1,88 @@
 
-import requests
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import islice
+
 import pandas as pd
 import numpy as np
+from django.conf import settings
+from requests import RequestException
+
 from weather_app.models import Location
+from weather_app.services.archive_stream import parse_archive_stream, iter_text
+from weather_app.services.http_client import get_default_client
+from weather_app.services.instrumentation import phase, propagate
 
 class MeteoApiHandler:
     """
         Handler that manages all queries to the Open Meteo Geocoding API and the data it receives.
     """
 
-    def __init__(self, messages: list):
+    def __init__(self, messages: list, geocoding_cache=None, http_client=None):
         self.messages = messages
+        self.geocoding_cache = geocoding_cache
+        self.http_client = http_client or get_default_client()
 
     def get_coordinates(self, city_name):
         """
-        Obtains latitude and longitude by city name from API.
+        Obtains latitude and longitude by city name, from the geocoding cache if any or from API.
+        A failed request is not cached, only an answer without results is cached as a name without coordinates.
         :param city_name:
         :return:
         """
-        url = "https://geocoding-api.open-meteo.com/v1/search"
-        params = {
+        if self.geocoding_cache is not None:
+            coordinates = self.geocoding_cache.get(city_name)
+            if coordinates is not self.geocoding_cache.MISS:
+                if coordinates is None:
+                    self.messages.append(f"No coordinates for {city_name}")
+                return coordinates
+
+        try:
+            coordinates = self.request_coordinates(city_name)
+        except (RequestException, ValueError) as e:
+            self.messages.append(f"error : Geocoding API error {e}")
+            return None
+        if self.geocoding_cache is not None and city_name is not None:
+            self.geocoding_cache.set(city_name, coordinates)
+        if coordinates is None:
+            self.messages.append(f"No coordinates for {city_name}")
+        return coordinates
+
+    def request_coordinates(self, city_name):
+        """
+        Obtains latitude and longitude by city name from API.
+        :param city_name:
+        :return: dict with lat and lon or None when the API has no results, HTTPError when it answers an error
+        """
+        url = settings.OPEN_METEO_GEOCODING_URL
+        response = self.http_client.get(url, params=self.geocoding_params(city_name))
+        response.raise_for_status()
+        return self.coordinates_from(response.json())
+
+    @staticmethod
+    def geocoding_params(city_name):
+        return {
             "name": city_name,
             "count": 1,  # only first coincidence
             "language": "es",
             "format": "json"
         }
-        response = requests.get(url, params=params)
-        data = response.json()
 
+    @staticmethod
+    def coordinates_from(data):
+        """
+        Obtains latitude and longitude from a geocoding API answer.
+        :param data:
+        :return: dict with lat and lon or None when the API has no results
+        """
         if "results" in data and len(data["results"]) > 0:
             coordinates = dict()
             coordinates['lat']: float = data["results"][0]["latitude"]
             coordinates['lon']: float = data["results"][0]["longitude"]
             return coordinates
         else:
-            self.messages.append(f"No coordinates for {city_name}")
-            coordinates = dict()
-            coordinates['lat'] = None
-            coordinates['lon'] = None
             return None
 
     def get_hourly_weather_data(self, latitude, longitude, start_date, end_date):
@@ -49,8 +94,13 @@ class MeteoApiHandler:
         :param end_date:
         :return:
         """
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
+        url = settings.OPEN_METEO_ARCHIVE_URL
+        response = self.http_client.get(url, params=self.archive_params(latitude, longitude, start_date, end_date))
+        return self.hourly_columns(response.json())
+
+    @staticmethod
+    def archive_params(latitude, longitude, start_date, end_date):
+        return {
             "latitude": latitude,
             "longitude": longitude,
             "start_date": start_date,
@@ -58,13 +108,235 @@ class MeteoApiHandler:
             "hourly": ["temperature_2m", "precipitation"],
             "timezone": "Europe/Madrid"
         }
-        response = requests.get(url, params=params)
-        data = response.json()
+
+    @staticmethod
+    def hourly_columns(data):
+        """
+        Obtains the hourly column arrays of an archive API answer.
+        :param data:
+        :return: tuple with the temperatures, the precipitations and the times
+        """
+        if 'reason' in data:
+            raise ValueError(f"Archive API error: {data['reason']}")
         temperatures = data['hourly']['temperature_2m']
         precipitations = data['hourly']['precipitation']
         times = data['hourly']['time']
         return temperatures, precipitations, times
 
+    def get_hourly_weather_data_for_ranges(self, latitude, longitude, date_ranges, chunk=None, max_workers: int = None,
+                                           retries: int = None):
+        """
+        Obtains hourly weather data only for the given date sub-ranges and merges them in order.
+        Long ranges are fetched in concurrent chunks, the chunks still failing after their retries are left out
+        so the hours of the others can be stored and the missing days requested again later.
+        :param latitude:
+        :param longitude:
+        :param date_ranges: list of (start_date, end_date) tuples
+        :param chunk: 'month', 'year' or a number of days
+        :param max_workers:
+        :param retries:
+        :return:
+        """
+        temperatures, precipitations, times = list(), list(), list()
+        for _, columns in self.iter_hourly_weather_data_chunks(latitude, longitude, date_ranges, chunk=chunk,
+                                                               max_workers=max_workers, retries=retries):
+            if columns is None:
+                continue
+            range_temperatures, range_precipitations, range_times = columns
+            temperatures.extend(range_temperatures)
+            precipitations.extend(range_precipitations)
+            times.extend(range_times)
+        return temperatures, precipitations, times
+
+    def iter_hourly_weather_data_chunks(self, latitude, longitude, date_ranges, chunk=None, max_workers: int = None,
+                                        retries: int = None):
+        """
+        Fetches the date sub-ranges split in chunks with a pool of up to max_workers threads and yields the
+        answers in date order. Only max_workers chunks are requested ahead of the one being yielded.
+        :param latitude:
+        :param longitude:
+        :param date_ranges: list of (start_date, end_date) tuples
+        :param chunk: 'month', 'year' or a number of days
+        :param max_workers:
+        :param retries: attempts of a failed chunk after the first one
+        :return: iterator of ((start_date, end_date), columns) tuples, columns is None for a failed chunk
+        """
+        chunk = chunk or settings.OPEN_METEO_ARCHIVE_CHUNK
+        max_workers = max_workers or settings.OPEN_METEO_ARCHIVE_CHUNK_WORKERS
+        retries = settings.OPEN_METEO_ARCHIVE_CHUNK_RETRIES if retries is None else retries
+        windows = iter([window for start_date, end_date in date_ranges
+                        for window in self.split_date_range_by(start_date, end_date, chunk)])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit(window):
+                return window, executor.submit(propagate(self.get_hourly_weather_data_chunk), latitude,
+                                               longitude, window[0], window[1], retries)
+
+            pending = deque(submit(window) for window in islice(windows, max_workers))
+            while pending:
+                window, future = pending.popleft()
+                next_window = next(windows, None)
+                if next_window is not None:
+                    pending.append(submit(next_window))
+                try:
+                    columns = future.result()
+                except (RequestException, ValueError, KeyError) as e:
+                    self.messages.append(f'error : archive chunk {window[0]} - {window[1]} failed: {e}')
+                    columns = None
+                yield window, columns
+
+    def get_hourly_weather_data_chunk(self, latitude, longitude, start_date, end_date, retries: int):
+        """
+        Obtains the hourly weather data of one chunk retrying it on its own, with exponential backoff,
+        when the request fails or the answer is not valid.
+        :param latitude:
+        :param longitude:
+        :param start_date:
+        :param end_date:
+        :param retries:
+        :return:
+        """
+        for attempt in range(retries + 1):
+            try:
+                return self.get_hourly_weather_data(latitude=latitude, longitude=longitude,
+                                                    start_date=start_date, end_date=end_date)
+            except (RequestException, ValueError, KeyError):
+                if attempt == retries:
+                    raise
+                time.sleep(settings.HTTP_CLIENT_BACKOFF_FACTOR * 2 ** attempt)
+
+    def iter_hourly_weather_data(self, latitude, longitude, date_ranges, chunk_size: int = None,
+                                 window_days: int = None):
+        """
+        Streams hourly weather data for the given date sub-ranges in chunks of chunk_size hours.
+        Every range is requested in windows of window_days and every answer is parsed incrementally
+        into typed arrays, so the memory used doesn't grow with the length of the ranges.
+        A window failing is reported in messages and left out, the others are still yielded.
+        :param latitude:
+        :param longitude:
+        :param date_ranges: list of (start_date, end_date) tuples
+        :param chunk_size:
+        :param window_days:
+        :return: iterator of (temperatures, precipitations, times) tuples
+        """
+        chunk_size = chunk_size or settings.WEATHER_INGEST_BATCH_SIZE
+        window_days = window_days or settings.WEATHER_STREAM_WINDOW_DAYS
+        url = settings.OPEN_METEO_ARCHIVE_URL
+        for start_date, end_date in date_ranges:
+            for window_start, window_end in self.split_date_range(start_date, end_date, window_days):
+                params = self.archive_params(latitude, longitude, window_start, window_end)
+                try:
+                    with self.http_client.get(url, params=params, stream=True) as response:
+                        columns = parse_archive_stream(iter_text(response.iter_content(chunk_size=64 * 1024)))
+                except (RequestException, ValueError, KeyError) as e:
+                    self.messages.append(f'error : archive window {window_start} - {window_end} failed: {e}')
+                    continue
+                yield from columns.iter_chunks(chunk_size)
+
+    @staticmethod
+    def split_date_range(start_date, end_date, days: int):
+        """
+        Splits a date range in consecutive windows of up to days days.
+        :param start_date:
+        :param end_date:
+        :param days:
+        :return: list of (start_date, end_date) tuples of ISO dates, both ends included
+        """
+        first_day = date.fromisoformat(str(start_date)[:10])
+        last_day = date.fromisoformat(str(end_date)[:10])
+        windows = list()
+        while first_day <= last_day:
+            window_end = min(first_day + timedelta(days=days - 1), last_day)
+            windows.append((first_day.isoformat(), window_end.isoformat()))
+            first_day = window_end + timedelta(days=1)
+        return windows
+
+    @staticmethod
+    def split_date_range_by(start_date, end_date, chunk):
+        """
+        Splits a date range in calendar months, calendar years or windows of a number of days.
+        :param start_date:
+        :param end_date:
+        :param chunk: 'month', 'year' or a number of days
+        :return: list of (start_date, end_date) tuples of ISO dates, both ends included
+        """
+        if chunk not in ('month', 'year'):
+            return MeteoApiHandler.split_date_range(start_date, end_date, int(chunk))
+        first_day = date.fromisoformat(str(start_date)[:10])
+        last_day = date.fromisoformat(str(end_date)[:10])
+        windows = list()
+        while first_day <= last_day:
+            if chunk == 'year':
+                next_first_day = date(first_day.year + 1, 1, 1)
+            else:
+                next_first_day = date(first_day.year + first_day.month // 12, first_day.month % 12 + 1, 1)
+            window_end = min(next_first_day - timedelta(days=1), last_day)
+            windows.append((first_day.isoformat(), window_end.isoformat()))
+            first_day = next_first_day
+        return windows
+
+    def get_hourly_weather_data_multi(self, locations, start_date, end_date, group_size: int = None):
+        """
+        Obtains hourly weather data of many locations sending up to group_size coordinates per API request.
+        :param locations: list of (latitude, longitude) tuples
+        :param start_date:
+        :param end_date:
+        :param group_size:
+        :return: list of (temperatures, precipitations, times) tuples in the order of locations
+        """
+        group_size = group_size or settings.OPEN_METEO_ARCHIVE_MAX_LOCATIONS
+        url = settings.OPEN_METEO_ARCHIVE_URL
+        hourly_weather_data = list()
+        for first in range(0, len(locations), group_size):
+            group = locations[first:first + group_size]
+            params = {
+                "latitude": ",".join(str(latitude) for latitude, _ in group),
+                "longitude": ",".join(str(longitude) for _, longitude in group),
+                "start_date": start_date,
+                "end_date": end_date,
+                "hourly": ["temperature_2m", "precipitation"],
+                "timezone": "Europe/Madrid"
+            }
+            response = self.http_client.get(url, params=params)
+            data = response.json()
+            # one location answers with a single object, many locations with a list in the request order
+            blocks = data if isinstance(data, list) else [data]
+            if len(blocks) != len(group):
+                raise ValueError(f'Archive API returned {len(blocks)} locations for {len(group)} coordinates')
+            for block in blocks:
+                hourly_weather_data.append((block['hourly']['temperature_2m'],
+                                            block['hourly']['precipitation'],
+                                            block['hourly']['time']))
+        return hourly_weather_data
+
+    def get_hourly_weather_data_multi_for_ranges(self, locations, date_ranges, group_size: int = None):
+        """
+        Obtains hourly weather data of many locations for the given date sub-ranges and merges them in order.
+        :param locations: list of (latitude, longitude) tuples
+        :param date_ranges: list of (start_date, end_date) tuples
+        :param group_size:
+        :return: list of (temperatures, precipitations, times) tuples in the order of locations
+        """
+        hourly_weather_data = [(list(), list(), list()) for _ in locations]
+        for start_date, end_date in date_ranges:
+            range_data = self.get_hourly_weather_data_multi(locations, start_date, end_date, group_size=group_size)
+            for columns, range_columns in zip(hourly_weather_data, range_data):
+                for column, range_column in zip(columns, range_columns):
+                    column.extend(range_column)
+        return hourly_weather_data
+
+    @staticmethod
+    def to_frame(weather_data):
+        """
+        Builds the DataFrame of the weather data: database records, or a DataFrame such as HourlySeries.to_frame().
+        :param weather_data:
+        :return:
+        """
+        with phase('dataframe'):
+            if isinstance(weather_data, pd.DataFrame):
+                return weather_data.copy()
+            return pd.DataFrame(list(weather_data))
+
     def calculate_temperature_statistics(self, weather_data, threshold_high: float, threshold_low: float):
         """
         Calculates all temperature statistics from database weather data
@@ -73,15 +345,15 @@ class MeteoApiHandler:
         :param threshold_low:
         :return:
         """
-        df_weather = pd.DataFrame(list(weather_data))
+        df_weather = self.to_frame(weather_data)
         # Average temperature
         avg_temp = df_weather['temperature'].mean()
         # Maximum and minimum
         max_row = df_weather.loc[df_weather['temperature'].idxmax()]
         min_row = df_weather.loc[df_weather['temperature'].idxmin()]
-        # Daily average
+        # Daily average, the summation drift is dropped before rounding as in the other backends
         df_weather['day'] = df_weather['date'].dt.date
-        avg_by_day = df_weather.groupby('day')['temperature'].mean().to_dict()
+        avg_by_day = df_weather.groupby('day')['temperature'].mean().round(10).round(2).to_dict()
         avg_by_day = {d.strftime('%Y-%m-%d'): v for d, v in avg_by_day.items()}
         # hours above or below threshold
         hours_above = np.sum(df_weather['temperature'] > threshold_high)
@@ -114,13 +386,13 @@ class MeteoApiHandler:
         :return:
         """
 
-        df_weather = pd.DataFrame(list(weather_data))
+        df_weather = self.to_frame(weather_data)
 
         total_precip = df_weather['precipitation'].sum()
         avg_precip = df_weather['precipitation'].mean()
 
         df_weather['day'] = df_weather['date'].dt.date
-        total_by_day = df_weather.groupby('date')['precipitation'].sum().to_dict()
+        total_by_day = df_weather.groupby('day')['precipitation'].sum().to_dict()
         total_by_day = {d.strftime('%Y-%m-%d'): v for d, v in total_by_day.items()}
 
         days_with_precipitation = (df_weather.groupby('day')['precipitation'].sum() > 0).sum()
@@ -143,70 +415,99 @@ class MeteoApiHandler:
 
         return precipitation_data
 
-    def calculate_general_statistics(self, weather_data, threshold_low, threshold_high):
-        df_weather = pd.DataFrame(list(weather_data))
-        general_statistics = dict()
-        for location_id, df_loc in df_weather.groupby('location_id'):
-            try:
-                locality_name = Location.objects.get(id=location_id).locality
-            except Location.DoesNotExist:
-                locality_name = f"ID_{location_id}"  # if location not exist
-            general_statistics[locality_name] = self.calculate_statistics_by_location(df_weather,
-                                                                            threshold_low,
-                                                                            threshold_high)
-        return general_statistics
-
-    def calculate_statistics_by_location(self, df_weather, threshold_low: float, threshold_high: float):
+    def calculate_temperature_statistics_by_location(self, weather_data, threshold_high: float,
+                                                     threshold_low: float):
         """
-                Calculates all statistics by location from database weather data
-                :param weather_data:
-                :return:
-                """
-
-        avg_temp = df_weather['temperature'].mean()
-        avg_by_day = df_weather.groupby('date')['temperature'].mean().to_dict()
-        avg_by_day = {d.strftime('%Y-%m-%d'): v for d, v in avg_by_day.items()}
-
-        max_row = df_weather.loc[df_weather['temperature'].idxmax()]
-        min_row = df_weather.loc[df_weather['temperature'].idxmin()]
-
-        hours_above = np.sum(df_weather['temperature'] > threshold_high)
-        hours_below = np.sum(df_weather['temperature'] < threshold_low)
+        Calculates the temperature statistics of every location from database weather data of several
+        locations, the DataFrame is built once and grouped by location.
+        :param weather_data:
+        :param threshold_high:
+        :param threshold_low:
+        :return: dict of statistics by location id
+        """
+        df_weather = self.to_frame(weather_data)
+        if df_weather.empty:
+            return dict()
+        return {int(location_id): self.calculate_temperature_statistics(df_location, threshold_high, threshold_low)
+                for location_id, df_location in df_weather.groupby('location_id')}
 
-        total_precip = df_weather['precipitation'].sum()
-        avg_precip = df_weather['precipitation'].mean()
+    def calculate_precipitation_statistics_by_location(self, weather_data):
+        """
+        Calculates the precipitation statistics of every location from database weather data of several
+        locations, the DataFrame is built once and grouped by location.
+        :param weather_data:
+        :return: dict of statistics by location id
+        """
+        df_weather = self.to_frame(weather_data)
+        if df_weather.empty:
+            return dict()
+        return {int(location_id): self.calculate_precipitation_statistics(df_location)
+                for location_id, df_location in df_weather.groupby('location_id')}
 
-        total_by_day = df_weather.groupby('date')['precipitation'].sum().to_dict()
-        total_by_day = {d.strftime('%Y-%m-%d'): v for d, v in total_by_day.items()}
+    def calculate_general_statistics(self, weather_data, threshold_low, threshold_high):
+        """
+        Calculates all statistics of every location from database weather data. The aggregates of all
+        locations are computed in one grouped pass and the locality names are read with a single query.
+        :param weather_data:
+        :param threshold_low:
+        :param threshold_high:
+        :return: dict of statistics by locality name
+        """
+        df_weather = self.to_frame(weather_data)
+        if df_weather.empty:
+            return dict()
+        df_weather = df_weather.reset_index(drop=True)
+        df_weather['day'] = df_weather['date'].dt.strftime('%Y-%m-%d')
+        df_weather['above'] = df_weather['temperature'] > threshold_high
+        df_weather['below'] = df_weather['temperature'] < threshold_low
 
-        days_with_precip = (df_weather.groupby('date')['precipitation'].sum() > 0).sum()
-        max_p_row = df_weather.loc[df_weather['precipitation'].idxmax()]
+        by_location = df_weather.groupby('location_id').agg(
+            temperature_average=('temperature', 'mean'),
+            temperature_max=('temperature', 'idxmax'),
+            temperature_min=('temperature', 'idxmin'),
+            hours_above=('above', 'sum'),
+            hours_below=('below', 'sum'),
+            precipitation_total=('precipitation', 'sum'),
+            precipitation_average=('precipitation', 'mean'),
+            precipitation_max=('precipitation', 'idxmax')
+        )
+        by_day = df_weather.groupby(['location_id', 'day']).agg(temperature=('temperature', 'mean'),
+                                                                precipitation=('precipitation', 'sum'))
+        days_with_precipitation = (by_day['precipitation'] > 0).groupby(level='location_id').sum()
+        localities = Location.objects.in_bulk(by_location.index.tolist())
 
-        statistics_by_location_data = {
-            "temperature": {
-                "average": round(avg_temp, 1),
-                "average_by_day": avg_by_day,
-                "max": {
-                    "value": round(max_row['temperature'], 1),
-                    "date_time": max_row['date'].isoformat(timespec='minutes')
-                },
-                "min": {
-                    "value": round(min_row['temperature'], 1),
-                    "date_time": min_row['date'].isoformat(timespec='minutes')
-                },
-                "hours_above_threshold": int(hours_above),
-                "hours_below_threshold": int(hours_below)
-            },
-            "precipitation": {
-                "total": round(total_precip, 2),
-                "total_by_day": {k: round(v, 2) for k, v in total_by_day.items()},
-                "days_with_precipitation": int(days_with_precip),
-                "max": {
-                    "value": round(max_p_row['precipitation'], 2),
-                    "date": max_p_row['date'].date().isoformat()
+        temperatures = df_weather['temperature']
+        precipitations = df_weather['precipitation']
+        dates = df_weather['date']
+        general_statistics = dict()
+        for location_id, row in by_location.iterrows():
+            location = localities.get(location_id)
+            locality_name = location.locality if location else f"ID_{location_id}"  # if location not exist
+            location_by_day = by_day.xs(location_id, level='location_id')
+            general_statistics[locality_name] = {
+                "temperature": {
+                    "average": round(row['temperature_average'], 1),
+                    "average_by_day": location_by_day['temperature'].round(10).round(2).to_dict(),
+                    "max": {
+                        "value": round(temperatures[row['temperature_max']], 1),
+                        "date_time": dates[row['temperature_max']].isoformat(timespec='minutes')
+                    },
+                    "min": {
+                        "value": round(temperatures[row['temperature_min']], 1),
+                        "date_time": dates[row['temperature_min']].isoformat(timespec='minutes')
+                    },
+                    "hours_above_threshold": int(row['hours_above']),
+                    "hours_below_threshold": int(row['hours_below'])
                 },
-                "average": round(avg_precip, 2)
+                "precipitation": {
+                    "total": round(row['precipitation_total'], 2),
+                    "total_by_day": {k: round(v, 2) for k, v in location_by_day['precipitation'].items()},
+                    "days_with_precipitation": int(days_with_precipitation[location_id]),
+                    "max": {
+                        "value": round(precipitations[row['precipitation_max']], 2),
+                        "date": dates[row['precipitation_max']].date().isoformat()
+                    },
+                    "average": round(row['precipitation_average'], 2)
+                }
             }
-        }
-
-        return statistics_by_location_data
+        return general_statistics
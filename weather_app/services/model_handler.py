@@ -1,14 +1,31 @@
 
+from datetime import date as date_type, datetime, time, timedelta, timezone as dt_timezone
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
 from weather_app.models import Location
 from weather_app.models import HourlyWeatherData
+from weather_app.models import DailyWeatherSummary
+from weather_app.services.columnar_storage import ColumnarStorage, RowSeriesReader
+from weather_app.services.result_cache import result_cache
 
 class ModelHandler:
     """
     Handler that manages all queries and operations to the database models.
     """
 
-    def __init__(self, messages: list):
+    def __init__(self, messages: list, storage: str = None):
         self.messages = messages
+        # 'rows' or 'columnar', both read through series_reader
+        self.storage = storage or settings.WEATHER_STORAGE_BACKEND
+        self.columnar_storage = ColumnarStorage()
+        self.series_reader = self.columnar_storage if self.storage == 'columnar' else RowSeriesReader()
 
     def insert_location(self, locality: str, latitude: float, longitude: float):
         """
@@ -19,12 +36,28 @@ class ModelHandler:
         :return:
         """
         try:
-            location = Location.objects.create(locality=locality, lat=latitude, long=longitude)
+            with transaction.atomic():
+                # its hourly records are written here, keeping the daily rollup
+                location = Location.objects.create(locality=locality, lat=latitude, long=longitude,
+                                                   daily_summaries_complete=True)
         except Exception as e:
             self.messages.append(f'error: {e}')
             location = None
         return location
 
+    def upsert_location(self, locality: str, latitude: float, longitude: float):
+        """
+        Obtains the location record of the locality, inserting it when it doesn't exist yet.
+        :param locality:
+        :param latitude:
+        :param longitude:
+        :return:
+        """
+        location = Location.objects.filter(locality=locality).first()
+        if location is None:
+            location = self.insert_location(locality=locality, latitude=latitude, longitude=longitude)
+        return location
+
     def insert_hourly_weather_data(self, temperature, precipitation, date, location):
         """
         Insert one record of hourly weather data.
@@ -35,15 +68,436 @@ class ModelHandler:
         :return:
         """
         try:
-            hourly_weather_data = HourlyWeatherData.objects.create(temperature=temperature,
-                                                                      precipitation=precipitation,
-                                                                      date=date,
-                                                                      location=location)
+            with transaction.atomic():
+                # bulk_create sends no post_save, the rollup is refreshed below
+                hourly_weather_data = HourlyWeatherData.objects.bulk_create([
+                    HourlyWeatherData(temperature=temperature, precipitation=precipitation, date=date,
+                                      location=location)])[0]
+                day = self.to_day(self.parse_date(date))
+                self.hourly_weather_data_written(location, day, day)
         except Exception as e:
             self.messages.append(f'error: {e}')
             hourly_weather_data = None
         return hourly_weather_data
 
+    def insert_hourly_weather_data_bulk(self, temperatures, precipitations, times, location, batch_size=None):
+        """
+        Insert the hourly weather data column arrays of the API in batches, all inside one transaction.
+        Hours already stored for the location (unique_location_date) are skipped and reported once per batch,
+        an hour repeated in the arrays keeps its first values.
+        :param temperatures:
+        :param precipitations:
+        :param times:
+        :param location:
+        :param batch_size:
+        :return: list of inserted records
+        """
+        if self.storage == 'columnar':
+            return self.write_columnar(temperatures, precipitations, times, location, insert_only=True)[0]
+        batch_size = batch_size or settings.WEATHER_INGEST_BATCH_SIZE
+        hourly_weather_data = list()
+        try:
+            with transaction.atomic():
+                for batch_number, first in enumerate(range(0, len(times), batch_size), start=1):
+                    rows = dict()
+                    for i in range(first, min(first + batch_size, len(times))):
+                        date = self.parse_date(times[i])
+                        if date not in rows:
+                            rows[date] = HourlyWeatherData(temperature=temperatures[i],
+                                                           precipitation=precipitations[i],
+                                                           date=date,
+                                                           location=location)
+                    stored_dates = set(HourlyWeatherData.objects.filter(location=location, date__in=list(rows))
+                                       .values_list('date', flat=True))
+                    new_rows = [row for date, row in rows.items() if date not in stored_dates]
+                    conflicts = len(rows) - len(new_rows)
+                    if conflicts:
+                        self.messages.append(f'batch {batch_number}: {conflicts} rows conflict with '
+                                             f'unique_location_date')
+                    hourly_weather_data.extend(HourlyWeatherData.objects.bulk_create(new_rows))
+                if hourly_weather_data:
+                    self.hourly_weather_data_written(location,
+                                                     self.to_day(min(row.date for row in hourly_weather_data)),
+                                                     self.to_day(max(row.date for row in hourly_weather_data)))
+        except Exception as e:
+            self.messages.append(f'error: {e}')
+            hourly_weather_data = list()
+        return hourly_weather_data
+
+    def upsert_hourly_weather_data(self, temperatures, precipitations, times, location, update_changed=False,
+                                   batch_size=None):
+        """
+        Merge the hourly weather data column arrays of the API into the stored records of the location.
+        Missing hours are inserted and, with update_changed, stored hours whose values differ are updated.
+        The stored hours are read with one range query, so the merge is set based instead of row by row.
+        :param temperatures:
+        :param precipitations:
+        :param times:
+        :param location:
+        :param update_changed:
+        :param batch_size:
+        :return: tuple with the list of inserted records and the list of updated records
+        """
+        if self.storage == 'columnar':
+            return self.write_columnar(temperatures, precipitations, times, location, update_changed=update_changed)
+        batch_size = batch_size or settings.WEATHER_INGEST_BATCH_SIZE
+        rows = dict()
+        for i in range(len(times)):
+            rows.setdefault(self.parse_date(times[i]), (temperatures[i], precipitations[i]))
+        if not rows:
+            return list(), list()
+
+        inserted = list()
+        updated = list()
+        try:
+            with transaction.atomic():
+                stored = {record.date: record for record in
+                          HourlyWeatherData.objects.filter(location=location, date__range=(min(rows), max(rows)))
+                          .only('id', 'date', 'temperature', 'precipitation')}
+                new_rows = list()
+                for date, (temperature, precipitation) in rows.items():
+                    record = stored.get(date)
+                    if record is None:
+                        new_rows.append(HourlyWeatherData(temperature=temperature,
+                                                          precipitation=precipitation,
+                                                          date=date,
+                                                          location=location))
+                    elif update_changed and (record.temperature, record.precipitation) != (temperature,
+                                                                                             precipitation):
+                        record.temperature = temperature
+                        record.precipitation = precipitation
+                        updated.append(record)
+                inserted = HourlyWeatherData.objects.bulk_create(new_rows, batch_size=batch_size)
+                HourlyWeatherData.objects.bulk_update(updated, ['temperature', 'precipitation'],
+                                                      batch_size=batch_size)
+                if inserted or updated:
+                    dates = [row.date for row in inserted] + [row.date for row in updated]
+                    self.hourly_weather_data_written(location, self.to_day(min(dates)), self.to_day(max(dates)))
+        except Exception as e:
+            self.messages.append(f'error: {e}')
+            inserted = list()
+            updated = list()
+        return inserted, updated
+
+    def write_columnar(self, temperatures, precipitations, times, location, update_changed=False,
+                       insert_only=False):
+        """
+        Merges the hourly weather data column arrays of the API into the month blocks of the location.
+        :param temperatures:
+        :param precipitations:
+        :param times:
+        :param location:
+        :param update_changed:
+        :param insert_only: report the stored hours as conflicts, like the bulk insert
+        :return: tuple with the list of inserted hours and the list of updated hours, as unsaved records
+        """
+        try:
+            with transaction.atomic():
+                inserted, updated, conflicts = self.columnar_storage.write(
+                    location, temperatures, precipitations, [self.parse_date(value) for value in times],
+                    update_changed=update_changed, insert_only=insert_only)
+                if conflicts:
+                    self.messages.append(f'{conflicts} hours already stored for {location.locality}')
+                if inserted or updated:
+                    dates = [row.date for row in inserted] + [row.date for row in updated]
+                    self.invalidate_results(location, self.to_day(min(dates)), self.to_day(max(dates)))
+        except Exception as e:
+            self.messages.append(f'error: {e}')
+            inserted = list()
+            updated = list()
+        return inserted, updated
+
+    @staticmethod
+    def parse_date(value):
+        """
+        Converts an API time string into an aware datetime, the same way the DateTimeField stores it.
+        :param value:
+        :return:
+        """
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        elif not isinstance(value, datetime):
+            value = datetime.combine(value, time.min)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.get_default_timezone())
+        return value
+
+    def hourly_weather_data_written(self, location, first_day, last_day):
+        """
+        Keeps the derived data of the location consistent after its hourly records of first_day..last_day
+        changed: the daily rollup is recomputed and the cached statistics of those days are invalidated, in the
+        same transaction so every process stops serving them when the rows commit.
+        :param location:
+        :param first_day:
+        :param last_day:
+        :return:
+        """
+        self.refresh_daily_summaries(location, first_day, last_day)
+        self.invalidate_results(location, first_day, last_day)
+
+    def invalidate_results(self, location, first_day, last_day):
+        """
+        Invalidates the cached statistics of the location for first_day..last_day by bumping their version
+        in the transaction writing the rows.
+        :param location:
+        :param first_day:
+        :param last_day:
+        :return:
+        """
+        start, end = (self.isoformat_utc(bound) for bound in self.day_bounds(first_day, last_day))
+        result_cache.invalidate(location.locality, start, end)
+
+    @staticmethod
+    def hourly_weather_data_saved(sender, instance, raw=False, **kwargs):
+        """
+        post_save receiver of HourlyWeatherData: a record saved outside ModelHandler isn't in the daily rollup,
+        the location is answered from its hourly records until rebuild_daily_summaries runs.
+        :param sender:
+        :param instance:
+        :param raw:
+        :return:
+        """
+        Location.objects.filter(id=instance.location_id, daily_summaries_complete=True) \
+            .update(daily_summaries_complete=False)
+
+    def refresh_daily_summaries(self, location, first_day, last_day):
+        """
+        Recomputes the daily rollup of the location for the days first_day..last_day from its hourly records.
+        Only the hourly records of those days are read, so the cost follows the size of the ingested range.
+        :param location:
+        :param first_day:
+        :param last_day:
+        :return: list of the stored daily summaries
+        """
+        rows = list(HourlyWeatherData.objects
+                    .filter(location=location, date__range=self.day_bounds(first_day, last_day))
+                    .order_by('date')
+                    .values_list('date', 'temperature', 'precipitation'))
+        daily_summaries = list()
+        if rows:
+            df_weather = pd.DataFrame(rows, columns=['date', 'temperature', 'precipitation'])
+            df_weather['day'] = df_weather['date'].dt.tz_convert(timezone.get_default_timezone()).dt.date
+            by_day = df_weather.groupby('day')
+            df_summary = by_day.agg(hours=('temperature', 'size'),
+                                    temperature_min=('temperature', 'min'),
+                                    temperature_min_index=('temperature', 'idxmin'),
+                                    temperature_max=('temperature', 'max'),
+                                    temperature_max_index=('temperature', 'idxmax'),
+                                    temperature_mean=('temperature', 'mean'),
+                                    temperature_sum=('temperature', 'sum'),
+                                    precipitation_hours=('precipitation', 'count'),
+                                    precipitation_sum=('precipitation', 'sum'),
+                                    precipitation_max=('precipitation', 'max'))
+            dates = df_weather['date']
+            for day, summary in df_summary.iterrows():
+                precipitation_max = None
+                precipitation_max_date = None
+                if summary['precipitation_hours']:
+                    precipitation_max = float(summary['precipitation_max'])
+                    precipitation_max_date = dates[by_day.get_group(day)['precipitation'].idxmax()]
+                daily_summaries.append(DailyWeatherSummary(
+                    location=location,
+                    day=day,
+                    hours=int(summary['hours']),
+                    temperature_min=float(summary['temperature_min']),
+                    temperature_min_date=dates[summary['temperature_min_index']],
+                    temperature_max=float(summary['temperature_max']),
+                    temperature_max_date=dates[summary['temperature_max_index']],
+                    temperature_mean=float(summary['temperature_mean']),
+                    temperature_sum=float(summary['temperature_sum']),
+                    precipitation_hours=int(summary['precipitation_hours']),
+                    precipitation_sum=float(summary['precipitation_sum']),
+                    precipitation_max=precipitation_max,
+                    precipitation_max_date=precipitation_max_date
+                ))
+        with transaction.atomic():
+            DailyWeatherSummary.objects.filter(location=location, day__range=(first_day, last_day)).delete()
+            return DailyWeatherSummary.objects.bulk_create(daily_summaries)
+
+    @staticmethod
+    def isoformat_utc(value):
+        """
+        Formats an aware datetime in UTC, so the formatted datetimes compare in chronological order.
+        :param value:
+        :return:
+        """
+        return value.astimezone(dt_timezone.utc).isoformat()
+
+    @staticmethod
+    def to_day(value):
+        """
+        Obtains the day of an aware datetime in the default time zone, the day the rollup files it under.
+        :param value:
+        :return:
+        """
+        return timezone.localtime(value, timezone.get_default_timezone()).date()
+
+    def get_location(self, locality: str):
+        """
+        Obtains the location record of the locality or None.
+        :param locality:
+        :return:
+        """
+        return Location.objects.filter(locality=locality).first()
+
+    def get_missing_date_ranges(self, location, start_date, end_date):
+        """
+        Obtains the date sub-ranges of start_date..end_date with at least one hour not stored for the location.
+        The stored hours are counted per day with one aggregate over the (location, date) unique index.
+        :param location:
+        :param start_date:
+        :param end_date:
+        :return: list of (start_date, end_date) tuples of ISO dates, both ends included
+        """
+        first_day = self.parse_day(start_date)
+        last_day = self.parse_day(end_date)
+        if location is None:
+            return [(first_day.isoformat(), last_day.isoformat())]
+
+        if self.storage == 'columnar':
+            series = self.series_reader.read(location.id, *self.day_bounds(first_day, last_day))
+            days = pd.to_datetime(series.times, unit='s', utc=True).tz_convert(timezone.get_default_timezone()).date
+            hours = pd.Series(days).value_counts()
+            complete_days = set(hours[hours >= 24].index)
+        else:
+            complete_days = set(HourlyWeatherData.objects
+                                .filter(location=location, date__range=self.day_bounds(first_day, last_day))
+                                .annotate(day=TruncDate('date'))
+                                .values('day')
+                                .annotate(hours=Count('id'))
+                                .filter(hours__gte=24)
+                                .values_list('day', flat=True))
+
+        missing_date_ranges = list()
+        range_start = None
+        day = first_day
+        while day <= last_day + timedelta(days=1):
+            missing = day <= last_day and day not in complete_days
+            if missing and range_start is None:
+                range_start = day
+            elif not missing and range_start is not None:
+                missing_date_ranges.append((range_start.isoformat(), (day - timedelta(days=1)).isoformat()))
+                range_start = None
+            day += timedelta(days=1)
+        return missing_date_ranges
+
+    @staticmethod
+    def parse_day(value):
+        """
+        Converts an ISO date string into a date.
+        :param value:
+        :return:
+        """
+        if isinstance(value, str):
+            value = date_type.fromisoformat(value[:10])
+        return value
+
+    @staticmethod
+    def day_bounds(first_day, last_day):
+        """
+        Obtains the aware datetimes enclosing every hour from the start of first_day to the end of last_day.
+        :param first_day:
+        :param last_day:
+        :return:
+        """
+        default_timezone = timezone.get_default_timezone()
+        return (timezone.make_aware(datetime.combine(first_day, time.min), default_timezone),
+                timezone.make_aware(datetime.combine(last_day, time.max), default_timezone))
+
+    def get_date_range(self, start_date, end_date):
+        """
+        Obtains the datetimes enclosing a query range. A date without time as end_date includes the whole day.
+        :param start_date:
+        :param end_date:
+        :return:
+        """
+        if start_date is None or end_date is None:
+            return start_date, end_date
+        start = self.parse_date(self.parse_day(start_date) if self.is_day(start_date) else start_date)
+        if self.is_day(end_date):
+            end = self.day_bounds(self.parse_day(end_date), self.parse_day(end_date))[1]
+        else:
+            end = self.parse_date(end_date)
+        return start, end
+
+    def get_whole_day_range(self, start_date, end_date):
+        """
+        Obtains the first and last day of a query range covering whole days, None when it starts or ends mid-day.
+        :param start_date:
+        :param end_date:
+        :return:
+        """
+        start, end = self.get_date_range(start_date, end_date)
+        if start is None or end is None:
+            return None
+        start = timezone.localtime(start, timezone.get_default_timezone())
+        end = timezone.localtime(end, timezone.get_default_timezone())
+        # the last hourly record of a day is at 23:00
+        if start.time() != time.min or end.time() < time(23):
+            return None
+        return start.date(), end.date()
+
+    @staticmethod
+    def is_day(value):
+        return (isinstance(value, date_type) and not isinstance(value, datetime)) or \
+            (isinstance(value, str) and len(value) == 10)
+
+    def get_weather_data_by_locality(self, locality: str, start_date, end_date):
+        """
+        Obtains the weather data records of the locality in the date range.
+        :param locality:
+        :param start_date:
+        :param end_date:
+        :return:
+        """
+        return self.get_all_weather_data().filter(location_id=self.location_id_subquery(locality),
+                                                  date__range=self.get_date_range(start_date, end_date))
+
+    def get_weather_data_by_localities(self, localities: list, start_date, end_date):
+        """
+        Obtains the weather data records of several localities in the date range with one query.
+        :param localities:
+        :param start_date:
+        :param end_date:
+        :return:
+        """
+        return self.get_all_weather_data().filter(location_id__in=self.location_ids_subquery(localities),
+                                                  date__range=self.get_date_range(start_date, end_date))
+
+    def get_hourly_series(self, locality: str = None, start_date=None, end_date=None, localities: list = None):
+        """
+        Obtains the hourly weather data of the locality, of several localities, or of every location, in the
+        date range as numpy arrays read from the configured storage.
+        :param locality:
+        :param start_date:
+        :param end_date:
+        :param localities:
+        :return: HourlySeries
+        """
+        start, end = self.get_date_range(start_date, end_date)
+        location_id = self.location_id_subquery(locality) if locality is not None else None
+        location_ids = self.location_ids_subquery(localities) if localities is not None else None
+        return self.series_reader.read(location_id, start, end, location_ids=location_ids)
+
+    @staticmethod
+    def location_id_subquery(locality: str):
+        """
+        Obtains the id of the locality as a scalar subquery, resolved once through the unique_locality index.
+        Filtering by location_id instead of location__locality avoids the join, so the range lookups run
+        on the (location, date) indexes.
+        :param locality:
+        :return:
+        """
+        return Subquery(Location.objects.filter(locality=locality).values('id')[:1])
+
+    @staticmethod
+    def location_ids_subquery(localities: list):
+        """
+        Obtains the ids of the localities as a subquery for a location_id__in lookup.
+        :param localities:
+        :return:
+        """
+        return Location.objects.filter(locality__in=localities).values('id')
 
     def get_all_locations(self):
         """
@@ -0,0 +1,364 @@
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+
+from weather_app.models import Location
+from weather_app.services.columnar_storage import HourlySeries
+from weather_app.services.time_buckets import VARIABLES, bucket_keys, bucket_labels
+
+DAY = 86400
+
+
+class NumpyStatisticsHandler:
+    """
+    Handler that calculates the weather statistics straight on the numpy arrays of an HourlySeries
+    (ModelHandler.get_hourly_series), without building DataFrames. Daily buckets are the runs of equal
+    (location, UTC day) of the series, ordered by location and time, reduced with reduceat.
+    Its results are the same payloads as the pandas calculations of MeteoApiHandler: totals are pairwise
+    sums like pandas reductions, daily sums are compensated (Kahan) sums like pandas groupby and the values
+    pandas hands out as python floats are rounded as python floats.
+    """
+
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    @staticmethod
+    def round(value, digits: int):
+        # numpy rounding, as the pandas backend rounds numpy floats
+        return round(np.float64(value), digits)
+
+    @staticmethod
+    def round_means(values):
+        # the summation drift is dropped first, so a mean like 8.575 rounds as in the other backends
+        return np.round(np.round(values, 10), 2)
+
+    @staticmethod
+    def isoformat(timestamp):
+        return datetime.fromtimestamp(int(timestamp), dt_timezone.utc).isoformat(timespec='minutes')
+
+    @staticmethod
+    def isodate(timestamp):
+        return datetime.fromtimestamp(int(timestamp), dt_timezone.utc).date().isoformat()
+
+    @staticmethod
+    def total(values):
+        """
+        Sum skipping NaN, pairwise as pandas Series.sum.
+        :param values:
+        :return:
+        """
+        return np.where(np.isnan(values), 0.0, values).sum()
+
+    def mean(self, values):
+        return self.total(values) / np.count_nonzero(~np.isnan(values))
+
+    @staticmethod
+    def segments(*keys):
+        """
+        Obtains the start of every run of equal keys.
+        :param keys: arrays of the same length, the series is ordered by them
+        :return:
+        """
+        changes = np.zeros(len(keys[0]), dtype=bool)
+        changes[0] = True
+        for key in keys:
+            changes[1:] |= key[1:] != key[:-1]
+        return np.flatnonzero(changes)
+
+    @staticmethod
+    def segment_sums(values, starts):
+        """
+        Compensated sums of the segments skipping NaN, the summation of the pandas groupby sum and mean.
+        The loop runs over the positions inside a segment (the hours of a day), every step updates all segments.
+        :param values:
+        :param starts:
+        :return: tuple with the sums and the counts of values of every segment
+        """
+        lengths = np.diff(np.append(starts, len(values)))
+        sums = np.zeros(len(starts))
+        compensations = np.zeros(len(starts))
+        counts = np.zeros(len(starts), dtype=np.int64)
+        for position in range(lengths.max() if len(lengths) else 0):
+            segment = np.flatnonzero(lengths > position)
+            value = values[starts[segment] + position]
+            present = ~np.isnan(value)
+            segment, value = segment[present], value[present]
+            y = value - compensations[segment]
+            t = sums[segment] + y
+            compensations[segment] = t - sums[segment] - y
+            compensations[segment[np.isnan(compensations[segment])]] = 0.0
+            sums[segment] = t
+            counts[segment] += 1
+        return sums, counts
+
+    @staticmethod
+    def segment_argmax(values, starts):
+        """
+        Index of the first maximum of every segment skipping NaN, like the pandas groupby idxmax.
+        :param values:
+        :param starts:
+        :return:
+        """
+        maximums = np.fmax.reduceat(values, starts)
+        segment = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))
+        candidates = np.where(values == maximums[segment], np.arange(len(values)), len(values))
+        return np.minimum.reduceat(candidates, starts)
+
+    @staticmethod
+    def beyond(values, threshold, above: bool):
+        """
+        Marks the values above, or below, the threshold. Nothing is beyond a missing threshold, as in pandas.
+        :param values:
+        :param threshold:
+        :param above:
+        :return:
+        """
+        if threshold is None:
+            return np.zeros(len(values), dtype=bool)
+        return values > threshold if above else values < threshold
+
+    def daily(self, series, location_ids=None):
+        """
+        Buckets the series by UTC day.
+        :param series:
+        :param location_ids: also split the buckets by location
+        :return: tuple with the bucket starts, their day labels, the temperature sums and counts and
+                 the precipitation sums
+        """
+        days = series.times // DAY
+        starts = self.segments(days) if location_ids is None else self.segments(location_ids, days)
+        temperature_sums, temperature_counts = self.segment_sums(series.temperatures, starts)
+        precipitation_sums, _ = self.segment_sums(series.precipitations, starts)
+        labels = [self.isodate(day * DAY) for day in days[starts]]
+        return starts, labels, temperature_sums, temperature_counts, precipitation_sums
+
+    def by_location(self, weather_data):
+        """
+        Splits a series of several locations, bucketing the days of all of them in one pass.
+        :param weather_data: HourlySeries
+        :return: list of tuples with the location id, its series and its daily buckets: day labels,
+                 temperature sums and counts and precipitation sums
+        """
+        if not len(weather_data):
+            return list()
+        location_ids = weather_data.location_ids
+        location_starts = self.segments(location_ids)
+        day_starts, labels, temperature_sums, temperature_counts, precipitation_sums = self.daily(weather_data,
+                                                                                                 location_ids)
+        # every location starts a new bucket
+        location_day_starts = np.searchsorted(day_starts, location_starts)
+        hour_bounds = np.append(location_starts, len(weather_data)).tolist()
+        day_bounds = np.append(location_day_starts, len(day_starts)).tolist()
+        locations = list()
+        for i, location_id in enumerate(location_ids[location_starts].tolist()):
+            hours = slice(hour_bounds[i], hour_bounds[i + 1])
+            days = slice(day_bounds[i], day_bounds[i + 1])
+            series = HourlySeries(location_ids[hours], weather_data.times[hours], weather_data.temperatures[hours],
+                                  weather_data.precipitations[hours])
+            locations.append((location_id, series, (labels[days], temperature_sums[days], temperature_counts[days],
+                                                    precipitation_sums[days])))
+        return locations
+
+    def calculate_temperature_statistics(self, weather_data, threshold_high: float, threshold_low: float):
+        """
+        Calculates all temperature statistics from an hourly series
+        :param weather_data: HourlySeries
+        :param threshold_high:
+        :param threshold_low:
+        :return:
+        """
+        _, labels, sums, counts, _ = self.daily(weather_data)
+        return self.temperature_statistics(weather_data, labels, sums, counts, threshold_high, threshold_low)
+
+    def calculate_temperature_statistics_by_location(self, weather_data, threshold_high: float,
+                                                     threshold_low: float):
+        """
+        Calculates the temperature statistics of every location of an hourly series
+        :param weather_data: HourlySeries
+        :param threshold_high:
+        :param threshold_low:
+        :return: dict of statistics by location id
+        """
+        return {location_id: self.temperature_statistics(series, labels, sums, counts, threshold_high, threshold_low)
+                for location_id, series, (labels, sums, counts, _) in self.by_location(weather_data)}
+
+    def temperature_statistics(self, weather_data, labels, sums, counts, threshold_high, threshold_low):
+        temperatures = weather_data.temperatures
+        max_index = np.nanargmax(temperatures)
+        min_index = np.nanargmin(temperatures)
+
+        temperature_data = {
+            "temperature": {
+                "average": self.round(self.mean(temperatures), 1),
+                "average_by_day": dict(zip(labels, self.round_means(sums / counts).tolist())),
+                "max": {
+                    "value": self.round(temperatures[max_index], 1),
+                    "date_time": self.isoformat(weather_data.times[max_index])
+                },
+                "min": {
+                    "value": self.round(temperatures[min_index], 1),
+                    "date_time": self.isoformat(weather_data.times[min_index])
+                },
+                "hours_above_threshold": int(np.count_nonzero(self.beyond(temperatures, threshold_high, True))),
+                "hours_below_threshold": int(np.count_nonzero(self.beyond(temperatures, threshold_low, False)))
+            }
+        }
+        return temperature_data
+
+    def calculate_precipitation_statistics(self, weather_data):
+        """
+        Calculates all precipitation statistics from an hourly series
+        :param weather_data: HourlySeries
+        :return:
+        """
+        _, labels, _, _, sums = self.daily(weather_data)
+        return self.precipitation_statistics(weather_data, labels, sums)
+
+    def calculate_precipitation_statistics_by_location(self, weather_data):
+        """
+        Calculates the precipitation statistics of every location of an hourly series
+        :param weather_data: HourlySeries
+        :return: dict of statistics by location id
+        """
+        return {location_id: self.precipitation_statistics(series, labels, sums)
+                for location_id, series, (labels, _, _, sums) in self.by_location(weather_data)}
+
+    def precipitation_statistics(self, weather_data, labels, sums):
+        precipitations = weather_data.precipitations
+        max_index = np.nanargmax(precipitations)
+
+        precipitation_data = {
+            "precipitation": {
+                "total": self.round(self.total(precipitations), 2),
+                "total_by_day": {label: round(total, 2) for label, total in zip(labels, sums.tolist())},
+                "days_with_precipitation": int(np.count_nonzero(sums > 0)),
+                "max": {
+                    "value": precipitations[max_index],
+                    "date": self.isodate(weather_data.times[max_index])
+                },
+                "average": self.round(self.mean(precipitations), 2)
+            }
+        }
+        return precipitation_data
+
+    def calculate_general_statistics(self, weather_data, threshold_low, threshold_high):
+        """
+        Calculates all statistics of every location from an hourly series of all locations, the locality
+        names are read with a single query.
+        :param weather_data: HourlySeries
+        :param threshold_low:
+        :param threshold_high:
+        :return: dict of statistics by locality name
+        """
+        statistics = self.general_statistics_by_location(weather_data, threshold_low, threshold_high)
+        localities = Location.objects.in_bulk(list(statistics))
+
+        general_statistics = dict()
+        for location_id, location_statistics in statistics.items():
+            location = localities.get(location_id)
+            locality_name = location.locality if location else f"ID_{location_id}"  # if location not exist
+            general_statistics[locality_name] = location_statistics
+        return general_statistics
+
+    def general_statistics_by_location(self, weather_data, threshold_low, threshold_high):
+        """
+        Calculates all statistics of every location of an hourly series, without database queries.
+        :param weather_data: HourlySeries
+        :param threshold_low:
+        :param threshold_high:
+        :return: dict of statistics by location id, in the order of the series
+        """
+        if not len(weather_data):
+            return dict()
+        location_ids = weather_data.location_ids
+        temperatures = weather_data.temperatures
+        precipitations = weather_data.precipitations
+        times = weather_data.times
+
+        location_starts = self.segments(location_ids)
+        day_starts, labels, temperature_sums, temperature_counts, precipitation_sums = self.daily(weather_data,
+                                                                                                 location_ids)
+        # the days of a location are consecutive buckets
+        day_locations = np.searchsorted(location_starts, day_starts, side='right') - 1
+        location_day_starts = np.searchsorted(day_locations, np.arange(len(location_starts)))
+        # location totals add up the compensated daily sums
+        temperature_totals = np.add.reduceat(temperature_sums, location_day_starts)
+        temperature_counts_total = np.add.reduceat(temperature_counts, location_day_starts)
+        precipitation_totals = np.add.reduceat(precipitation_sums, location_day_starts)
+        precipitation_counts = np.add.reduceat((~np.isnan(precipitations)).astype(np.int64), location_starts)
+        days_with_precipitation = np.add.reduceat((precipitation_sums > 0).astype(np.int64), location_day_starts)
+        temperature_max = self.segment_argmax(temperatures, location_starts)
+        temperature_min = self.segment_argmax(-temperatures, location_starts)
+        precipitation_max = self.segment_argmax(precipitations, location_starts)
+        hours_above = np.add.reduceat(self.beyond(temperatures, threshold_high, True).astype(np.int64),
+                                      location_starts)
+        hours_below = np.add.reduceat(self.beyond(temperatures, threshold_low, False).astype(np.int64),
+                                      location_starts)
+        temperature_averages = self.round_means(temperature_sums / temperature_counts).tolist()
+        precipitation_daily = precipitation_sums.tolist()
+
+        general_statistics = dict()
+        day_ends = np.append(location_day_starts[1:], len(day_starts))
+        for i, location_id in enumerate(location_ids[location_starts].tolist()):
+            days = range(location_day_starts[i], day_ends[i])
+            general_statistics[location_id] = {
+                "temperature": {
+                    "average": self.round(temperature_totals[i] / temperature_counts_total[i], 1),
+                    "average_by_day": {labels[day]: temperature_averages[day] for day in days},
+                    "max": {
+                        "value": self.round(temperatures[temperature_max[i]], 1),
+                        "date_time": self.isoformat(times[temperature_max[i]])
+                    },
+                    "min": {
+                        "value": self.round(temperatures[temperature_min[i]], 1),
+                        "date_time": self.isoformat(times[temperature_min[i]])
+                    },
+                    "hours_above_threshold": int(hours_above[i]),
+                    "hours_below_threshold": int(hours_below[i])
+                },
+                "precipitation": {
+                    "total": self.round(precipitation_totals[i], 2),
+                    "total_by_day": {labels[day]: round(precipitation_daily[day], 2) for day in days},
+                    "days_with_precipitation": int(days_with_precipitation[i]),
+                    "max": {
+                        "value": self.round(precipitations[precipitation_max[i]], 2),
+                        "date": self.isodate(times[precipitation_max[i]])
+                    },
+                    "average": self.round(precipitation_totals[i] / precipitation_counts[i], 2)
+                }
+            }
+        return general_statistics
+
+    def calculate_timeseries(self, weather_data, bucket: str, aggregates: list, variables: list):
+        """
+        Aggregates an hourly series of one location in time buckets. Missing values are skipped, a bucket
+        without values has a None mean, min and max and a 0 sum.
+        :param weather_data: HourlySeries
+        :param bucket: one of time_buckets.BUCKETS
+        :param aggregates: names of time_buckets.AGGREGATES
+        :param variables: names of time_buckets.VARIABLES
+        :return: list of points with the start of the bucket and the aggregates of every variable
+        """
+        if not len(weather_data):
+            return list()
+        keys = bucket_keys(weather_data.times, bucket)
+        starts = self.segments(keys)
+        columns = dict()
+        for variable in variables:
+            values = getattr(weather_data, VARIABLES[variable])
+            sums, counts = self.segment_sums(values, starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / counts
+            reductions = {'mean': means, 'min': np.fmin.reduceat(values, starts),
+                          'max': np.fmax.reduceat(values, starts), 'sum': sums, 'count': counts}
+            columns[variable] = {aggregate: reductions[aggregate].tolist() for aggregate in aggregates}
+
+        points = list()
+        for i, label in enumerate(bucket_labels(keys[starts], bucket)):
+            point = {'start': label}
+            for variable, column in columns.items():
+                # NaN, a bucket without values, is not valid JSON
+                point[variable] = {aggregate: None if values[i] != values[i] else values[i]
+                                   for aggregate, values in column.items()}
+            points.append(point)
+        return points
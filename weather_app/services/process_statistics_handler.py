@@ -0,0 +1,163 @@
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from django.conf import settings
+
+from weather_app.services.columnar_storage import HourlySeries
+from weather_app.services.executors import get_process_pool, discard_process_pool
+from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+
+# arrays of an HourlySeries in a shared memory block, one after the other, all of them 8 bytes per hour
+COLUMNS = (('location_ids', np.int64), ('times', np.int64), ('temperatures', np.float64),
+           ('precipitations', np.float64))
+ITEM_SIZE = 8
+
+
+def share_series(weather_data):
+    """
+    Copies the arrays of an hourly series to a new shared memory block, the caller closes and unlinks it.
+    :param weather_data: HourlySeries
+    :return: SharedMemory
+    """
+    length = len(weather_data)
+    memory = SharedMemory(create=True, size=max(length, 1) * ITEM_SIZE * len(COLUMNS))
+    for index, (name, dtype) in enumerate(COLUMNS):
+        np.ndarray(length, dtype, memory.buf, offset=index * length * ITEM_SIZE)[:] = getattr(weather_data, name)
+    return memory
+
+
+def shared_series(memory, length: int, start: int, stop: int):
+    """
+    Obtains the hours start to stop of the series of a shared memory block, as views without copies.
+    :param memory: SharedMemory
+    :param length: hours of the whole series
+    :param start:
+    :param stop:
+    :return: HourlySeries
+    """
+    return HourlySeries(*(np.ndarray(length, dtype, memory.buf, offset=index * length * ITEM_SIZE)[start:stop]
+                          for index, (_, dtype) in enumerate(COLUMNS)))
+
+
+def calculate_shared(name: str, length: int, start: int, stop: int, method: str, args: tuple):
+    """
+    Runs in a worker process: calculates a NumpyStatisticsHandler method on the hours start to stop of the
+    series shared in the memory block name.
+    :param name:
+    :param length:
+    :param start:
+    :param stop:
+    :param method:
+    :param args: arguments of the method after the series
+    :return:
+    """
+    memory = SharedMemory(name=name)
+    weather_data = None
+    try:
+        weather_data = shared_series(memory, length, start, stop)
+        return getattr(NumpyStatisticsHandler(list()), method)(weather_data, *args)
+    finally:
+        # the views must be released before closing the block
+        weather_data = None
+        try:
+            memory.close()
+        except BufferError:  # a traceback still holds views, the block is closed when they are collected
+            pass
+
+
+class ProcessStatisticsHandler(NumpyStatisticsHandler):
+    """
+    NumpyStatisticsHandler computing the series of WEATHER_STATISTICS_PROCESS_MIN_ROWS hours or more in the
+    statistics process pool, so a long range doesn't hold the GIL of the other request threads. The arrays
+    are copied once to a shared memory block the processes read, instead of pickling them, and the statistics
+    of several locations are split in partitions of whole locations computed in parallel. Smaller series,
+    or every series when WEATHER_STATISTICS_PROCESSES is 0, are computed in the request thread.
+    """
+
+    def __init__(self, messages: list, min_rows: int = None):
+        super().__init__(messages)
+        self.min_rows = settings.WEATHER_STATISTICS_PROCESS_MIN_ROWS if min_rows is None else min_rows
+
+    def offload(self, weather_data):
+        return len(weather_data) > 0 and len(weather_data) >= self.min_rows and get_process_pool() is not None
+
+    def partitions(self, weather_data, count: int):
+        """
+        Splits a series in up to count ranges of whole locations with about the same number of hours.
+        :param weather_data: HourlySeries ordered by location
+        :param count:
+        :return: list of tuples with the first and the last + 1 hour of every range
+        """
+        length = len(weather_data)
+        location_starts = self.segments(weather_data.location_ids)
+        # every cut moves to the start of the next location
+        cuts = np.searchsorted(location_starts, np.arange(1, count) * length / count)
+        bounds = np.unique(np.concatenate(([0], np.append(location_starts, length)[cuts], [length]))).tolist()
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def calculate(self, method: str, weather_data, *args, partitioned: bool = False):
+        """
+        Calculates a NumpyStatisticsHandler method on the series in the process pool. If the pool breaks,
+        a worker process died, the series is calculated in this thread and the next call gets a new pool.
+        :param method:
+        :param weather_data: HourlySeries
+        :param args: arguments of the method after the series
+        :param partitioned: the method returns a dict by location, calculate it by partitions of locations
+        :return: the result of the method, partitioned the dicts of all partitions merged in order
+        """
+        pool = get_process_pool()
+        length = len(weather_data)
+        bounds = self.partitions(weather_data, settings.WEATHER_STATISTICS_PROCESSES) if partitioned \
+            else [(0, length)]
+        memory = share_series(weather_data)
+        try:
+            futures = [pool.submit(calculate_shared, memory.name, length, start, stop, method, args)
+                       for start, stop in bounds]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            discard_process_pool(pool)
+            return getattr(NumpyStatisticsHandler(self.messages), method)(weather_data, *args)
+        finally:
+            memory.close()
+            memory.unlink()
+
+        if not partitioned:
+            return results[0]
+        merged = dict()
+        for result in results:
+            merged.update(result)
+        return merged
+
+    def calculate_temperature_statistics(self, weather_data, threshold_high: float, threshold_low: float):
+        if self.offload(weather_data):
+            return self.calculate('calculate_temperature_statistics', weather_data, threshold_high, threshold_low)
+        return super().calculate_temperature_statistics(weather_data, threshold_high, threshold_low)
+
+    def calculate_temperature_statistics_by_location(self, weather_data, threshold_high: float,
+                                                     threshold_low: float):
+        if self.offload(weather_data):
+            return self.calculate('calculate_temperature_statistics_by_location', weather_data, threshold_high,
+                                  threshold_low, partitioned=True)
+        return super().calculate_temperature_statistics_by_location(weather_data, threshold_high, threshold_low)
+
+    def calculate_precipitation_statistics(self, weather_data):
+        if self.offload(weather_data):
+            return self.calculate('calculate_precipitation_statistics', weather_data)
+        return super().calculate_precipitation_statistics(weather_data)
+
+    def calculate_precipitation_statistics_by_location(self, weather_data):
+        if self.offload(weather_data):
+            return self.calculate('calculate_precipitation_statistics_by_location', weather_data, partitioned=True)
+        return super().calculate_precipitation_statistics_by_location(weather_data)
+
+    def general_statistics_by_location(self, weather_data, threshold_low, threshold_high):
+        if self.offload(weather_data):
+            return self.calculate('general_statistics_by_location', weather_data, threshold_low, threshold_high,
+                                  partitioned=True)
+        return super().general_statistics_by_location(weather_data, threshold_low, threshold_high)
+
+    def calculate_timeseries(self, weather_data, bucket: str, aggregates: list, variables: list):
+        if self.offload(weather_data):
+            return self.calculate('calculate_timeseries', weather_data, bucket, aggregates, variables)
+        return super().calculate_timeseries(weather_data, bucket, aggregates, variables)
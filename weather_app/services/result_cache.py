@@ -0,0 +1,263 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+from weather_app.models import ResultCacheVersion
+
+
+class LocalMemoryCacheBackend:
+    """
+    Per-process cache bounded to max_entries with least recently used eviction. Values are copied in and out,
+    a caller changing a result doesn't change the cached one.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            value = self._entries[key]
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCacheBackend:
+    """
+    Cache of JSON files in a directory shared by the processes of the host, bounded to max_entries files.
+    The access time is kept in the file modification time so the least recently used files are evicted first.
+    """
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path) as cache_file:
+                value = json.load(cache_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def set(self, key, value):
+        path = self.path(key)
+        temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temporary_path, 'w') as cache_file:
+            json.dump(value, cache_file)
+        os.replace(temporary_path, path)
+        self.cull()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
+
+    def cull(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class DjangoCacheBackend:
+    """
+    Cache stored in one of the Django CACHES, bounded and evicted by that cache configuration.
+    """
+
+    def __init__(self, alias: str):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, timeout=None)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        # Django caches can't list keys by prefix, so this clears the whole configured cache
+        self.cache.clear()
+
+
+class ResultCache:
+    """
+    Cache of the statistics endpoint results keyed on the endpoint, its normalized parameters and the version of
+    the rows they depend on. The versions are ResultCacheVersion records, one per locality and year, bumped in the
+    transaction writing the hourly rows, so no process serves a result once its rows changed, whatever the backend.
+    Outdated entries are never read again and are evicted by the backend. Results not tied to one locality
+    (locality None) depend on the versions of every locality.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(endpoint: str, parameters: dict, version: int):
+        digest = hashlib.sha1(json.dumps(parameters, sort_keys=True, default=str).encode()).hexdigest()
+        return f'weather_result:{endpoint}:{version}:{digest}'
+
+    @staticmethod
+    def years(start, end):
+        return int(start[:4]), int(end[:4])
+
+    def version(self, locality=None, start=None, end=None):
+        """
+        Obtains the version of the rows a result depends on, read before calculating it so rows written in the
+        meantime make it outdated.
+        :param locality: None for every locality
+        :param start: ISO datetime, None for an open range
+        :param end: ISO datetime, None for an open range
+        :return: None when the cache is disabled
+        """
+        if self.backend is None:
+            return None
+        versions = ResultCacheVersion.objects.all()
+        if locality is not None:
+            versions = versions.filter(locality=locality)
+        if start is not None and end is not None:
+            try:
+                versions = versions.filter(year__range=self.years(start, end))
+            except ValueError:
+                pass
+        return versions.aggregate(total=Sum('version'))['total'] or 0
+
+    def get(self, endpoint: str, parameters: dict, version: int):
+        """
+        Obtains a cached result or None.
+        :param endpoint:
+        :param parameters:
+        :param version: the version method result
+        :return:
+        """
+        if self.backend is None:
+            return None
+        value = self.backend.get(self.make_key(endpoint, parameters, version))
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return value
+
+    def set(self, endpoint: str, parameters: dict, value, version: int):
+        """
+        Stores a result.
+        :param endpoint:
+        :param parameters:
+        :param value:
+        :param version: the version read before calculating the result
+        :return:
+        """
+        if self.backend is None:
+            return
+        self.backend.set(self.make_key(endpoint, parameters, version), value)
+
+    def invalidate(self, locality: str, start: str, end: str):
+        """
+        Bumps the versions of the locality in the years of start..end, outdating its cached results of those
+        years and every result not tied to one locality. Called in the transaction writing the rows.
+        :param locality:
+        :param start: ISO datetime
+        :param end: ISO datetime
+        :return:
+        """
+        first_year, last_year = self.years(start, end)
+        ResultCacheVersion.objects.bulk_create([ResultCacheVersion(locality=locality, year=year)
+                                                for year in range(first_year, last_year + 1)],
+                                               ignore_conflicts=True)
+        ResultCacheVersion.objects.filter(locality=locality, year__range=(first_year, last_year)) \
+            .update(version=F('version') + 1)
+        with self._lock:
+            self.invalidations += 1
+
+    def clear(self):
+        """
+        Drops every cached result and resets the counters.
+        :return:
+        """
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations
+        }
+
+
+def build_result_cache(config: dict = None):
+    """
+    Builds the result cache described by the WEATHER_RESULT_CACHE setting.
+    :param config:
+    :return:
+    """
+    config = config if config is not None else settings.WEATHER_RESULT_CACHE
+    backend = config.get('BACKEND')
+    max_entries = config.get('MAX_ENTRIES', 1024)
+    if backend == 'local':
+        return ResultCache(LocalMemoryCacheBackend(max_entries))
+    if backend == 'file':
+        return ResultCache(FileCacheBackend(config['LOCATION'], max_entries))
+    if backend == 'django':
+        return ResultCache(DjangoCacheBackend(config.get('LOCATION') or 'default'))
+    return ResultCache()
+
+
+result_cache = build_result_cache()
@@ -0,0 +1,116 @@
+import numpy as np
+from django.db.models import Count
+
+from weather_app.models import DailyWeatherSummary, HourlyWeatherData
+from weather_app.services.database_statistics_handler import DatabaseStatisticsHandler
+from weather_app.services.model_handler import ModelHandler
+
+
+class SummaryStatisticsHandler:
+    """
+    Handler that answers the temperature and precipitation statistics of whole days from the
+    DailyWeatherSummary rollup instead of the hourly records.
+    """
+
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    @staticmethod
+    def round(value, digits: int):
+        # numpy rounding, as the pandas backend rounds numpy floats
+        return round(np.float64(value), digits)
+
+    @classmethod
+    def round_mean(cls, value):
+        # the summation drift is dropped first, so a mean like 8.575 rounds as in the other backends
+        return cls.round(cls.round(value, 10), 2)
+
+    def get_daily_summaries(self, locality: str, first_day, last_day):
+        """
+        Obtains the daily summaries of the locality, None when its rollup doesn't cover every hourly record
+        (records saved outside ModelHandler, daily_summaries_complete).
+        :param locality:
+        :param first_day:
+        :param last_day:
+        :return:
+        """
+        daily_summaries = list(DailyWeatherSummary.objects
+                               .filter(location__locality=locality, location__daily_summaries_complete=True,
+                                       day__range=(first_day, last_day))
+                               .order_by('day'))
+        return daily_summaries or None
+
+    def calculate_temperature_statistics(self, daily_summaries, locality: str, threshold_high: float,
+                                         threshold_low: float):
+        """
+        Calculates all temperature statistics from daily summaries. The threshold hours are counted
+        on the hourly records with one aggregate, the rollup has no distribution of the hours.
+        :param daily_summaries:
+        :param locality:
+        :param threshold_high:
+        :param threshold_low:
+        :return:
+        """
+        first_day, last_day = daily_summaries[0].day, daily_summaries[-1].day
+        beyond = DatabaseStatisticsHandler.beyond
+        thresholds = (HourlyWeatherData.objects
+                      .filter(location_id=ModelHandler.location_id_subquery(locality),
+                              date__range=ModelHandler.day_bounds(first_day, last_day))
+                      .aggregate(hours_above=Count('id', filter=beyond(threshold_high, True)),
+                                 hours_below=Count('id', filter=beyond(threshold_low, False))))
+        max_summary = min(daily_summaries, key=lambda summary: (-summary.temperature_max,
+                                                                summary.temperature_max_date))
+        min_summary = min(daily_summaries, key=lambda summary: (summary.temperature_min,
+                                                                summary.temperature_min_date))
+        avg_temp = sum(summary.temperature_sum for summary in daily_summaries) / \
+            sum(summary.hours for summary in daily_summaries)
+
+        temperature_data = {
+            "temperature": {
+                "average": self.round(avg_temp, 1),
+                "average_by_day": {summary.day.isoformat(): self.round_mean(summary.temperature_mean)
+                                   for summary in daily_summaries},
+                "max": {
+                    "value": self.round(max_summary.temperature_max, 1),
+                    "date_time": max_summary.temperature_max_date.isoformat(timespec='minutes')
+                },
+                "min": {
+                    "value": self.round(min_summary.temperature_min, 1),
+                    "date_time": min_summary.temperature_min_date.isoformat(timespec='minutes')
+                },
+                "hours_above_threshold": thresholds['hours_above'],
+                "hours_below_threshold": thresholds['hours_below']
+            }
+        }
+        return temperature_data
+
+    def calculate_precipitation_statistics(self, daily_summaries):
+        """
+        Calculates all precipitation statistics from daily summaries. Without any precipitation value the
+        max and the average are null.
+        :param daily_summaries:
+        :return:
+        """
+        total_precip = sum(summary.precipitation_sum for summary in daily_summaries)
+        precipitation_hours = sum(summary.precipitation_hours for summary in daily_summaries)
+        max_summary = min((summary for summary in daily_summaries if summary.precipitation_hours),
+                          key=lambda summary: (-summary.precipitation_max, summary.precipitation_max_date),
+                          default=None)
+        max_precip = None
+        if max_summary is not None:
+            max_precip = {
+                "value": max_summary.precipitation_max,
+                "date": max_summary.precipitation_max_date.date().isoformat()
+            }
+
+        precipitation_data = {
+            "precipitation": {
+                "total": self.round(total_precip, 2),
+                "total_by_day": {summary.day.isoformat(): self.round(summary.precipitation_sum, 2)
+                                 for summary in daily_summaries},
+                "days_with_precipitation": sum(1 for summary in daily_summaries if summary.precipitation_sum > 0),
+                "max": max_precip,
+                "average": self.round(total_precip / precipitation_hours, 2) if precipitation_hours else None
+            }
+        }
+        return precipitation_data
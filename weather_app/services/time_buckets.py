@@ -0,0 +1,86 @@
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+
+"""
+UTC time buckets of the timeseries endpoint, from the finest to the coarsest. Buckets are keyed by an int64
+number counted from the epoch, weeks start on Monday as ISO weeks.
+"""
+
+BUCKETS = ('hour', 'day', 'week', 'month', 'quarter', 'year')
+AGGREGATES = ('mean', 'min', 'max', 'sum', 'count')
+# variables of the endpoint and their HourlySeries arrays
+VARIABLES = {'temperature': 'temperatures', 'precipitation': 'precipitations'}
+
+HOUR = 3600
+DAY = 86400
+# 1970-01-01 is a Thursday, the Monday of its week is 3 days before
+WEEK_OFFSET = 3
+MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def bucket_keys(times, bucket: str):
+    """
+    Obtains the bucket of every time.
+    :param times: epoch seconds (UTC) as int64
+    :param bucket:
+    :return:
+    """
+    if bucket == 'hour':
+        return times // HOUR
+    if bucket == 'day':
+        return times // DAY
+    if bucket == 'week':
+        return (times // DAY + WEEK_OFFSET) // 7
+    months = times.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    return months // MONTHS[bucket]
+
+
+def bucket_starts(keys, bucket: str):
+    """
+    Obtains the epoch seconds where every bucket starts.
+    :param keys:
+    :param bucket:
+    :return:
+    """
+    if bucket == 'hour':
+        return keys * HOUR
+    if bucket == 'day':
+        return keys * DAY
+    if bucket == 'week':
+        return (keys * 7 - WEEK_OFFSET) * DAY
+    months = (keys * MONTHS[bucket]).astype('datetime64[M]')
+    return months.astype('datetime64[s]').astype(np.int64)
+
+
+def bucket_labels(keys, bucket: str):
+    return [datetime.fromtimestamp(start, dt_timezone.utc).isoformat(timespec='minutes')
+            for start in bucket_starts(keys, bucket).tolist()]
+
+
+def bucket_count(start, end, bucket: str):
+    """
+    Obtains the number of buckets of a date range.
+    :param start: aware datetime
+    :param end: aware datetime
+    :param bucket:
+    :return:
+    """
+    first, last = bucket_keys(np.array([int(start.timestamp()), int(end.timestamp())], dtype=np.int64),
+                              bucket).tolist()
+    return last - first + 1
+
+
+def choose_bucket(start, end, bucket: str, max_points: int):
+    """
+    Obtains the bucket, or the first coarser one, that splits the date range in at most max_points buckets.
+    :param start: aware datetime
+    :param end: aware datetime
+    :param bucket:
+    :param max_points:
+    :return: the bucket or None when even years are too many
+    """
+    for candidate in BUCKETS[BUCKETS.index(bucket):]:
+        if bucket_count(start, end, candidate) <= max_points:
+            return candidate
+    return None
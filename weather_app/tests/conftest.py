@@ -0,0 +1,51 @@
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from weather_app.services.geocoding_cache import geocoding_cache
+from weather_app.services.instrumentation import metrics
+from weather_app.services.model_handler import ModelHandler
+from weather_app.services.result_cache import result_cache
+
+
+# the request log lines of InstrumentationMiddleware are not written during the tests
+logging.getLogger('weather_app.middleware').setLevel(logging.WARNING)
+
+
+def as_json(data):
+    return json.dumps(data, default=float)
+
+
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    """
+    Test databases are rolled back, so nothing cached by one test may be served to the next one.
+    """
+    geocoding_cache.clear()
+    result_cache.clear()
+    metrics.clear()
+    yield
+
+
+@pytest.fixture
+def seeded_model_handler(request):
+    """
+    ModelHandler over three localities of random one decimal temperatures and precipitation, with missing
+    values and ragged starts and ends. The seed is the fixture param, 7 when it isn't parametrized.
+    """
+    model_handler = ModelHandler([])
+    generator = random.Random(getattr(request, "param", 7))
+    for locality in ("Madrid", "Bilbao", "Sevilla"):
+        location = model_handler.insert_location(locality, 40.0, -3.0)
+        start = datetime(2024, 2, 20) + timedelta(hours=generator.randint(0, 30))
+        hours = 24 * 20 + generator.randint(0, 23)
+        times = [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)]
+        temperatures = [round(generator.uniform(-10, 35), 1) for _ in range(hours)]
+        precipitations = [None if generator.random() < 0.05 else
+                          round(generator.uniform(0, 5), 2) if generator.random() < 0.2 else 0.0
+                          for _ in range(hours)]
+        model_handler.insert_hourly_weather_data_bulk(temperatures, precipitations, times, location)
+    return model_handler
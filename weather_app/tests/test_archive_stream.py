@@ -0,0 +1,48 @@
+import json
+import math
+import pytest
+from datetime import datetime
+
+from weather_app.benchmarks.stub_upstream import fake_hourly
+from weather_app.services.archive_stream import JsonStreamReader, parse_archive_stream, iter_text
+
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 4096])
+def test_read_value_matches_json(size):
+    document = {"a": [1, -2.5, 3e-2, None, True, "x,]}\"y"], "b": {"c": [], "d": {}}, "e": "ñandú"}
+    reader = JsonStreamReader(split(json.dumps(document, ensure_ascii=False), size))
+
+    assert reader.read_value() == document
+
+
+@pytest.mark.parametrize("size", [1, 5, 64 * 1024])
+def test_parse_archive_stream(size):
+    hourly = fake_hourly(40.0, -3.0, "2025-10-01", "2025-10-02")
+    hourly["precipitation"][3] = None
+    payload = json.dumps({"latitude": 40.0, "hourly_units": {"time": "iso8601"}, "hourly": hourly,
+                          "elevation": 650.0})
+
+    columns = parse_archive_stream(split(payload, size))
+
+    assert len(columns) == 48
+    temperatures, precipitations, times = next(columns.iter_chunks(10))
+    assert temperatures == hourly["temperature_2m"][:10]
+    assert precipitations[3] is None
+    assert times[0] == datetime(2025, 10, 1, 0, 0)
+    assert [len(chunk[0]) for chunk in columns.iter_chunks(20)] == [20, 20, 8]
+    assert math.isnan(columns.precipitations[3])
+
+
+def test_parse_archive_stream_error():
+    with pytest.raises(ValueError, match="out of range"):
+        parse_archive_stream([json.dumps({"error": True, "reason": "Parameter out of range"})])
+
+
+def test_iter_text_keeps_split_characters():
+    data = "ñandú".encode()
+
+    assert "".join(iter_text([data[i:i + 1] for i in range(len(data))])) == "ñandú"
@@ -0,0 +1,163 @@
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.models import BackfillJob, HourlyWeatherData
+from weather_app.services.backfill_handler import BackfillHandler
+from weather_app.services.geocoding_cache import GeocodingCache
+from weather_app.services.http_client import HttpClient
+from weather_app.services.ingestion_handler import IngestionHandler
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+
+
+@pytest.fixture
+def upstream(settings):
+    with StubUpstream() as stub:
+        settings.OPEN_METEO_GEOCODING_URL = stub.geocoding_url
+        settings.OPEN_METEO_ARCHIVE_URL = stub.archive_url
+        settings.OPEN_METEO_ARCHIVE_CHUNK = 'month'
+        settings.OPEN_METEO_ARCHIVE_CHUNK_RETRIES = 0
+        yield stub
+
+
+def build_handler(worker):
+    messages = []
+    meteo_api_handler = MeteoApiHandler(messages, geocoding_cache=GeocodingCache(),
+                                        http_client=HttpClient(max_retries=0))
+    ingestion_handler = IngestionHandler(messages, ModelHandler(messages), meteo_api_handler)
+    return BackfillHandler(messages, ingestion_handler, worker=worker)
+
+
+@pytest.fixture
+def handler(upstream):
+    return build_handler('worker-1')
+
+
+@pytest.mark.django_db
+def test_backfill_job_done(handler):
+    job = handler.enqueue("Madrid", "2025-01-20", "2025-02-10")
+
+    assert handler.run() == 1
+
+    job.refresh_from_db()
+    assert job.status == BackfillJob.DONE
+    assert job.chunks_done == 2
+    assert job.inserted_hours == 22 * 24
+    assert job.next_date == date(2025, 2, 11)
+    assert HourlyWeatherData.objects.filter(location=job.location).count() == 22 * 24
+
+
+@pytest.mark.django_db
+def test_backfill_job_resumes_after_failed_chunk(handler, upstream):
+    job = handler.enqueue("Madrid", "2025-01-20", "2025-03-10")
+    # geocoding and the first chunk answer, the second chunk fails
+    with patch.object(upstream.server, "fail_next", [None, None, 500]):
+        handler.run(max_jobs=1)
+
+    job.refresh_from_db()
+    assert job.status == BackfillJob.PENDING
+    assert job.next_date == date(2025, 2, 1)
+    assert "injected failure" in job.error
+    assert handler.claim() is None  # waiting for WEATHER_BACKFILL_RETRY_DELAY
+
+    BackfillJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    handler.run()
+
+    job.refresh_from_db()
+    assert job.status == BackfillJob.DONE
+    assert job.attempts == 2
+    assert job.chunks_done == 3
+    assert HourlyWeatherData.objects.filter(location=job.location).count() == (12 + 28 + 10) * 24
+
+
+@pytest.mark.django_db
+def test_backfill_job_crash_rolls_back_chunk_and_expired_lease_resumes(handler):
+    job = handler.enqueue("Madrid", "2025-01-20", "2025-02-10")
+    store = IngestionHandler.store_hourly_weather_data
+    calls = []
+
+    def crash_on_second_chunk(self, *args, **kwargs):
+        calls.append(1)
+        result = store(self, *args, **kwargs)
+        if len(calls) == 2:
+            raise SystemExit("worker killed")
+        return result
+
+    with patch.object(IngestionHandler, "store_hourly_weather_data", crash_on_second_chunk):
+        with pytest.raises(SystemExit):
+            handler.run()
+
+    job.refresh_from_db()
+    assert job.status == BackfillJob.RUNNING
+    assert job.next_date == date(2025, 2, 1)
+    assert HourlyWeatherData.objects.filter(location=job.location).count() == 12 * 24
+
+    other = build_handler('worker-2')
+    assert other.claim() is None  # still leased by the dead worker
+    BackfillJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    assert other.run() == 1
+
+    job.refresh_from_db()
+    assert (job.status, job.worker, job.chunks_done) == (BackfillJob.DONE, 'worker-2', 2)
+    assert HourlyWeatherData.objects.filter(location=job.location).count() == 22 * 24
+
+
+@pytest.mark.django_db
+def test_backfill_job_lease_lost_rolls_back_chunk(handler):
+    job = handler.enqueue("Madrid", "2025-01-20", "2025-01-31")
+    claimed = handler.claim()
+    BackfillJob.objects.filter(id=job.id).update(worker='worker-2')
+
+    handler.process(claimed)
+
+    job.refresh_from_db()
+    assert job.status == BackfillJob.RUNNING
+    assert job.chunks_done == 0
+    assert not HourlyWeatherData.objects.exists()
+    assert handler.messages == [f"error : lease of job {job.id} lost"]
+
+
+@pytest.mark.django_db
+def test_backfill_job_fails_after_max_attempts(handler, settings):
+    settings.WEATHER_BACKFILL_MAX_ATTEMPTS = 2
+    job = handler.enqueue("Madrid", "2025-01-20", "2025-01-31")
+    BackfillJob.objects.filter(id=job.id).update(attempts=2, error="boom")
+
+    assert handler.claim() is None
+
+    job.refresh_from_db()
+    assert (job.status, job.error) == (BackfillJob.FAILED, "boom")
+
+
+@pytest.mark.django_db
+def test_backfill_job_unknown_city(handler):
+    job = handler.enqueue("UnknownCity", "2025-01-20", "2025-01-31")
+
+    handler.run()
+
+    job.refresh_from_db()
+    assert (job.status, job.error) == (BackfillJob.FAILED, "No coordinates for UnknownCity")
+
+
+@pytest.mark.django_db
+def test_backfill_job_rejects_reversed_range(handler):
+    with pytest.raises(ValueError):
+        handler.enqueue("Madrid", "2025-02-10", "2025-01-20")
+
+    assert not BackfillJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_process_backfill_jobs_command(handler):
+    job = handler.enqueue("Bilbao", "2025-01-01", "2025-01-02")
+
+    call_command("process_backfill_jobs", processes=1, burst=True)
+
+    job.refresh_from_db()
+    assert job.status == BackfillJob.DONE
+    assert job.inserted_hours == 48
@@ -0,0 +1,42 @@
+import pytest
+
+from weather_app.benchmarks.generator import generate_hourly, populate
+from weather_app.benchmarks.suite import SuiteContext, compare, run_scenarios
+from weather_app.models import HourlyWeatherData
+
+
+def test_generated_series():
+    dates, temperatures, precipitations = generate_hourly(40.4, 2024, 1, seed=3)
+    january = [temperature for date, temperature in zip(dates, temperatures) if date.month == 1]
+    july = [temperature for date, temperature in zip(dates, temperatures) if date.month == 7]
+    rainy = [precipitation for precipitation in precipitations if precipitation]
+
+    assert len(dates) == 366 * 24
+    assert (dates[0].isoformat(), dates[-1].isoformat()) == ("2024-01-01T00:00:00+00:00", "2024-12-31T23:00:00+00:00")
+    assert sum(january) / len(january) + 10 < sum(july) / len(july)
+    assert 0 < len(rainy) < len(dates) / 4
+    assert 0 < precipitations.count(None) < len(dates) / 100
+    assert generate_hourly(40.4, 2024, 1, seed=3) == (dates, temperatures, precipitations)
+
+
+def test_compare_flags_regressions():
+    baseline = {"scenarios": {"temperature": {"median_s": 0.10}, "precipitation": {"median_s": 0.10}}}
+    results = {"scenarios": {"temperature": {"median_s": 0.14}, "precipitation": {"median_s": 0.11},
+                             "timeseries_day": {"median_s": 0.5}}}
+
+    comparisons = compare(results, baseline, tolerance=0.25)
+
+    assert [(comparison["scenario"], comparison["regression"]) for comparison in comparisons] == [
+        ("temperature", True), ("precipitation", False)]
+
+
+@pytest.mark.django_db
+def test_run_scenarios():
+    localities = populate(locations=1, years=1, start_year=2023)
+    results = run_scenarios(SuiteContext(localities, 2023, 1), ["temperature_numpy", "serialize_json"],
+                            repeat=2, warmup=1)
+
+    assert HourlyWeatherData.objects.count() == 365 * 24
+    assert set(results) == {"temperature_numpy", "serialize_json"}
+    assert results["temperature_numpy"]["runs"] == 2
+    assert 0 < results["temperature_numpy"]["min_s"] <= results["temperature_numpy"]["median_s"]
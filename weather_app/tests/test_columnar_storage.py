@@ -0,0 +1,136 @@
+import json
+from io import StringIO
+import math
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from django.core.management import call_command
+from django.test import Client
+
+from weather_app.models import DailyWeatherSummary, HourlySeriesBlock, HourlyWeatherData
+from weather_app.services.columnar_storage import ColumnarStorage
+from weather_app.services.model_handler import ModelHandler
+from weather_app.services.result_cache import result_cache
+
+
+def columns(first, hours):
+    start = datetime.fromisoformat(first)
+    times = [(start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M') for i in range(hours)]
+    temperatures = [round(12.3 + (i % 24) * 0.7 - (i % 5) * 1.1, 1) for i in range(hours)]
+    precipitations = [None if i % 11 == 0 else round((i % 7) * 0.15, 2) for i in range(hours)]
+    return temperatures, precipitations, times
+
+
+@pytest.fixture
+def columnar():
+    return ModelHandler([], storage='columnar')
+
+
+@pytest.mark.django_db
+def test_write_and_read_across_months(columnar):
+    location = columnar.insert_location("Madrid", 40.4, -3.7)
+    temperatures, precipitations, times = columns("2025-01-31T12:00", 48)
+
+    inserted = columnar.insert_hourly_weather_data_bulk(temperatures, precipitations, times, location)
+
+    assert len(inserted) == 48
+    assert not HourlyWeatherData.objects.exists()
+    blocks = list(HourlySeriesBlock.objects.order_by('month'))
+    assert [str(block.month) for block in blocks] == ["2025-01-01", "2025-02-01"]
+    assert len(bytes(blocks[0].temperatures)) == 31 * 24 * 4
+
+    series = columnar.get_hourly_series("Madrid", "2025-01-31T12:00", "2025-02-02")
+    assert series.temperatures.tolist() == temperatures
+    assert [None if math.isnan(value) else value for value in series.precipitations] == precipitations
+    assert series.times[0] == datetime(2025, 1, 31, 12, tzinfo=timezone.utc).timestamp()
+    assert np.all(np.diff(series.times) == 3600)
+
+
+@pytest.mark.django_db
+def test_insert_conflicts_and_upsert(columnar):
+    location = columnar.insert_location("Madrid", 40.4, -3.7)
+    columnar.insert_hourly_weather_data_bulk([10.0, 11.0], [0.0, 0.1], ["2025-10-01T00:00", "2025-10-01T01:00"],
+                                             location)
+
+    inserted = columnar.insert_hourly_weather_data_bulk([10.5, 12.0], [0.0, 0.2],
+                                                        ["2025-10-01T01:00", "2025-10-01T02:00"], location)
+    assert [row.temperature for row in inserted] == [12.0]
+    assert columnar.messages == ["1 hours already stored for Madrid"]
+
+    inserted, updated = columnar.upsert_hourly_weather_data([10.0, 11.5], [0.0, 0.1],
+                                                            ["2025-10-01T00:00", "2025-10-01T01:00"], location,
+                                                            update_changed=True)
+    assert (len(inserted), [row.temperature for row in updated]) == (0, [11.5])
+    assert columnar.get_hourly_series("Madrid").temperatures.tolist() == [10.0, 11.5, 12.0]
+
+
+@pytest.mark.django_db
+def test_missing_date_ranges(columnar):
+    location = columnar.insert_location("Madrid", 40.4, -3.7)
+    columnar.insert_hourly_weather_data_bulk(*columns("2025-10-02T00:00", 24), location)
+
+    assert columnar.get_missing_date_ranges(location, "2025-10-01", "2025-10-04") == [
+        ("2025-10-01", "2025-10-01"), ("2025-10-03", "2025-10-04")]
+
+
+@pytest.mark.django_db
+def test_row_and_columnar_series_match():
+    rows = ModelHandler([])
+    storage = ColumnarStorage()
+    location = rows.insert_location("Madrid", 40.4, -3.7)
+    rows.insert_hourly_weather_data_bulk(*columns("2025-02-27T00:00", 24 * 5), location)
+    call_command("build_series_blocks", stdout=StringIO())
+
+    row_series = rows.get_hourly_series("Madrid", "2025-02-28", "2025-03-02")
+    columnar_series = ModelHandler([], storage='columnar').get_hourly_series("Madrid", "2025-02-28", "2025-03-02")
+
+    assert len(row_series) == 72
+    for name in ("location_ids", "times", "temperatures", "precipitations"):
+        np.testing.assert_array_equal(getattr(row_series, name), getattr(columnar_series, name))
+    assert storage.read().location_ids.tolist() == [location.id] * 24 * 5
+
+
+@pytest.mark.django_db
+def test_build_series_blocks_deletes_rows_and_daily_summaries():
+    rows = ModelHandler([])
+    location = rows.insert_location("Madrid", 40.4, -3.7)
+    rows.insert_hourly_weather_data_bulk(*columns("2025-10-01T00:00", 24 * 2), location)
+    assert DailyWeatherSummary.objects.filter(location=location).count() == 2
+
+    call_command("build_series_blocks", "--delete-rows", stdout=StringIO())
+
+    assert not HourlyWeatherData.objects.filter(location=location).exists()
+    assert not DailyWeatherSummary.objects.filter(location=location).exists()
+    assert len(ColumnarStorage().read()) == 48
+
+
+@pytest.mark.django_db
+def test_statistics_match_between_storages(settings):
+    settings.WEATHER_STATISTICS_USE_DAILY_SUMMARY = False
+    location = ModelHandler([]).insert_location("Madrid", 40.4, -3.7)
+    ModelHandler([]).insert_hourly_weather_data_bulk(*columns("2025-10-01T00:00", 24 * 3), location)
+    call_command("build_series_blocks", stdout=StringIO())
+    client = Client()
+    data = json.dumps({"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Madrid",
+                       "threshold_high": 20, "threshold_low": 10})
+
+    results = dict()
+    for storage in ("rows", "columnar"):
+        settings.WEATHER_STORAGE_BACKEND = storage
+        result_cache.clear()
+        results[storage] = [client.generic("GET", f"/weather_app/{type}/", data, content_type="application/json")
+                            .json()["result_data"] for type in ("temperature", "precipitation", "general_statistics")]
+
+    assert results["rows"] == results["columnar"]
+
+
+@pytest.mark.django_db
+def test_database_backend_needs_rows(settings):
+    settings.WEATHER_STORAGE_BACKEND = 'columnar'
+    data = json.dumps({"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Madrid",
+                       "backend": "database"})
+
+    response = Client().generic("GET", "/weather_app/precipitation/", data, content_type="application/json")
+
+    assert response.status_code == 400
@@ -0,0 +1,77 @@
+import json
+import pytest
+
+from weather_app.services.database_statistics_handler import DatabaseStatisticsHandler
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+
+
+@pytest.fixture
+def weather_data():
+    model_handler = ModelHandler([])
+    madrid = model_handler.insert_location("Madrid", 40.4168, -3.7038)
+    other = model_handler.insert_location("Bilbao", 43.2630, -2.9349)
+    times = [f"2025-10-0{day}T{hour:02d}:00" for day in (1, 2, 3) for hour in range(24)]
+    temperatures = [10.0 + (i * 7 % 24) * 0.75 for i in range(len(times))]
+    precipitations = [0.0 if day == "2" else (i % 5) * 0.25 for i, day in enumerate(t[9] for t in times)]
+    model_handler.insert_hourly_weather_data_bulk(temperatures, precipitations, times, madrid)
+    model_handler.insert_hourly_weather_data_bulk([40.0] * 24, [9.0] * 24, times[:24], other)
+    return model_handler.get_all_weather_data().filter(location__locality="Madrid",
+                                                        date__range=("2025-10-01", "2025-10-03T23:00"))
+
+
+@pytest.mark.django_db
+def test_temperature_statistics_match_pandas(weather_data):
+    pandas_result = MeteoApiHandler([]).calculate_temperature_statistics(weather_data, threshold_high=20,
+                                                                         threshold_low=12)
+    database_result = DatabaseStatisticsHandler([]).calculate_temperature_statistics(weather_data,
+                                                                                     threshold_high=20,
+                                                                                     threshold_low=12)
+
+    assert json.dumps(database_result) == json.dumps(pandas_result)
+    assert database_result["temperature"]["hours_above_threshold"] > 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("threshold_high, threshold_low", [(None, 12), (20, None), (None, None)])
+def test_null_thresholds_match_pandas(weather_data, threshold_high, threshold_low):
+    pandas_result = MeteoApiHandler([]).calculate_temperature_statistics(weather_data, threshold_high, threshold_low)
+    database_result = DatabaseStatisticsHandler([]).calculate_temperature_statistics(weather_data, threshold_high,
+                                                                                     threshold_low)
+    by_location = DatabaseStatisticsHandler([]).calculate_temperature_statistics_by_location(
+        weather_data, threshold_high, threshold_low)
+
+    assert json.dumps(database_result) == json.dumps(pandas_result)
+    assert json.dumps(list(by_location.values())) == json.dumps([pandas_result])
+
+
+@pytest.mark.django_db
+def test_precipitation_statistics_match_pandas(weather_data):
+    pandas_result = MeteoApiHandler([]).calculate_precipitation_statistics(weather_data)
+    database_result = DatabaseStatisticsHandler([]).calculate_precipitation_statistics(weather_data)
+
+    assert json.dumps(database_result) == json.dumps(pandas_result)
+    assert database_result["precipitation"]["days_with_precipitation"] == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("seeded_model_handler", [7, 11, 23], indirect=True)
+def test_statistics_of_one_decimal_data_match_pandas(seeded_model_handler):
+    # random one decimal values, whose sums aren't exact in floating point
+    for locality in ("Madrid", "Bilbao", "Sevilla"):
+        weather_data = seeded_model_handler.get_weather_data_by_locality(locality, "2024-02-21T05:00", "2024-03-05")
+
+        assert json.dumps(DatabaseStatisticsHandler([]).calculate_temperature_statistics(weather_data, 20, 0)) == \
+            json.dumps(MeteoApiHandler([]).calculate_temperature_statistics(weather_data, 20, 0))
+        assert json.dumps(DatabaseStatisticsHandler([]).calculate_precipitation_statistics(weather_data)) == \
+            json.dumps(MeteoApiHandler([]).calculate_precipitation_statistics(weather_data))
+
+
+@pytest.mark.django_db
+def test_statistics_are_computed_in_the_database(weather_data, django_assert_max_num_queries):
+    handler = DatabaseStatisticsHandler([])
+
+    with django_assert_max_num_queries(4):
+        handler.calculate_temperature_statistics(weather_data, threshold_high=20, threshold_low=12)
+    with django_assert_max_num_queries(3):
+        handler.calculate_precipitation_statistics(weather_data)
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.models import Location, GeocodingCacheEntry
+from weather_app.services.async_http_client import AsyncHttpClient
+from weather_app.services.async_meteo_api_handler import AsyncMeteoApiHandler
+from weather_app.services.geocoding_cache import GeocodingCache
+from weather_app.services.http_client import HttpClient
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+
+
+@pytest.fixture
+def cache():
+    return GeocodingCache(max_size=2, ttl=3600, negative_ttl=60)
+
+
+@pytest.mark.django_db
+def test_get_miss(cache):
+    assert cache.get("Madrid") is GeocodingCache.MISS
+
+
+@pytest.mark.django_db
+def test_get_from_location_table(cache):
+    Location.objects.create(locality="Madrid", lat=40.4168, long=-3.7038)
+
+    assert cache.get("Madrid") == {"lat": 40.4168, "lon": -3.7038}
+
+
+@pytest.mark.django_db
+def test_set_and_get_from_local_lru(cache, django_assert_num_queries):
+    cache.set("Madrid", {"lat": 40.4168, "lon": -3.7038})
+
+    with django_assert_num_queries(0):
+        assert cache.get(" madrid ") == {"lat": 40.4168, "lon": -3.7038}
+
+
+@pytest.mark.django_db
+def test_lru_eviction_falls_back_to_table(cache, django_assert_num_queries):
+    cache.set("Madrid", {"lat": 40.4168, "lon": -3.7038})
+    cache.set("Bilbao", {"lat": 43.2630, "lon": -2.9349})
+    cache.set("Sevilla", {"lat": 37.3886, "lon": -5.9823})
+
+    with django_assert_num_queries(0):
+        assert cache.get("Sevilla") == {"lat": 37.3886, "lon": -5.9823}
+    with django_assert_num_queries(2):
+        assert cache.get("Madrid") == {"lat": 40.4168, "lon": -3.7038}
+
+
+@pytest.mark.django_db
+def test_negative_cache_expires(cache):
+    cache.set("CiudadInventada", None)
+    assert cache.get("CiudadInventada") is None
+
+    cache.clear()
+    GeocodingCacheEntry.objects.update(updated_at=GeocodingCacheEntry.objects.get().updated_at - timedelta(minutes=2))
+    assert cache.get("CiudadInventada") is GeocodingCache.MISS
+
+
+@pytest.mark.django_db
+def test_get_coordinates_uses_cache(cache):
+    messages = []
+    handler = MeteoApiHandler(messages, geocoding_cache=cache)
+
+    with patch.object(MeteoApiHandler, "request_coordinates", return_value=None) as mock_request:
+        assert handler.get_coordinates("CiudadInventada") is None
+        assert handler.get_coordinates("CiudadInventada") is None
+
+    assert mock_request.call_count == 1
+    assert messages == ["No coordinates for CiudadInventada"] * 2
+
+
+@pytest.mark.django_db
+def test_failed_geocoding_is_not_cached(cache, settings):
+    messages = []
+    handler = MeteoApiHandler(messages, geocoding_cache=cache, http_client=HttpClient(max_retries=0))
+    with StubUpstream() as upstream:
+        settings.OPEN_METEO_GEOCODING_URL = upstream.geocoding_url
+        upstream.fail(503)
+        assert handler.get_coordinates("Sevilla") is None
+        assert not GeocodingCacheEntry.objects.exists()
+
+        assert handler.get_coordinates("Sevilla") is not None
+
+    assert len(messages) == 1 and messages[0].startswith("error : Geocoding API error 503")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failed_async_geocoding_is_not_cached(cache, settings):
+    messages = []
+    handler = AsyncMeteoApiHandler(messages, geocoding_cache=cache, async_http_client=AsyncHttpClient(max_retries=0))
+    with StubUpstream() as upstream:
+        settings.OPEN_METEO_GEOCODING_URL = upstream.geocoding_url
+        upstream.fail(503)
+
+        async def fetch():
+            return await handler.get_coordinates("Sevilla"), await handler.get_coordinates("Sevilla")
+
+        failed, recovered = asyncio.run(fetch())
+
+    assert failed is None
+    assert recovered is not None
+    assert len(messages) == 1 and messages[0].startswith("error : Geocoding API error")
@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.services.http_client import HttpClient
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+
+
+@pytest.fixture
+def upstream():
+    with StubUpstream() as stub:
+        yield stub
+
+
+def test_connections_are_reused(upstream):
+    client = HttpClient(pool_size=2, max_retries=0)
+
+    for _ in range(3):
+        assert client.get(upstream.geocoding_url, params={"name": "Madrid"}).status_code == 200
+
+    assert client.stats() == {"requests": 3, "new_connections": 1, "reused_connections": 2}
+
+
+def test_retries_on_server_errors(upstream):
+    client = HttpClient(max_retries=3, backoff_factor=0)
+    upstream.fail(503, 429)
+
+    response = client.get(upstream.geocoding_url, params={"name": "Madrid"})
+
+    assert response.status_code == 200
+    assert upstream.request_count == 3
+
+
+def test_returns_last_error_when_retries_are_exhausted(upstream):
+    client = HttpClient(max_retries=1, backoff_factor=0)
+    upstream.fail(500, 500)
+
+    assert client.get(upstream.geocoding_url).status_code == 500
+
+
+def test_read_timeout(upstream):
+    client = HttpClient(read_timeout=0.05, max_retries=0)
+    upstream.server.latency = 0.5
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(upstream.geocoding_url)
+
+
+def test_injected_transport():
+    class StubTransport(requests.adapters.BaseAdapter):
+        def send(self, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"results": [{"latitude": 1.0, "longitude": 2.0}]}'
+            return response
+
+        def close(self):
+            pass
+
+    client = HttpClient(transport=StubTransport())
+
+    assert client.get("https://geocoding.invalid/v1/search").json()["results"][0]["latitude"] == 1.0
+    assert client.stats() == {}
+
+
+def test_meteo_api_handler_against_stub(upstream, settings):
+    settings.OPEN_METEO_GEOCODING_URL = upstream.geocoding_url
+    settings.OPEN_METEO_ARCHIVE_URL = upstream.archive_url
+    client = HttpClient(max_retries=0)
+    handler = MeteoApiHandler(messages=[], http_client=client)
+
+    coordinates = handler.get_coordinates("Madrid")
+    temperatures, precipitations, times = handler.get_hourly_weather_data(
+        coordinates["lat"], coordinates["lon"], "2025-10-01", "2025-10-02")
+
+    assert len(temperatures) == len(precipitations) == len(times) == 48
+    assert client.stats()["new_connections"] == 1
+
+
+def test_max_concurrency(upstream):
+    client = HttpClient(max_concurrency=1, max_retries=0)
+    upstream.server.latency = 0.05
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: client.get(upstream.geocoding_url), range(4)))
+
+    assert time.perf_counter() - start >= 0.2
@@ -0,0 +1,115 @@
+import pytest
+
+from weather_app.benchmarks.stub_upstream import StubUpstream
+from weather_app.models import HourlyWeatherData, Location
+from weather_app.services.geocoding_cache import GeocodingCache
+from weather_app.services.http_client import HttpClient
+from weather_app.services.ingestion_handler import IngestionHandler
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+
+
+@pytest.fixture
+def upstream(settings):
+    with StubUpstream(latency=0.01) as stub:
+        settings.OPEN_METEO_GEOCODING_URL = stub.geocoding_url
+        settings.OPEN_METEO_ARCHIVE_URL = stub.archive_url
+        yield stub
+
+
+@pytest.fixture
+def handler(upstream):
+    messages = []
+    meteo_api_handler = MeteoApiHandler(messages, geocoding_cache=GeocodingCache(),
+                                        http_client=HttpClient(max_retries=0))
+    return IngestionHandler(messages, ModelHandler(messages), meteo_api_handler, max_workers=4)
+
+
+@pytest.mark.django_db
+def test_ingest_many(handler):
+    statuses = handler.ingest_many(["Madrid", "Bilbao", "UnknownCity", "Madrid"], "2025-10-01", "2025-10-02")
+
+    assert [status["city_name"] for status in statuses] == ["Madrid", "Bilbao", "UnknownCity"]
+    assert [status["status"] for status in statuses] == ["ok", "ok", "error"]
+    assert statuses[0]["inserted_hours"] == 48
+    assert statuses[2]["message"] == ["No coordinates for UnknownCity"]
+    assert HourlyWeatherData.objects.count() == 96
+
+
+@pytest.mark.django_db
+def test_ingest_many_upsert_only_requests_missing_days(handler, upstream):
+    handler.ingest_many(["Madrid"], "2025-10-01", "2025-10-02", mode="upsert")
+    requests_before = upstream.request_count
+
+    statuses = handler.ingest_many(["Madrid"], "2025-10-01", "2025-10-03", mode="upsert")
+
+    assert statuses[0]["inserted_hours"] == 24
+    assert upstream.request_count - requests_before == 1
+    assert HourlyWeatherData.objects.count() == 72
+
+
+@pytest.mark.django_db
+def test_ingest_many_insert_mode_reports_existing_city(handler):
+    handler.ingest_many(["Madrid"], "2025-10-01", "2025-10-01")
+
+    statuses = handler.ingest_many(["Madrid"], "2025-10-01", "2025-10-01")
+
+    assert statuses[0]["status"] == "error"
+    assert "UNIQUE constraint failed" in statuses[0]["message"][0]
+
+
+@pytest.mark.django_db
+def test_ingest_many_groups_archive_requests(handler, upstream):
+    handler.group_size = 2
+    city_names = ["Madrid", "Bilbao", "Sevilla", "Granada", "Cadiz"]
+
+    statuses = handler.ingest_many(city_names, "2025-10-01", "2025-10-01")
+
+    assert all(status["inserted_hours"] == 24 for status in statuses)
+    # 5 geocoding requests and 3 archive requests
+    assert upstream.request_count == 8
+
+
+@pytest.mark.django_db
+def test_ingest_stream(handler, upstream, settings):
+    settings.WEATHER_STREAM_WINDOW_DAYS = 2
+    settings.WEATHER_INGEST_BATCH_SIZE = 50
+    coordinates = handler.meteo_api_handler.get_coordinates("Madrid")
+
+    location, inserted_hours, updated_hours = handler.ingest_stream("Madrid", coordinates, "2025-10-01",
+                                                                    "2025-10-05", mode="upsert",
+                                                                    update_changed=False)
+
+    assert (inserted_hours, updated_hours) == (120, 0)
+    # one geocoding request and three archive windows
+    assert upstream.request_count == 4
+    assert HourlyWeatherData.objects.filter(location=location).count() == 120
+
+
+@pytest.mark.django_db
+def test_ingest_stream_reports_failed_windows(handler, upstream, settings):
+    settings.WEATHER_STREAM_WINDOW_DAYS = 2
+    coordinates = handler.meteo_api_handler.get_coordinates("Madrid")
+
+    upstream.fail(400)
+    location, inserted_hours, _ = handler.ingest_stream("Madrid", coordinates, "2025-10-01", "2025-10-05",
+                                                        mode="insert", update_changed=False)
+
+    assert inserted_hours == 72
+    assert handler.messages == ["error : archive window 2025-10-01 - 2025-10-02 failed: "
+                                "Archive API error: injected failure"]
+    assert HourlyWeatherData.objects.filter(location=location).count() == 72
+
+
+@pytest.mark.django_db
+def test_ingest_stream_without_hours_leaves_no_location(handler, upstream):
+    coordinates = handler.meteo_api_handler.get_coordinates("Madrid")
+
+    upstream.fail(400)
+    assert handler.ingest_stream("Madrid", coordinates, "2025-10-01", "2025-10-02", mode="insert",
+                                 update_changed=False) == (None, 0, 0)
+    assert not Location.objects.exists()
+
+    location, inserted_hours, _ = handler.ingest_stream("Madrid", coordinates, "2025-10-01", "2025-10-02",
+                                                        mode="insert", update_changed=False)
+    assert (location.locality, inserted_hours) == ("Madrid", 48)
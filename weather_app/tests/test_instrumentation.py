@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import threading
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from weather_app.benchmarks.load_test import read_request_log
+from weather_app.services.instrumentation import (Metrics, RequestProfile, activate, deactivate, metrics, phase,
+                                                  propagate)
+from weather_app.services.model_handler import ModelHandler
+from weather_app.services.result_cache import result_cache
+
+SAMPLED = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': True, 'LOG': True}
+REPLAYABLE = {**SAMPLED, 'LOG_BODY': True}
+UNSAMPLED = {'ENABLED': True, 'SAMPLE_RATE': 0.0, 'SERVER_TIMING': True, 'LOG': True}
+
+
+def record_upstream():
+    with phase("upstream"):
+        pass
+
+
+def test_phases_of_the_request_profile():
+    profile = RequestProfile()
+    with phase("statistics"):
+        pass
+    assert profile.phases == {}
+
+    token = activate(profile)
+    try:
+        with phase("statistics"):
+            # a nested phase of the same name is part of the outer one
+            with phase("statistics"):
+                pass
+        # the phases of a pool thread are recorded in the profile of the submitting request
+        thread = threading.Thread(target=propagate(record_upstream))
+        thread.start()
+        thread.join()
+    finally:
+        deactivate(token)
+
+    assert profile.phases["statistics"][1] == 1
+    assert profile.phases["upstream"][1] == 1
+    assert profile.server_timing(1.0).endswith('total;dur=1000.000')
+
+
+def test_metrics_text_format():
+    registry = Metrics(buckets=(0.1, 1.0))
+    profile = RequestProfile()
+    profile.add("db", 0.25)
+    profile.add("db", 0.25)
+    registry.observe("temperature", "GET", 200, 0.5, profile)
+    registry.observe("temperature", "GET", 400, 0.05)
+
+    lines = registry.render().splitlines()
+    assert 'weather_requests_total{endpoint="temperature",method="GET",status="200"} 1' in lines
+    assert 'weather_requests_total{endpoint="temperature",method="GET",status="400"} 1' in lines
+    assert 'weather_request_duration_seconds_bucket{endpoint="temperature",le="0.1"} 1' in lines
+    assert 'weather_request_duration_seconds_bucket{endpoint="temperature",le="1.0"} 2' in lines
+    assert 'weather_request_duration_seconds_bucket{endpoint="temperature",le="+Inf"} 2' in lines
+    assert 'weather_request_duration_seconds_count{endpoint="temperature"} 2' in lines
+    assert 'weather_sampled_requests_total 1' in lines
+    assert 'weather_phase_seconds_total{phase="db"} 0.5' in lines
+    assert 'weather_phase_calls_total{phase="db"} 2' in lines
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        location = ModelHandler([]).insert_location("Madrid", 40.4168, -3.7038)
+        times = [f"2025-10-01T{hour:02d}:00" for hour in range(24)]
+        ModelHandler([]).insert_hourly_weather_data_bulk([hour * 0.5 for hour in range(24)], [0.25] * 24, times,
+                                                         location)
+        result_cache.clear()
+        metrics.clear()
+
+    def get_temperature(self, query=""):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01T12:00", "city_name": "Madrid",
+                "threshold_high": 10, "threshold_low": 1}
+        return self.client.generic("GET", r"http://localhost:8000/weather_app/temperature/" + query,
+                                   json.dumps(data), content_type="application/json")
+
+    @override_settings(WEATHER_INSTRUMENTATION=SAMPLED)
+    def test_sampled_request(self):
+        with self.assertLogs("weather_app.middleware", "INFO") as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.get_temperature()
+
+        self.assertEqual(response.status_code, 200)
+        timings = {metric.split(";")[0]: metric for metric in response["Server-Timing"].split(", ")}
+        self.assertEqual(set(timings), {"db", "load", "statistics", "serialize", "total"})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["endpoint"], record["status"]), ("temperature", 200))
+        # every database query of the request is counted
+        self.assertEqual(record["phases"]["db"]["calls"], len(queries))
+        self.assertIn(f'desc="{record["phases"]["db"]["calls"]} calls"', timings["db"])
+
+        lines = self.client.get(r"http://localhost:8000/weather_app/metrics/").content.decode().splitlines()
+        self.assertIn('weather_requests_total{endpoint="temperature",method="GET",status="200"} 1', lines)
+        self.assertIn('weather_sampled_requests_total 1', lines)
+
+    @override_settings(WEATHER_INSTRUMENTATION=UNSAMPLED)
+    def test_unsampled_request_is_only_counted(self):
+        response = self.get_temperature()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(metrics.requests, {("temperature", "GET", 200): 1})
+        self.assertEqual(metrics.sampled, 0)
+
+    @override_settings(WEATHER_INSTRUMENTATION=REPLAYABLE)
+    def test_request_log_can_be_replayed(self):
+        with self.assertLogs("weather_app.middleware", "INFO") as logs:
+            response = self.get_temperature("?format=csv")
+
+        self.assertEqual(response.status_code, 200)
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, "requests.log")
+            with open(log, "w") as log_file:
+                log_file.write("\n".join(logs.output))
+            entries = read_request_log(log)
+        self.assertEqual(entries, [{
+            "method": "GET", "path": "/weather_app/temperature/", "query": "format=csv",
+            "data": {"start_date": "2025-10-01", "end_date": "2025-10-01T12:00", "city_name": "Madrid",
+                     "threshold_high": 10, "threshold_low": 1}}])
@@ -0,0 +1,48 @@
+import json
+
+from weather_app.benchmarks.load_test import LoadTest, build_mix, read_request_log, summarize
+from weather_app.benchmarks.stub_upstream import StubUpstream
+
+
+def test_read_request_log(tmp_path):
+    log = tmp_path / "requests.log"
+    record = {"endpoint": "temperature", "method": "GET", "path": "/weather_app/temperature/", "status": 200,
+              "query": "format=csv", "data": {"city_name": "Madrid"}}
+    log.write_text("\n".join(["INFO weather_app.middleware " + json.dumps(record), "Starting server",
+                              json.dumps({"method": "GET"}), "{not json"]))
+
+    assert read_request_log(str(log)) == [{"method": "GET", "path": "/weather_app/temperature/",
+                                           "query": "format=csv", "data": {"city_name": "Madrid"}}]
+
+
+def test_build_mix():
+    entries = build_mix(["Generated 0", "Generated 1"], 2023, 2, size=200, seed=1)
+
+    assert entries == build_mix(["Generated 0", "Generated 1"], 2023, 2, size=200, seed=1)
+    assert {entry["path"] for entry in entries} == {"/weather_app/weather_data/", "/weather_app/temperature/",
+                                                    "/weather_app/precipitation/", "/weather_app/timeseries/",
+                                                    "/weather_app/general_statistics/"}
+    assert all("2023-01-01" <= entry["data"]["start_date"] <= entry["data"]["end_date"] <= "2024-12-31"
+               for entry in entries)
+
+
+def test_summarize():
+    summary = summarize([0.002, 0.02, 0.03, 0.3], {200: 3, 500: 1}, {"ConnectionResetError": 1}, 2.0,
+                        buckets=(0.01, 0.1))
+
+    assert (summary["requests"], summary["errors"], summary["error_rate"]) == (5, 2, 0.4)
+    assert summary["throughput_rps"] == 2.5
+    assert (summary["p50_ms"], summary["p99_ms"]) == (20.0, 300.0)
+    assert summary["histogram"] == [["0.01", 1], ["0.1", 2], ["+Inf", 1]]
+
+
+def test_load_test_counts_errors():
+    entries = [{"method": "GET", "path": "/v1/search", "query": "name=Madrid", "data": None}]
+    with StubUpstream() as upstream:
+        upstream.fail(500)
+        results = LoadTest(upstream.url, entries, concurrency=2, requests=6).run()
+
+    assert upstream.request_count == 6
+    assert list(results["endpoints"]) == ["/v1/search"]
+    assert results["total"]["statuses"] == {"200": 5, "500": 1}
+    assert results["total"]["errors"] == 1
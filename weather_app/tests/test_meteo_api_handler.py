@@ -1,7 +1,12 @@
+import asyncio
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
 
+from weather_app.benchmarks.stub_upstream import StubUpstream, fake_coordinates
+from weather_app.services.async_http_client import AsyncHttpClient
+from weather_app.services.async_meteo_api_handler import AsyncMeteoApiHandler
+from weather_app.services.http_client import HttpClient
 from weather_app.services.meteo_api_handler import MeteoApiHandler
 
 
@@ -11,7 +16,7 @@ def handler():
 
 
 # --- TEST get_coordinates ---
-@patch("weather_app.services.meteo_api_handler.requests.get")
+@patch("weather_app.services.http_client.HttpClient.get")
 def test_get_coordinates_success(mock_get, handler):
     mock_response = MagicMock()
     mock_response.json.return_value = {
@@ -28,8 +33,8 @@ def test_get_coordinates_debug():
     messages = []
     handler = MeteoApiHandler(messages)
 
-    # Mock requests.get
-    with patch("weather_app.services.meteo_api_handler.requests.get") as mock_get:
+    # Mock HttpClient.get
+    with patch("weather_app.services.http_client.HttpClient.get") as mock_get:
         mock_get.return_value.json.return_value = {
             "results": [
                 {"latitude": 40.4168, "longitude": -3.7038}  # Madrid
@@ -39,7 +44,7 @@ def test_get_coordinates_debug():
         coords = handler.get_coordinates("Madrid")
         assert coords == {"lat": 40.4168, "lon": -3.7038}
 
-@patch("weather_app.services.meteo_api_handler.requests.get")
+@patch("weather_app.services.http_client.HttpClient.get")
 def test_get_coordinates_not_found(mock_get, handler):
     mock_response = MagicMock()
     mock_response.json.return_value = {}
@@ -52,7 +57,7 @@ def test_get_coordinates_not_found(mock_get, handler):
 
 
 # --- TEST get_hourly_weather_data ---
-@patch("weather_app.services.meteo_api_handler.requests.get")
+@patch("weather_app.services.http_client.HttpClient.get")
 def test_get_hourly_weather_data(mock_get, handler):
     mock_response = MagicMock()
     mock_response.json.return_value = {
@@ -88,6 +93,17 @@ def test_calculate_temperature_statistics(handler):
     assert temp["hours_below_threshold"] == 1
 
 
+def test_average_by_day_is_rounded_to_two_decimals(handler):
+    # the raw means are 0.15000000000000002, 8.575 (8.57499... in floating point) and 12.322500000000002
+    data = [{"temperature": temperature, "date": pd.Timestamp(date)} for temperature, date in (
+        (0.1, "2025-10-01 00:00"), (0.2, "2025-10-01 01:00"), (8.57, "2025-10-02 00:00"),
+        (8.58, "2025-10-02 01:00"), (12.345, "2025-10-03 00:00"), (12.3, "2025-10-03 01:00"))]
+
+    stats = handler.calculate_temperature_statistics(data, threshold_high=14, threshold_low=9)
+
+    assert stats["temperature"]["average_by_day"] == {"2025-10-01": 0.15, "2025-10-02": 8.57, "2025-10-03": 12.32}
+
+
 # --- TEST calculate_precipitation_statistics ---
 def test_calculate_precipitation_statistics(handler):
     data = [
@@ -105,25 +121,11 @@ def test_calculate_precipitation_statistics(handler):
     assert precip["average"] == pytest.approx(1.17, rel=1e-2)
 
 
-# --- TEST calculate_statistics_by_location ---
-def test_calculate_statistics_by_location(handler):
-    df = pd.DataFrame([
-        {"temperature": 10.0, "precipitation": 0.0, "date": pd.Timestamp("2025-10-01 00:00")},
-        {"temperature": 20.0, "precipitation": 2.5, "date": pd.Timestamp("2025-10-01 01:00")},
-        {"temperature": 15.0, "precipitation": 1.0, "date": pd.Timestamp("2025-10-02 00:00")},
-    ])
-
-    stats = handler.calculate_statistics_by_location(df, threshold_low=9, threshold_high=18)
-
-    assert stats["temperature"]["max"]["value"] == 20.0
-    assert stats["precipitation"]["total"] == 3.5
-    assert stats["precipitation"]["days_with_precipitation"] == 2
-
-
 # --- TEST calculate_general_statistics ---
 @patch("weather_app.services.meteo_api_handler.Location")
 def test_calculate_general_statistics(mock_location, handler):
-    mock_location.objects.get.side_effect = lambda id: type("Loc", (), {"locality": f"City{id}"})()
+    mock_location.objects.in_bulk.side_effect = lambda ids: {
+        id: type("Loc", (), {"locality": f"City{id}"})() for id in ids}
 
     data = [
         {"location_id": 1, "temperature": 10.0, "precipitation": 0.5, "date": pd.Timestamp("2025-10-01")},
@@ -135,3 +137,127 @@ def test_calculate_general_statistics(mock_location, handler):
     assert "City1" in stats
     assert "City2" in stats
     assert "temperature" in stats["City1"]
+    assert mock_location.objects.in_bulk.call_count == 1
+
+
+# --- TEST get_hourly_weather_data_for_ranges ---
+def test_get_hourly_weather_data_for_ranges(handler):
+    responses = {
+        "2025-10-01": ([10.0], [0.0], ["2025-10-01T00:00"]),
+        "2025-10-05": ([12.0], [0.3], ["2025-10-05T00:00"]),
+    }
+    with patch.object(MeteoApiHandler, "get_hourly_weather_data",
+                      side_effect=lambda latitude, longitude, start_date, end_date: responses[start_date]) as mock:
+        temps, precs, times = handler.get_hourly_weather_data_for_ranges(
+            40.0, -3.0, [("2025-10-01", "2025-10-01"), ("2025-10-05", "2025-10-06")])
+
+    assert mock.call_count == 2
+    assert temps == [10.0, 12.0]
+    assert precs == [0.0, 0.3]
+    assert times == ["2025-10-01T00:00", "2025-10-05T00:00"]
+
+
+# --- TEST split_date_range_by ---
+def test_split_date_range_by():
+    assert MeteoApiHandler.split_date_range_by("2023-11-15", "2024-02-10", "month") == [
+        ("2023-11-15", "2023-11-30"), ("2023-12-01", "2023-12-31"),
+        ("2024-01-01", "2024-01-31"), ("2024-02-01", "2024-02-10")]
+    assert MeteoApiHandler.split_date_range_by("2023-06-01", "2025-01-01", "year") == [
+        ("2023-06-01", "2023-12-31"), ("2024-01-01", "2024-12-31"), ("2025-01-01", "2025-01-01")]
+    assert MeteoApiHandler.split_date_range_by("2025-10-01", "2025-10-05", 2)[-1] == ("2025-10-05", "2025-10-05")
+
+
+# --- TEST get_hourly_weather_data_for_ranges in chunks ---
+def test_get_hourly_weather_data_for_ranges_chunks(settings):
+    settings.HTTP_CLIENT_BACKOFF_FACTOR = 0
+    messages = []
+    with StubUpstream(latency=0.01) as upstream:
+        settings.OPEN_METEO_ARCHIVE_URL = upstream.archive_url
+        handler = MeteoApiHandler(messages, http_client=HttpClient(max_retries=0))
+        # the first chunk fails twice and is retried on its own
+        upstream.fail(500, 500)
+        temps, precs, times = handler.get_hourly_weather_data_for_ranges(
+            40.0, -3.0, [("2025-01-01", "2025-03-31")], chunk="month", max_workers=3, retries=2)
+
+        assert len(times) == (31 + 28 + 31) * 24
+        assert times == sorted(times)
+        assert messages == []
+
+        upstream.fail(500, 500)
+        temps, precs, times = handler.get_hourly_weather_data_for_ranges(
+            40.0, -3.0, [("2025-01-01", "2025-03-31")], chunk="month", max_workers=1, retries=1)
+
+    # only the failed chunk is missing from the answer
+    assert times[0] == "2025-02-01T00:00"
+    assert len(times) == (28 + 31) * 24
+    assert messages == ["error : archive chunk 2025-01-01 - 2025-01-31 failed: Archive API error: injected failure"]
+
+
+# --- TEST AsyncMeteoApiHandler ---
+def test_async_get_hourly_weather_data_for_ranges(settings):
+    settings.HTTP_CLIENT_BACKOFF_FACTOR = 0
+    messages = []
+    with StubUpstream(latency=0.05) as upstream:
+        settings.OPEN_METEO_GEOCODING_URL = upstream.geocoding_url
+        settings.OPEN_METEO_ARCHIVE_URL = upstream.archive_url
+        handler = AsyncMeteoApiHandler(messages, async_http_client=AsyncHttpClient(max_retries=0))
+
+        async def fetch():
+            coordinates = await handler.get_coordinates("Sevilla")
+            # the first chunk fails twice and is retried on its own, then a chunk fails for good
+            upstream.fail(500, 500)
+            retried = await handler.get_hourly_weather_data_for_ranges(
+                coordinates["lat"], coordinates["lon"], [("2025-01-01", "2025-03-31")], chunk="month",
+                max_workers=1, retries=2)
+            upstream.fail(500)
+            return coordinates, retried, await handler.get_hourly_weather_data_for_ranges(
+                coordinates["lat"], coordinates["lon"], [("2025-01-01", "2025-01-10")], chunk=5, max_workers=1,
+                retries=0)
+
+        coordinates, retried, failed = asyncio.run(fetch())
+
+    assert coordinates == {"lat": fake_coordinates("Sevilla")[0], "lon": fake_coordinates("Sevilla")[1]}
+    assert len(retried[2]) == (31 + 28 + 31) * 24
+    assert retried[2] == sorted(retried[2])
+    assert failed[2][0] == "2025-01-06T00:00"
+    assert len(failed[2]) == 5 * 24
+    assert messages == ["error : archive chunk 2025-01-01 - 2025-01-05 failed: Archive API error: injected failure"]
+
+
+# --- TEST get_hourly_weather_data_multi ---
+@patch("weather_app.services.http_client.HttpClient.get")
+def test_get_hourly_weather_data_multi(mock_get, handler):
+    def block(temperature):
+        return {"hourly": {"temperature_2m": [temperature], "precipitation": [0.0], "time": ["2025-10-01T00:00"]}}
+
+    mock_get.return_value.json.side_effect = [[block(10.0), block(11.0)], block(12.0)]
+
+    data = handler.get_hourly_weather_data_multi([(40.0, -3.0), (41.0, 2.0), (37.0, -6.0)],
+                                                 "2025-10-01", "2025-10-01", group_size=2)
+
+    assert mock_get.call_count == 2
+    assert mock_get.call_args_list[0].kwargs["params"]["latitude"] == "40.0,41.0"
+    assert [temperatures for temperatures, _, _ in data] == [[10.0], [11.0], [12.0]]
+
+
+@patch("weather_app.services.meteo_api_handler.Location")
+def test_calculate_general_statistics_by_location(mock_location, handler):
+    mock_location.objects.in_bulk.return_value = {}
+
+    data = [
+        {"location_id": 1, "temperature": 10.0, "precipitation": 0.5, "date": pd.Timestamp("2025-10-01 00:00")},
+        {"location_id": 1, "temperature": 12.0, "precipitation": 0.0, "date": pd.Timestamp("2025-10-01 01:00")},
+        {"location_id": 1, "temperature": 20.0, "precipitation": 0.0, "date": pd.Timestamp("2025-10-02 00:00")},
+        {"location_id": 2, "temperature": 14.0, "precipitation": 1.0, "date": pd.Timestamp("2025-10-01 00:00")},
+        {"location_id": 2, "temperature": 4.0, "precipitation": 3.0, "date": pd.Timestamp("2025-10-02 05:00")},
+    ]
+
+    stats = handler.calculate_general_statistics(data, threshold_low=9, threshold_high=18)
+
+    for location_id in (1, 2):
+        rows = [row for row in data if row["location_id"] == location_id]
+        expected = {**handler.calculate_temperature_statistics(rows, threshold_high=18, threshold_low=9),
+                    **handler.calculate_precipitation_statistics(rows)}
+        assert stats[f"ID_{location_id}"] == expected
+    assert stats["ID_1"]["temperature"]["average_by_day"] == {"2025-10-01": 11.0, "2025-10-02": 20.0}
+    assert stats["ID_2"]["temperature"]["max"]["value"] == 14.0
@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime
+from datetime import date, datetime
 
 from weather_app.services.model_handler import ModelHandler
 
@@ -102,3 +102,119 @@ def test_get_all_weather_data():
     temps = [d['temperature'] for d in data]
     assert 15.0 in temps
     assert 16.0 in temps
+
+
+@pytest.mark.django_db
+def test_insert_hourly_weather_data_bulk_success():
+    messages = []
+    handler = ModelHandler(messages)
+
+    loc = handler.insert_location("Zaragoza", 41.6488, -0.8891)
+    times = [f"2025-10-28T{hour:02d}:00" for hour in range(24)]
+    temperatures = [float(hour) for hour in range(24)]
+    precipitations = [0.0] * 24
+
+    data = handler.insert_hourly_weather_data_bulk(temperatures, precipitations, times, loc, batch_size=10)
+
+    assert len(data) == 24
+    assert all(d.pk is not None for d in data)
+    assert handler.get_all_weather_data().count() == 24
+    assert messages == []
+
+
+@pytest.mark.django_db
+def test_insert_hourly_weather_data_bulk_reports_conflicts_by_batch():
+    messages = []
+    handler = ModelHandler(messages)
+
+    loc = handler.insert_location("Malaga", 36.7213, -4.4214)
+    handler.insert_hourly_weather_data(18.0, 0.0, "2025-10-28T01:00", loc)
+    handler.insert_hourly_weather_data(19.0, 0.0, "2025-10-28T05:00", loc)
+    times = [f"2025-10-28T{hour:02d}:00" for hour in range(6)]
+
+    data = handler.insert_hourly_weather_data_bulk([20.0] * 6, [0.0] * 6, times, loc, batch_size=3)
+
+    assert len(data) == 4
+    assert messages == ["batch 1: 1 rows conflict with unique_location_date",
+                        "batch 2: 1 rows conflict with unique_location_date"]
+    assert handler.get_all_weather_data().count() == 6
+
+
+@pytest.mark.django_db
+def test_insert_hourly_weather_data_bulk_repeated_hours_are_not_conflicts():
+    messages = []
+    handler = ModelHandler(messages)
+
+    loc = handler.insert_location("Malaga", 36.7213, -4.4214)
+    handler.insert_hourly_weather_data(18.0, 0.0, "2025-10-28T02:00", loc)
+    times = ["2025-10-28T00:00", "2025-10-28T00:00", "2025-10-28T01:00", "2025-10-28T02:00"]
+
+    data = handler.insert_hourly_weather_data_bulk([20.0, 21.0, 22.0, 23.0], [0.0] * 4, times, loc)
+
+    assert [row.temperature for row in data] == [20.0, 22.0]
+    assert messages == ["batch 1: 1 rows conflict with unique_location_date"]
+
+
+@pytest.mark.django_db
+def test_upsert_location_reuses_existing():
+    messages = []
+    handler = ModelHandler(messages)
+
+    loc1 = handler.upsert_location("Cadiz", 36.5271, -6.2886)
+    loc2 = handler.upsert_location("Cadiz", 36.5271, -6.2886)
+
+    assert loc1.pk == loc2.pk
+    assert len(handler.get_all_locations()) == 1
+    assert messages == []
+
+
+@pytest.mark.django_db
+def test_upsert_hourly_weather_data_inserts_missing_and_updates_changed():
+    messages = []
+    handler = ModelHandler(messages)
+
+    loc = handler.insert_location("Toledo", 39.8628, -4.0273)
+    handler.insert_hourly_weather_data_bulk([10.0, 11.0], [0.0, 0.0],
+                                            ["2025-10-28T00:00", "2025-10-28T01:00"], loc)
+    times = ["2025-10-28T00:00", "2025-10-28T01:00", "2025-10-28T02:00"]
+
+    inserted, updated = handler.upsert_hourly_weather_data([10.0, 11.5, 12.0], [0.0, 0.0, 0.1], times, loc)
+    assert [d.temperature for d in inserted] == [12.0]
+    assert updated == []
+
+    inserted, updated = handler.upsert_hourly_weather_data([10.0, 11.5, 12.0], [0.0, 0.0, 0.1], times, loc,
+                                                           update_changed=True)
+    assert inserted == []
+    assert [d.temperature for d in updated] == [11.5]
+    assert sorted(d['temperature'] for d in handler.get_all_weather_data()) == [10.0, 11.5, 12.0]
+    assert messages == []
+
+
+@pytest.mark.django_db
+def test_get_missing_date_ranges():
+    messages = []
+    handler = ModelHandler(messages)
+
+    loc = handler.insert_location("Murcia", 37.9922, -1.1307)
+    assert handler.get_missing_date_ranges(None, "2025-10-01", "2025-10-05") == [("2025-10-01", "2025-10-05")]
+
+    for day in ("2025-10-02", "2025-10-03"):
+        times = [f"{day}T{hour:02d}:00" for hour in range(24)]
+        handler.insert_hourly_weather_data_bulk([15.0] * 24, [0.0] * 24, times, loc)
+    handler.insert_hourly_weather_data_bulk([15.0] * 12, [0.0] * 12,
+                                            [f"2025-10-05T{hour:02d}:00" for hour in range(12)], loc)
+
+    ranges = handler.get_missing_date_ranges(loc, "2025-10-01", "2025-10-06")
+
+    assert ranges == [("2025-10-01", "2025-10-01"), ("2025-10-04", "2025-10-06")]
+    assert handler.get_missing_date_ranges(loc, "2025-10-02", "2025-10-03") == []
+
+
+def test_get_whole_day_range():
+    handler = ModelHandler([])
+
+    assert handler.get_whole_day_range("2025-10-01", "2025-10-03") == (date(2025, 10, 1), date(2025, 10, 3))
+    assert handler.get_whole_day_range("2025-10-01T00:00", "2025-10-03T23:00") == (date(2025, 10, 1),
+                                                                                   date(2025, 10, 3))
+    assert handler.get_whole_day_range("2025-10-01T06:00", "2025-10-03") is None
+    assert handler.get_whole_day_range("2025-10-01", "2025-10-03T12:00") is None
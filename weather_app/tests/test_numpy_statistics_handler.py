@@ -0,0 +1,93 @@
+import json
+import pytest
+
+from weather_app.services.database_statistics_handler import DatabaseStatisticsHandler
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+from weather_app.tests.conftest import as_json
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("thresholds", [(20, 0), (None, None)])
+def test_temperature_statistics_match_pandas(seeded_model_handler, thresholds):
+    expected = MeteoApiHandler([]).calculate_temperature_statistics(
+        seeded_model_handler.get_weather_data_by_locality("Madrid", "2024-02-21", "2024-03-05"), *thresholds)
+    result = NumpyStatisticsHandler([]).calculate_temperature_statistics(
+        seeded_model_handler.get_hourly_series("Madrid", "2024-02-21", "2024-03-05"), *thresholds)
+
+    assert as_json(result) == as_json(expected)
+
+
+@pytest.mark.django_db
+def test_precipitation_statistics_match_pandas(seeded_model_handler):
+    expected = MeteoApiHandler([]).calculate_precipitation_statistics(
+        seeded_model_handler.get_weather_data_by_locality("Bilbao", "2024-02-21T05:00", "2024-03-05T17:00"))
+    result = NumpyStatisticsHandler([]).calculate_precipitation_statistics(
+        seeded_model_handler.get_hourly_series("Bilbao", "2024-02-21T05:00", "2024-03-05T17:00"))
+
+    assert as_json(result) == as_json(expected)
+
+
+@pytest.mark.django_db
+def test_general_statistics_match_pandas(seeded_model_handler):
+    expected = MeteoApiHandler([]).calculate_general_statistics(seeded_model_handler.get_all_weather_data(), 0, 20)
+    result = NumpyStatisticsHandler([]).calculate_general_statistics(seeded_model_handler.get_hourly_series(), 0, 20)
+
+    assert list(result) == ["Madrid", "Bilbao", "Sevilla"]
+    assert as_json(result) == as_json(expected)
+
+
+@pytest.mark.django_db
+def test_general_statistics_empty():
+    assert NumpyStatisticsHandler([]).calculate_general_statistics(ModelHandler([]).get_hourly_series(), 0, 20) == {}
+
+
+@pytest.mark.django_db
+def test_statistics_by_location_match_single_locations(seeded_model_handler):
+    localities = ["Madrid", "Bilbao", "Sevilla"]
+    handler = NumpyStatisticsHandler([])
+    series = seeded_model_handler.get_hourly_series(None, "2024-02-21", "2024-03-05", localities=localities)
+    temperature = handler.calculate_temperature_statistics_by_location(series, 20, 0)
+    precipitation = handler.calculate_precipitation_statistics_by_location(series)
+    pandas_temperature = MeteoApiHandler([]).calculate_temperature_statistics_by_location(
+        seeded_model_handler.get_weather_data_by_localities(localities, "2024-02-21", "2024-03-05"), 20, 0)
+
+    assert len(temperature) == len(precipitation) == 3
+    for locality in localities:
+        location_id = seeded_model_handler.get_location(locality).id
+        single = seeded_model_handler.get_hourly_series(locality, "2024-02-21", "2024-03-05")
+        assert as_json(temperature[location_id]) == as_json(handler.calculate_temperature_statistics(single, 20, 0))
+        assert as_json(precipitation[location_id]) == as_json(handler.calculate_precipitation_statistics(single))
+        assert as_json(temperature[location_id]) == as_json(pandas_temperature[location_id])
+
+
+def rounded(points):
+    return json.loads(json.dumps(points), parse_float=lambda value: round(float(value), 9))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("bucket", ["hour", "day", "week", "month", "quarter", "year"])
+def test_timeseries_match_database(seeded_model_handler, bucket):
+    aggregates = ["mean", "min", "max", "sum", "count"]
+    variables = ["temperature", "precipitation"]
+    expected = DatabaseStatisticsHandler([]).calculate_timeseries(
+        seeded_model_handler.get_weather_data_by_locality("Sevilla", "2024-02-21T05:00", "2024-03-05"),
+        bucket, aggregates, variables)
+    result = NumpyStatisticsHandler([]).calculate_timeseries(
+        seeded_model_handler.get_hourly_series("Sevilla", "2024-02-21T05:00", "2024-03-05"), bucket, aggregates, variables)
+
+    assert rounded(result) == rounded(expected)
+    if bucket == "week":
+        assert [point["start"] for point in result] == ["2024-02-19T00:00+00:00", "2024-02-26T00:00+00:00",
+                                                         "2024-03-04T00:00+00:00"]
+
+
+@pytest.mark.django_db
+def test_daily_timeseries_match_average_by_day(seeded_model_handler):
+    handler = NumpyStatisticsHandler([])
+    series = seeded_model_handler.get_hourly_series("Madrid", "2024-02-21", "2024-03-05")
+    points = handler.calculate_timeseries(series, "day", ["mean"], ["temperature"])
+    average_by_day = handler.calculate_temperature_statistics(series, 20, 0)["temperature"]["average_by_day"]
+
+    assert {point["start"][:10]: round(point["temperature"]["mean"], 2) for point in points} == average_by_day
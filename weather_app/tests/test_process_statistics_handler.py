@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from multiprocessing.shared_memory import SharedMemory
+from unittest.mock import patch
+
+from weather_app.services import executors, process_statistics_handler
+from weather_app.services.columnar_storage import HourlySeries
+from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+from weather_app.services.process_statistics_handler import ProcessStatisticsHandler
+from weather_app.tests.conftest import as_json
+
+
+@pytest.fixture
+def process_pool(settings):
+    settings.WEATHER_STATISTICS_PROCESSES = 2
+    yield
+    pool = executors.get_process_pool()
+    if pool is not None:
+        executors.discard_process_pool(pool)
+
+
+def test_partitions_keep_locations_whole():
+    location_ids = np.repeat(np.array([1, 2, 3, 4], dtype=np.int64), [100, 150, 50, 100])
+    series = HourlySeries(location_ids, np.arange(400, dtype=np.int64), np.zeros(400), np.zeros(400))
+    handler = ProcessStatisticsHandler([], min_rows=1)
+
+    assert handler.partitions(series, 2) == [(0, 250), (250, 400)]
+    assert handler.partitions(series, 8) == [(0, 100), (100, 250), (250, 300), (300, 400)]
+    assert handler.partitions(series, 1) == [(0, 400)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("seeded_model_handler", [7, 11], indirect=True)
+def test_process_statistics_match_numpy(seeded_model_handler, process_pool):
+    localities = ["Madrid", "Bilbao", "Sevilla"]
+    series = seeded_model_handler.get_hourly_series()
+    madrid = seeded_model_handler.get_hourly_series("Madrid", "2024-02-21", "2024-03-05")
+    handler = ProcessStatisticsHandler([], min_rows=1)
+    numpy_handler = NumpyStatisticsHandler([])
+    shared = list()
+    share_series = process_statistics_handler.share_series
+
+    def record_share(weather_data):
+        memory = share_series(weather_data)
+        shared.append(memory.name)
+        return memory
+
+    with patch.object(process_statistics_handler, "share_series", side_effect=record_share):
+        general = handler.calculate_general_statistics(series, 0, 20)
+        by_location = handler.calculate_temperature_statistics_by_location(series, 20, 0)
+        temperature = handler.calculate_temperature_statistics(madrid, 20, 0)
+        timeseries = handler.calculate_timeseries(madrid, "week", ["mean", "sum"], ["temperature", "precipitation"])
+
+    assert list(general) == localities
+    assert as_json(general) == as_json(numpy_handler.calculate_general_statistics(series, 0, 20))
+    assert as_json(by_location) == as_json(numpy_handler.calculate_temperature_statistics_by_location(series, 20, 0))
+    assert as_json(temperature) == as_json(numpy_handler.calculate_temperature_statistics(madrid, 20, 0))
+    assert timeseries == numpy_handler.calculate_timeseries(madrid, "week", ["mean", "sum"],
+                                                            ["temperature", "precipitation"])
+    # every request shares its arrays once and releases them
+    assert len(shared) == 4
+    for name in shared:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+
+@pytest.mark.django_db
+def test_small_series_stay_in_the_thread(seeded_model_handler, settings):
+    settings.WEATHER_STATISTICS_PROCESSES = 2
+    madrid = seeded_model_handler.get_hourly_series("Madrid", "2024-02-21", "2024-03-05")
+
+    with patch.object(process_statistics_handler, "get_process_pool") as get_process_pool:
+        statistics = ProcessStatisticsHandler([], min_rows=len(madrid) + 1).calculate_precipitation_statistics(madrid)
+
+    get_process_pool.assert_not_called()
+    assert statistics == NumpyStatisticsHandler([]).calculate_precipitation_statistics(madrid)
@@ -0,0 +1,96 @@
+import re
+import pytest
+from django.db import connection
+from django.db.models import Avg
+from django.db.models.functions import TruncDate
+
+from weather_app.models import BackfillJob, DailyWeatherSummary, HourlyWeatherData
+from weather_app.services.backfill_handler import BackfillHandler
+from weather_app.services.database_statistics_handler import DatabaseStatisticsHandler
+from weather_app.services.model_handler import ModelHandler
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != 'sqlite', reason='the asserted plans are the sqlite EXPLAIN QUERY PLAN')
+]
+
+COVERING = 'USING COVERING INDEX hourly_location_date_cover (location_id=? AND date>? AND date<?)'
+
+
+def assert_no_full_scan(plan, table):
+    assert not re.search(rf'\bSCAN {table}\b', plan), plan
+
+
+@pytest.fixture
+def model_handler():
+    return ModelHandler([])
+
+
+def test_statistics_rows_read_from_covering_index(model_handler):
+    weather_data = model_handler.get_weather_data_by_locality("Madrid", "2025-10-01", "2025-10-31")
+
+    for queryset in (weather_data,
+                     weather_data.order_by('-temperature', 'id').values('temperature', 'date'),
+                     weather_data.annotate(day=TruncDate('date')).values('day').annotate(average=Avg('temperature'))):
+        plan = queryset.explain()
+        assert COVERING in plan
+        assert_no_full_scan(plan, 'weather_app_hourlyweatherdata')
+
+
+def test_locality_resolved_without_join(model_handler):
+    plan = model_handler.get_weather_data_by_locality("Madrid", "2025-10-01", "2025-10-31").explain()
+
+    assert 'SCALAR SUBQUERY' in plan
+    assert 'sqlite_autoindex_weather_app_location_1 (locality=?)' in plan
+    assert_no_full_scan(plan, 'weather_app_location')
+
+
+def test_daily_summaries_range_uses_unique_index():
+    plan = (DailyWeatherSummary.objects
+            .filter(location_id=ModelHandler.location_id_subquery("Madrid"), day__range=("2025-10-01", "2025-10-31"))
+            .explain())
+
+    assert 'sqlite_autoindex_weather_app_dailyweathersummary_1 (location_id=? AND day>? AND day<?)' in plan
+    assert_no_full_scan(plan, 'weather_app_dailyweathersummary')
+
+
+def test_ingestion_range_reads_use_index(model_handler):
+    plan = (HourlyWeatherData.objects
+            .filter(location_id=1, date__range=model_handler.day_bounds(*map(model_handler.parse_day,
+                                                                             ("2025-10-01", "2025-10-31"))))
+            .only('id', 'date', 'temperature', 'precipitation')
+            .explain())
+
+    assert COVERING in plan
+
+
+def test_backfill_claim_uses_status_index():
+    plan = BackfillJob.objects.filter(BackfillHandler.claimable()).order_by('id').values('id').explain()
+
+    assert 'backfill_job_status_idx' in plan
+    assert_no_full_scan(plan, 'weather_app_backfilljob')
+
+
+def test_database_backend_queries_use_covering_index(model_handler):
+    location = model_handler.insert_location("Madrid", 40.4168, -3.7038)
+    model_handler.insert_hourly_weather_data_bulk([20.0] * 24, [0.5] * 24,
+                                                  [f"2025-10-01T{hour:02d}:00" for hour in range(24)], location)
+    weather_data = model_handler.get_weather_data_by_locality("Madrid", "2025-10-01", "2025-10-01")
+    handler = DatabaseStatisticsHandler([])
+    queries = list()
+
+    def capture(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        handler.calculate_temperature_statistics(weather_data, threshold_high=30, threshold_low=0)
+        handler.calculate_precipitation_statistics(weather_data)
+
+    assert queries
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+            assert 'hourly_location_date_cover' in plan
+            assert_no_full_scan(plan, 'weather_app_hourlyweatherdata')
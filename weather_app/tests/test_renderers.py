@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import pytest
+from datetime import date, datetime, timezone
+from unittest.mock import patch
+
+from rest_framework.renderers import JSONRenderer
+
+from weather_app import renderers
+from weather_app.renderers import FastJSONRenderer, ColumnarJSONRenderer, CSVRenderer
+from weather_app.serializers import HourlyWeatherDataSerializer, hourly_weather_data_rows
+from weather_app.services.model_handler import ModelHandler
+
+RESPONSE = {
+    'message': ['batch 1: 1 rows conflict with unique_location_date'],
+    'status': 200,
+    'result_data': {
+        'points': [
+            {'start': '2025-10-01T00:00+00:00', 'temperature': {'mean': np.float64(5.75), 'count': np.int64(24)}},
+            {'start': '2025-10-02T00:00+00:00', 'temperature': {'mean': None, 'count': 0}}
+        ],
+        'day': date(2025, 10, 1),
+        'date_time': datetime(2025, 10, 1, 12, tzinfo=timezone.utc),
+        'by_location': {7: [1.5, 2.25]}
+    }
+}
+
+
+def test_fast_json_matches_json_renderer():
+    expected = json.loads(JSONRenderer().render(RESPONSE))
+
+    assert json.loads(FastJSONRenderer().render(RESPONSE)) == expected
+    with patch.object(renderers, "orjson", None):
+        assert json.loads(FastJSONRenderer().render(RESPONSE)) == expected
+
+
+def test_columnar_json():
+    result_data = json.loads(ColumnarJSONRenderer().render(RESPONSE))['result_data']
+
+    assert result_data['points'] == {'start': ['2025-10-01T00:00+00:00', '2025-10-02T00:00+00:00'],
+                                     'temperature': {'mean': [5.75, None], 'count': [24, 0]}}
+    assert result_data['by_location'] == {'7': [1.5, 2.25]}
+
+
+def test_csv():
+    assert CSVRenderer().render(RESPONSE).decode().splitlines() == [
+        'start,temperature.mean,temperature.count',
+        '2025-10-01T00:00+00:00,5.75,24',
+        '2025-10-02T00:00+00:00,,0'
+    ]
+    tables = {'result_data': {'inserted': [{'id': 1}], 'updated': [{'id': 2}]}}
+    assert CSVRenderer().render(tables).decode().splitlines() == ['table,id', 'inserted,1', 'updated,2']
+    error = {'message': ['error : city_name is null'], 'status': 400, 'result_data': None}
+    assert CSVRenderer().render(error).decode().splitlines() == ['message', 'error : city_name is null']
+
+
+@pytest.mark.django_db
+def test_hourly_weather_data_rows_match_serializer():
+    model_handler = ModelHandler([])
+    location = model_handler.insert_location("Madrid", 40.4168, -3.7038)
+    records = model_handler.insert_hourly_weather_data_bulk([20.5, 21.0], [None, 0.25],
+                                                            ["2025-10-01T00:00", "2025-10-01T01:00"], location)
+
+    assert hourly_weather_data_rows(records) == HourlyWeatherDataSerializer(records, many=True).data
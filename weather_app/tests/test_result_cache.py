@@ -0,0 +1,112 @@
+import pytest
+
+from weather_app.services.result_cache import (ResultCache, LocalMemoryCacheBackend, FileCacheBackend,
+                                               DjangoCacheBackend, build_result_cache)
+
+
+START = "2025-10-01T00:00:00+00:00"
+END = "2025-10-03T23:59:59.999999+00:00"
+
+
+@pytest.fixture(params=["local", "file", "django"])
+def cache(request, tmp_path, settings):
+    if request.param == "local":
+        return ResultCache(LocalMemoryCacheBackend(max_entries=100))
+    if request.param == "file":
+        return ResultCache(FileCacheBackend(str(tmp_path), max_entries=100))
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                   "LOCATION": "test-results"}}
+    return ResultCache(DjangoCacheBackend("default"))
+
+
+@pytest.mark.django_db
+def test_get_and_set(cache):
+    parameters = {"city_name": "Madrid", "start": START, "end": END}
+    version = cache.version("Madrid", START, END)
+
+    assert cache.get("precipitation", parameters, version) is None
+    cache.set("precipitation", parameters, {"total": 1.5}, version)
+
+    assert cache.get("precipitation", dict(reversed(parameters.items())), version) == {"total": 1.5}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.django_db
+def test_invalidate_overlapping_years_only(cache):
+    october = {"city_name": "Madrid", "start": START, "end": END}
+    last_year = {"city_name": "Madrid", "start": "2024-11-01T00:00:00+00:00", "end": "2024-11-02T00:00:00+00:00"}
+    bilbao = {"city_name": "Bilbao", "start": START, "end": END}
+    versions = {"october": cache.version("Madrid", START, END),
+                "last_year": cache.version("Madrid", last_year["start"], last_year["end"]),
+                "bilbao": cache.version("Bilbao", START, END), "all": cache.version()}
+    cache.set("precipitation", october, 1, versions["october"])
+    cache.set("precipitation", last_year, 2, versions["last_year"])
+    cache.set("precipitation", bilbao, 3, versions["bilbao"])
+    cache.set("general_statistics", {}, 4, versions["all"])
+
+    cache.invalidate("Madrid", "2025-10-03T00:00:00+00:00", "2025-10-03T23:59:59.999999+00:00")
+
+    assert cache.version("Madrid", START, END) != versions["october"]
+    assert cache.get("precipitation", october, cache.version("Madrid", START, END)) is None
+    assert cache.get("precipitation", last_year, cache.version("Madrid", last_year["start"], last_year["end"])) == 2
+    assert cache.get("precipitation", bilbao, cache.version("Bilbao", START, END)) == 3
+    assert cache.get("general_statistics", {}, cache.version()) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_versions_are_shared_by_every_process():
+    # two caches stand for two processes, the invalidation of one outdates the results of the other
+    writer = ResultCache(LocalMemoryCacheBackend(max_entries=10))
+    reader = ResultCache(LocalMemoryCacheBackend(max_entries=10))
+    parameters = {"city_name": "Madrid", "start": START, "end": END}
+    reader.set("precipitation", parameters, 1, reader.version("Madrid", START, END))
+
+    writer.invalidate("Madrid", START, END)
+
+    assert reader.get("precipitation", parameters, reader.version("Madrid", START, END)) is None
+
+
+def test_keys_are_hashed():
+    key = ResultCache.make_key("temperature", {"city_names": ["A very long name"] * 40}, 3)
+
+    assert key.startswith("weather_result:temperature:3:")
+    assert len(key) < 100 and " " not in key
+
+
+def test_local_memory_backend_copies_values():
+    backend = LocalMemoryCacheBackend(max_entries=2)
+    value = {"points": [1, 2]}
+    backend.set("a", value)
+    value["points"].append(3)
+    backend.get("a")["points"].append(4)
+
+    assert backend.get("a") == {"points": [1, 2]}
+
+
+def test_local_memory_backend_lru():
+    backend = LocalMemoryCacheBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+
+    assert backend.get("a") == 1
+    assert backend.get("b") is None
+
+
+def test_file_backend_is_bounded(tmp_path):
+    backend = FileCacheBackend(str(tmp_path), max_entries=2)
+    for key in ("a", "b", "c"):
+        backend.set(key, {"key": key})
+
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert backend.get("c") == {"key": "c"}
+
+
+def test_build_result_cache_disabled():
+    cache = build_result_cache({"BACKEND": None})
+    cache.set("precipitation", {}, 1, cache.version())
+
+    assert cache.version() is None
+    assert cache.get("precipitation", {}, None) is None
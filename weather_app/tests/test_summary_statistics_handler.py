@@ -0,0 +1,110 @@
+import json
+import pytest
+from datetime import date, datetime, timezone
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from weather_app.models import DailyWeatherSummary, HourlyWeatherData
+from weather_app.services.meteo_api_handler import MeteoApiHandler
+from weather_app.services.model_handler import ModelHandler
+from weather_app.services.summary_statistics_handler import SummaryStatisticsHandler
+
+
+@pytest.fixture
+def model_handler():
+    return ModelHandler([])
+
+
+@pytest.fixture
+def location(model_handler):
+    location = model_handler.insert_location("Madrid", 40.4168, -3.7038)
+    times = [f"2025-10-0{day}T{hour:02d}:00" for day in (1, 2, 3) for hour in range(24)]
+    temperatures = [10.0 + (i * 7 % 24) * 0.75 for i in range(len(times))]
+    precipitations = [0.0 if time[9] == "2" else (i % 5) * 0.25 for i, time in enumerate(times)]
+    model_handler.insert_hourly_weather_data_bulk(temperatures, precipitations, times, location)
+    return location
+
+
+@pytest.mark.django_db
+def test_ingestion_maintains_daily_summaries(model_handler, location):
+    summaries = list(DailyWeatherSummary.objects.filter(location=location).order_by("day"))
+
+    assert [summary.day for summary in summaries] == [date(2025, 10, 1), date(2025, 10, 2), date(2025, 10, 3)]
+    assert all(summary.hours == 24 for summary in summaries)
+    assert summaries[1].precipitation_sum == 0.0
+
+    model_handler.upsert_hourly_weather_data([50.0], [4.0], ["2025-10-02T05:00"], location, update_changed=True)
+
+    summary = DailyWeatherSummary.objects.get(location=location, day=date(2025, 10, 2))
+    assert summary.temperature_max == 50.0
+    assert summary.temperature_max_date == datetime(2025, 10, 2, 5, tzinfo=timezone.utc)
+    assert summary.precipitation_sum == 4.0
+
+
+@pytest.mark.django_db
+def test_statistics_match_pandas(model_handler, location):
+    handler = SummaryStatisticsHandler([])
+    daily_summaries = handler.get_daily_summaries("Madrid", date(2025, 10, 1), date(2025, 10, 3))
+    weather_data = model_handler.get_weather_data_by_locality("Madrid", "2025-10-01", "2025-10-03")
+    pandas_handler = MeteoApiHandler([])
+
+    assert json.dumps(handler.calculate_temperature_statistics(daily_summaries, "Madrid", 20, 12)) == \
+        json.dumps(pandas_handler.calculate_temperature_statistics(weather_data, 20, 12))
+    assert json.dumps(handler.calculate_precipitation_statistics(daily_summaries)) == \
+        json.dumps(pandas_handler.calculate_precipitation_statistics(weather_data))
+
+
+@pytest.mark.django_db
+def test_null_thresholds_match_pandas(model_handler, location):
+    handler = SummaryStatisticsHandler([])
+    daily_summaries = handler.get_daily_summaries("Madrid", date(2025, 10, 1), date(2025, 10, 3))
+    weather_data = model_handler.get_weather_data_by_locality("Madrid", "2025-10-01", "2025-10-03")
+
+    result = handler.calculate_temperature_statistics(daily_summaries, "Madrid", None, None)
+
+    assert json.dumps(result) == \
+        json.dumps(MeteoApiHandler([]).calculate_temperature_statistics(weather_data, None, None))
+    assert (result["temperature"]["hours_above_threshold"], result["temperature"]["hours_below_threshold"]) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_incomplete_rollup_is_not_used(location):
+    HourlyWeatherData.objects.create(temperature=1.0, precipitation=0.0, location=location,
+                                     date=datetime(2025, 10, 4, 0, tzinfo=timezone.utc))
+
+    handler = SummaryStatisticsHandler([])
+
+    # the record saved outside ModelHandler marks the rollup of the location incomplete, no hourly count needed
+    with CaptureQueriesContext(connection) as queries:
+        assert handler.get_daily_summaries("Madrid", date(2025, 10, 1), date(2025, 10, 4)) is None
+    assert handler.get_daily_summaries("Madrid", date(2025, 10, 1), date(2025, 10, 3)) is None
+    assert len(queries) == 1
+    assert "weather_app_hourlyweatherdata" not in queries[0]["sql"]
+
+
+@pytest.mark.django_db
+def test_days_without_precipitation_values(model_handler):
+    location = model_handler.insert_location("Lugo", 43.0097, -7.5568)
+    times = [f"2025-10-01T{hour:02d}:00" for hour in range(24)]
+    model_handler.insert_hourly_weather_data_bulk([12.5] * 24, [None] * 24, times, location)
+    handler = SummaryStatisticsHandler([])
+
+    statistics = handler.calculate_precipitation_statistics(
+        handler.get_daily_summaries("Lugo", date(2025, 10, 1), date(2025, 10, 1)))
+
+    assert statistics["precipitation"]["max"] is None
+    assert statistics["precipitation"]["average"] is None
+    assert statistics["precipitation"]["total"] == 0.0
+
+
+@pytest.mark.django_db
+def test_rebuild_daily_summaries_command(location):
+    DailyWeatherSummary.objects.all().delete()
+    HourlyWeatherData.objects.create(temperature=1.0, precipitation=0.0, location=location,
+                                     date=datetime(2025, 10, 4, 0, tzinfo=timezone.utc))
+
+    call_command("rebuild_daily_summaries", "--days", "2")
+
+    assert DailyWeatherSummary.objects.filter(location=location).count() == 4
+    assert SummaryStatisticsHandler([]).get_daily_summaries("Madrid", date(2025, 10, 1), date(2025, 10, 4))
@@ -1,7 +1,15 @@
-from django.test import TestCase, Client
-from datetime import datetime
-from weather_app.models import Location, HourlyWeatherData
+from django.db import connection
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from datetime import datetime, timezone
+from weather_app.benchmarks.stub_upstream import StubUpstream, fake_coordinates
+from weather_app.models import BackfillJob, Location, HourlyWeatherData
+from weather_app.services.geocoding_cache import geocoding_cache
+from weather_app.services.model_handler import ModelHandler
+from weather_app.services.result_cache import result_cache
+from weather_app.services.summary_statistics_handler import SummaryStatisticsHandler
 import json
+from unittest.mock import patch
 
 class WeatherAppViewsTests(TestCase):
     def setUp(self):
@@ -26,3 +34,398 @@ class WeatherAppViewsTests(TestCase):
                 "city_name": "Madrid", "threshold_high": 30, "threshold_low": 0}
         response = self.client.get(url, data, format='json')
         self.assertEqual(response.status_code, 200)
+
+
+class WeatherAppStreamTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = r"http://localhost:8000/weather_app/weather_data/"
+        self.upstream = StubUpstream().start()
+        self.addCleanup(self.upstream.stop)
+
+    def test_weather_data_post_stream(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Sevilla", "stream": True}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url):
+            response = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+
+        result_data = response.json()["result_data"]
+        self.assertEqual(result_data["inserted_hours"], 48)
+        self.assertNotIn("hourly_weather_data", result_data)
+
+    def test_weather_data_post_stream_upstream_error(self):
+        latitude, longitude = fake_coordinates("Sevilla")
+        geocoding_cache.set("Sevilla", {"lat": latitude, "lon": longitude})
+        self.addCleanup(geocoding_cache.clear)
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Sevilla", "stream": True}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url):
+            self.upstream.fail(400)
+            failed = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+            retried = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+
+        self.assertEqual(failed.status_code, 200)
+        self.assertIsNone(failed.json()["result_data"])
+        self.assertIn("error : archive window 2025-10-01 - 2025-10-02 failed: Archive API error: injected failure",
+                      failed.json()["message"])
+        self.assertEqual(retried.json()["result_data"]["inserted_hours"], 48)
+
+
+class WeatherAppUpsertTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = r"http://localhost:8000/weather_app/weather_data/"
+        coordinates = patch("weather_app.views.MeteoApiHandler.get_coordinates",
+                            return_value={"lat": 40.4168, "lon": -3.7038})
+        hourly = patch("weather_app.views.MeteoApiHandler.get_hourly_weather_data",
+                       return_value=([20.0, 21.0], [0.0, 0.4], ["2025-10-01T00:00", "2025-10-01T01:00"]))
+        coordinates.start()
+        hourly.start()
+        self.addCleanup(patch.stopall)
+
+    def post(self, **extra):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Madrid", **extra}
+        return self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+
+    def test_insert_mode_fails_for_existing_city(self):
+        self.post()
+        response = self.post()
+        self.assertIsNone(response.json()["result_data"])
+        self.assertEqual(HourlyWeatherData.objects.count(), 2)
+
+    def test_upsert_mode_reuses_location(self):
+        self.post()
+        response = self.post(mode="upsert", update_changed=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["result_data"]["hourly_weather_data"], [])
+        self.assertEqual(Location.objects.count(), 1)
+        self.assertEqual(HourlyWeatherData.objects.count(), 2)
+
+    def test_invalid_mode(self):
+        response = self.post(mode="replace")
+        self.assertEqual(response.status_code, 400)
+
+    def test_flags_must_be_booleans(self):
+        for flag, value in (("update_changed", "false"), ("stream", 1), ("background", "true"), ("stream", None)):
+            response = self.post(mode="upsert", **{flag: value})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(f"error : {flag} must be true or false", response.json()["message"])
+        self.assertFalse(Location.objects.exists())
+
+
+class WeatherAppBatchTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = r"http://localhost:8000/weather_app/weather_data/batch/"
+        self.upstream = StubUpstream().start()
+        self.addCleanup(self.upstream.stop)
+
+    def test_weather_data_batch_post(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_names": ["Sevilla", "Granada"]}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url):
+            response = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        cities = response.json()["result_data"]["cities"]
+        self.assertEqual([city["status"] for city in cities], ["ok", "ok"])
+        self.assertEqual(HourlyWeatherData.objects.count(), 48)
+
+    def test_weather_data_batch_post_update_changed_must_be_boolean(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_names": ["Sevilla"], "update_changed": 1}
+        response = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_weather_data_batch_post_invalid_city_names(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_names": "Sevilla"}
+        response = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_weather_data_post_counts_response(self):
+        url = r"http://localhost:8000/weather_app/weather_data/"
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Sevilla",
+                "response_format": "counts"}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url):
+            response = self.client.post(url, data=json.dumps(data), content_type="application/json")
+
+        self.assertEqual(response.json()["result_data"]["inserted_hours"], 24)
+
+    def test_weather_data_post_without_hours_leaves_no_location(self):
+        url = r"http://localhost:8000/weather_app/weather_data/"
+        latitude, longitude = fake_coordinates("Sevilla")
+        geocoding_cache.set("Sevilla", {"lat": latitude, "lon": longitude})
+        self.addCleanup(geocoding_cache.clear)
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Sevilla"}
+        reversed_data = {**data, "start_date": "2025-10-02"}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url, OPEN_METEO_ARCHIVE_CHUNK_RETRIES=0):
+            self.upstream.fail(400)
+            failed = self.client.post(url, data=json.dumps(data), content_type="application/json")
+            reversed_range = self.client.post(url, data=json.dumps(reversed_data), content_type="application/json")
+            self.assertFalse(Location.objects.exists())
+            retried = self.client.post(url, data=json.dumps(data), content_type="application/json")
+
+        self.assertIsNone(failed.json()["result_data"])
+        self.assertIn("error : No hourly weather data for Sevilla", failed.json()["message"])
+        self.assertIn("error : No hourly weather data for Sevilla", reversed_range.json()["message"])
+        self.assertEqual(len(retried.json()["result_data"]["hourly_weather_data"]), 24)
+
+
+class WeatherAppBackfillJobTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = r"http://localhost:8000/weather_app/weather_data/"
+
+    def test_weather_data_post_background(self):
+        data = {"start_date": "2020-01-01", "end_date": "2024-12-31", "city_name": "Sevilla", "mode": "upsert",
+                "background": True}
+        response = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+
+        self.assertEqual(response.status_code, 202)
+        job = response.json()["result_data"]["job"]
+        self.assertEqual((job["status"], job["next_date"], job["mode"]), ("pending", "2020-01-01", "upsert"))
+        self.assertFalse(HourlyWeatherData.objects.exists())
+
+        response = self.client.get(f"{self.url}jobs/{job['id']}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["result_data"]["job"]["city_name"], "Sevilla")
+
+    def test_weather_data_post_background_invalid_parameters(self):
+        for data in ({"start_date": "2020-01-01", "end_date": "2024-12-31", "background": True},
+                     {"start_date": "2020-01-01", "end_date": None, "city_name": "Sevilla", "background": True},
+                     {"start_date": "2024-12-31", "end_date": "2020-01-01", "city_name": "Sevilla", "background": True}):
+            response = self.client.post(self.url, data=json.dumps(data), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(BackfillJob.objects.exists())
+
+    def test_backfill_job_not_found(self):
+        response = self.client.get(f"{self.url}jobs/999/")
+        self.assertEqual(response.status_code, 404)
+
+
+class WeatherAppAsyncTests(TransactionTestCase):
+    # the ORM work of the async views runs in executor threads, they only see committed rows
+    def setUp(self):
+        self.client = AsyncClient()
+        self.upstream = StubUpstream(latency=0.05).start()
+        self.addCleanup(self.upstream.stop)
+        geocoding_cache.clear()
+        result_cache.clear()
+
+    async def test_async_post_and_statistics(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Sevilla", "mode": "upsert"}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url,
+                           WEATHER_INSTRUMENTATION={'SAMPLE_RATE': 1.0, 'LOG': False}):
+            response = await self.client.post(r"http://localhost:8000/weather_app/async/weather_data/",
+                                              data=json.dumps(data), content_type="application/json")
+        statistics = await self.client.generic(
+            "GET", r"http://localhost:8000/weather_app/async/precipitation/",
+            json.dumps({"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Sevilla"}),
+            content_type="application/json")
+        sync_statistics = await self.client.generic(
+            "GET", r"http://localhost:8000/weather_app/precipitation/",
+            json.dumps({"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Sevilla"}),
+            content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["result_data"]["hourly_weather_data"]), 48)
+        self.assertEqual(response.json()["result_data"]["updated_hourly_weather_data"], [])
+        self.assertEqual(await HourlyWeatherData.objects.acount(), 48)
+        # the phases of the executor threads and of the event loop are recorded in the request profile
+        self.assertEqual({metric.split(";")[0] for metric in response["Server-Timing"].split(", ")},
+                         {"upstream", "db", "serialize", "total"})
+        self.assertEqual(statistics.status_code, 200)
+        self.assertEqual(statistics.json()["result_data"], sync_statistics.json()["result_data"])
+
+    async def test_async_post_unknown_city(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Unknown"}
+        with self.settings(OPEN_METEO_GEOCODING_URL=self.upstream.geocoding_url,
+                           OPEN_METEO_ARCHIVE_URL=self.upstream.archive_url):
+            response = await self.client.post(r"http://localhost:8000/weather_app/async/weather_data/",
+                                              data=json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["result_data"])
+        self.assertIn("No coordinates for city name", response.json()["message"])
+
+    async def test_async_post_invalid_mode(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Sevilla", "mode": "merge"}
+        response = await self.client.post(r"http://localhost:8000/weather_app/async/weather_data/",
+                                          data=json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_post_flags_must_be_booleans(self):
+        for flag, value in (("update_changed", "yes"), ("stream", 0), ("background", "")):
+            data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Sevilla", flag: value}
+            response = await self.client.post(r"http://localhost:8000/weather_app/async/weather_data/",
+                                              data=json.dumps(data), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(f"error : {flag} must be true or false", response.json()["message"])
+
+
+class WeatherAppStatisticsBackendTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        location = Location.objects.create(locality="Madrid", lat=40.4168, long=-3.7038)
+        for hour, (temperature, precipitation) in enumerate([(20.5, 0.0), (25.0, 0.25), (18.75, 1.5)]):
+            HourlyWeatherData.objects.create(temperature=temperature, precipitation=precipitation,
+                                             date=datetime(2025, 10, 1, hour, tzinfo=timezone.utc),
+                                             location=location)
+
+    def get(self, url, **extra):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01T23:00", "city_name": "Madrid",
+                "threshold_high": 24, "threshold_low": 19, **extra}
+        return self.client.generic("GET", url, json.dumps(data), content_type="application/json")
+
+    def test_backends_return_identical_results(self):
+        for url in (r"http://localhost:8000/weather_app/temperature/",
+                    r"http://localhost:8000/weather_app/precipitation/"):
+            pandas_response = self.get(url, backend="pandas")
+            database_response = self.get(url, backend="database")
+            numpy_response = self.get(url, backend="numpy")
+            self.assertEqual(pandas_response.status_code, 200)
+            self.assertEqual(database_response.content, pandas_response.content)
+            self.assertEqual(numpy_response.content, pandas_response.content)
+
+    def test_invalid_backend(self):
+        response = self.get(r"http://localhost:8000/weather_app/temperature/", backend="spark")
+        self.assertEqual(response.status_code, 400)
+
+    def test_several_cities_share_one_scan(self):
+        location = Location.objects.create(locality="Bilbao", lat=43.2630, long=-2.9349)
+        for hour, (temperature, precipitation) in enumerate([(12.5, 2.0), (14.0, 0.0)]):
+            HourlyWeatherData.objects.create(temperature=temperature, precipitation=precipitation,
+                                             date=datetime(2025, 10, 1, hour, tzinfo=timezone.utc),
+                                             location=location)
+        for url in (r"http://localhost:8000/weather_app/temperature/",
+                    r"http://localhost:8000/weather_app/precipitation/"):
+            for backend in ("numpy", "pandas", "database"):
+                with CaptureQueriesContext(connection) as one_city:
+                    self.get(url, backend=backend, city_names=["Madrid"])
+                with CaptureQueriesContext(connection) as two_cities:
+                    response = self.get(url, backend=backend, city_names=["Bilbao", "Madrid", "Lugo"])
+                singles = {city_name: self.get(url, backend=backend, city_name=city_name).json()["result_data"]
+                           for city_name in ("Bilbao", "Madrid")}
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["result_data"], {**singles, "Lugo": None})
+                self.assertIn("error : No weather data for Lugo", response.json()["message"])
+                self.assertEqual(len(two_cities), len(one_city))
+
+    def test_invalid_city_names(self):
+        response = self.get(r"http://localhost:8000/weather_app/temperature/", city_names="Madrid")
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(response.json()["result_data"])
+
+    def test_whole_days_are_answered_from_daily_summaries(self):
+        model_handler = ModelHandler([])
+        location = model_handler.insert_location("Bilbao", 43.2630, -2.9349)
+        times = [f"2025-10-0{day}T{hour:02d}:00" for day in (1, 2) for hour in range(24)]
+        model_handler.insert_hourly_weather_data_bulk([hour % 24 * 1.25 for hour in range(48)], [0.5] * 48,
+                                                      times, location)
+        url = r"http://localhost:8000/weather_app/temperature/"
+
+        with patch("weather_app.views.SummaryStatisticsHandler.calculate_temperature_statistics",
+                   wraps=SummaryStatisticsHandler([]).calculate_temperature_statistics) as summary_statistics:
+            response = self.get(url, city_name="Bilbao", end_date="2025-10-02")
+        pandas_response = self.get(url, city_name="Bilbao", end_date="2025-10-02", backend="pandas")
+
+        self.assertEqual(summary_statistics.call_count, 1)
+        self.assertEqual(response.content, pandas_response.content)
+        self.assertEqual(len(response.json()["result_data"]["temperature"]["average_by_day"]), 2)
+
+
+class WeatherAppTimeseriesTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = r"http://localhost:8000/weather_app/timeseries/"
+        location = ModelHandler([]).insert_location("Madrid", 40.4168, -3.7038)
+        times = [f"2025-10-0{day}T{hour:02d}:00" for day in (1, 2) for hour in range(24)]
+        ModelHandler([]).insert_hourly_weather_data_bulk([hour * 0.5 for hour in range(48)], [0.25] * 48, times,
+                                                         location)
+        result_cache.clear()
+
+    def get(self, **extra):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Madrid", **extra}
+        return self.client.generic("GET", self.url, json.dumps(data), content_type="application/json")
+
+    def test_daily_buckets(self):
+        for backend in ("numpy", "database"):
+            response = self.get(aggregates=["mean", "max", "sum", "count"], backend=backend)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["result_data"], {
+                "bucket": "day",
+                "downsampled": False,
+                "points": [
+                    {"start": "2025-10-01T00:00+00:00",
+                     "temperature": {"mean": 5.75, "max": 11.5, "sum": 138.0, "count": 24},
+                     "precipitation": {"mean": 0.25, "max": 0.25, "sum": 6.0, "count": 24}},
+                    {"start": "2025-10-02T00:00+00:00",
+                     "temperature": {"mean": 17.75, "max": 23.5, "sum": 426.0, "count": 24},
+                     "precipitation": {"mean": 0.25, "max": 0.25, "sum": 6.0, "count": 24}}
+                ]
+            })
+
+    def test_long_ranges_are_downsampled(self):
+        response = self.get(bucket="hour", start_date="2024-01-01", max_points=50, variables=["temperature"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["result_data"]["bucket"], "month")
+        self.assertTrue(response.json()["result_data"]["downsampled"])
+        self.assertEqual(response.json()["result_data"]["points"],
+                         [{"start": "2025-10-01T00:00+00:00", "temperature": {"mean": 11.75}}])
+
+    def test_response_formats(self):
+        data = json.dumps({"start_date": "2025-10-01", "end_date": "2025-10-02", "city_name": "Madrid",
+                           "variables": ["temperature"]})
+        columnar = self.client.generic("GET", self.url + "?format=columnar", data, content_type="application/json")
+        csv = self.client.generic("GET", self.url, data, content_type="application/json", HTTP_ACCEPT="text/csv")
+
+        self.assertEqual(columnar.json()["result_data"]["points"],
+                         {"start": ["2025-10-01T00:00+00:00", "2025-10-02T00:00+00:00"],
+                          "temperature": {"mean": [5.75, 17.75]}})
+        self.assertEqual(csv["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(csv.content.decode().splitlines()[1:], ["2025-10-01T00:00+00:00,5.75",
+                                                                 "2025-10-02T00:00+00:00,17.75"])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get(bucket="minute").status_code, 400)
+        self.assertEqual(self.get(aggregates=["median"]).status_code, 400)
+        self.assertEqual(self.get(variables="temperature").status_code, 400)
+        self.assertEqual(self.get(max_points=0).status_code, 400)
+
+
+class WeatherAppResultCacheTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = r"http://localhost:8000/weather_app/precipitation/"
+        self.model_handler = ModelHandler([])
+        self.location = self.model_handler.insert_location("Madrid", 40.4168, -3.7038)
+        self.model_handler.insert_hourly_weather_data_bulk([20.0] * 24, [0.5] * 24,
+                                                           [f"2025-10-01T{hour:02d}:00" for hour in range(24)],
+                                                           self.location)
+        result_cache.clear()
+
+    def get(self):
+        data = {"start_date": "2025-10-01", "end_date": "2025-10-01", "city_name": "Madrid"}
+        return self.client.generic("GET", self.url, json.dumps(data), content_type="application/json")
+
+    def test_results_are_cached_until_ingestion(self):
+        first = self.get()
+        second = self.get()
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.json()["result_data"], second.json()["result_data"])
+
+        self.model_handler.upsert_hourly_weather_data([20.0], [5.0], ["2025-10-01T12:00"], self.location,
+                                                      update_changed=True)
+        third = self.get()
+        self.assertEqual(third["X-Cache"], "MISS")
+        self.assertEqual(third.json()["result_data"]["precipitation"]["total"], 16.5)
+
+    def test_cache_stats(self):
+        self.get()
+        self.get()
+        response = self.client.get(r"http://localhost:8000/weather_app/cache_stats/")
+        self.assertEqual(response.json()["result_data"]["hits"], 1)
+        self.assertEqual(response.json()["result_data"]["misses"], 1)
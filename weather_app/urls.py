@@ -1,11 +1,30 @@
 from django.urls import path
-from .views import WeatherController
+from .async_views import AsyncWeatherController
+from .views import WeatherController, metrics_view
 
 app_name = 'weather_app'
 urlpatterns = [
     path('weather_data/', WeatherController.as_view(), name='weather_data'),
+    path('weather_data/jobs/<int:job_id>/', WeatherController.as_view(), {'type': 'backfill_job'},
+         name='backfill_job'),
+    path('weather_data/batch/', WeatherController.as_view(), {'type': 'batch'}, name='weather_data_batch'),
     path('temperature/', WeatherController.as_view(), {'type': 'temperature'}, name='temperature'),
     path('precipitation/', WeatherController.as_view(), {'type': 'precipitation'}, name='precipitation'),
+    path('timeseries/', WeatherController.as_view(), {'type': 'timeseries'}, name='timeseries'),
     path('general_statistics/', WeatherController.as_view(), {'type': 'general_statistics'},
-         name='general_statistics')
+         name='general_statistics'),
+    path('cache_stats/', WeatherController.as_view(), {'type': 'cache_stats'}, name='cache_stats'),
+    path('metrics/', metrics_view, name='metrics'),
+    # the same endpoints for an ASGI server, the Open Meteo requests don't block a thread
+    path('async/weather_data/', AsyncWeatherController.as_view(), name='async_weather_data'),
+    path('async/weather_data/jobs/<int:job_id>/', AsyncWeatherController.as_view(), {'type': 'backfill_job'},
+         name='async_backfill_job'),
+    path('async/weather_data/batch/', AsyncWeatherController.as_view(), {'type': 'batch'},
+         name='async_weather_data_batch'),
+    path('async/temperature/', AsyncWeatherController.as_view(), {'type': 'temperature'}, name='async_temperature'),
+    path('async/precipitation/', AsyncWeatherController.as_view(), {'type': 'precipitation'},
+         name='async_precipitation'),
+    path('async/timeseries/', AsyncWeatherController.as_view(), {'type': 'timeseries'}, name='async_timeseries'),
+    path('async/general_statistics/', AsyncWeatherController.as_view(), {'type': 'general_statistics'},
+         name='async_general_statistics')
 ]
@@ -1,20 +1,42 @@
 
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from weather_app.models import BackfillJob, Location
+from weather_app.services.backfill_handler import BackfillHandler
+from weather_app.services.database_statistics_handler import DatabaseStatisticsHandler
+from weather_app.services.geocoding_cache import geocoding_cache
+from weather_app.services.ingestion_handler import IngestionHandler, INGESTION_MODES
+from weather_app.services.instrumentation import metrics, phase
 from weather_app.services.meteo_api_handler import MeteoApiHandler
 from weather_app.services.model_handler import ModelHandler
-from weather_app.serializers import LocationSerializer, HourlyWeatherDataSerializer
+from weather_app.services.numpy_statistics_handler import NumpyStatisticsHandler
+from weather_app.services.process_statistics_handler import ProcessStatisticsHandler
+from weather_app.services.result_cache import result_cache
+from weather_app.services.summary_statistics_handler import SummaryStatisticsHandler
+from weather_app.services.time_buckets import AGGREGATES, BUCKETS, VARIABLES, choose_bucket
+from weather_app.renderers import FastJSONRenderer, ColumnarJSONRenderer, CSVRenderer
+from weather_app.serializers import LocationSerializer, BackfillJobSerializer, hourly_weather_data_rows
 
 
 class WeatherController(APIView):
+    # JSON by default; ?format=columnar or ?format=csv, or the Accept header, choose the others
+    renderer_classes = [FastJSONRenderer, ColumnarJSONRenderer, CSVRenderer, BrowsableAPIRenderer]
 
     def __init__(self):
         self.messages = list()
         self.model_handler = ModelHandler(self.messages)
-        self.meteo_api_handler = MeteoApiHandler(self.messages)
+        self.meteo_api_handler = MeteoApiHandler(self.messages, geocoding_cache=geocoding_cache)
+        self.ingestion_handler = IngestionHandler(self.messages, self.model_handler, self.meteo_api_handler)
+        self.summary_statistics_handler = SummaryStatisticsHandler(self.messages)
+        self.backfill_handler = BackfillHandler(self.messages, self.ingestion_handler)
 
-    def post(self, request):
+    def post(self, request, type=None):
+        if type == 'batch':
+            return self.post_batch(request)
 
         status = 200
         parameters = request.data
@@ -38,46 +60,169 @@ class WeatherController(APIView):
         except Exception as e:
             self.messages.append(f'error : Invalid parameters {e}')
 
+        # 'insert' fails for an already stored city, 'upsert' merges the new hours into it
+        mode = parameters.get('mode', 'insert')
+        update_changed = self.get_flag(parameters, 'update_changed')
+        background = self.get_flag(parameters, 'background')
+        # 'stream' writes the archive answer chunk by chunk and only keeps counts, 'counts' skips echoing rows
+        stream = self.get_flag(parameters, 'stream')
+        if mode not in INGESTION_MODES:
+            self.messages.append(f'error : Invalid mode {mode}')
+        if mode not in INGESTION_MODES or None in (update_changed, background, stream):
+            return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+        # 'background' only queues a job for the process_backfill_jobs workers and answers with its id
+        if background:
+            if None in (start_date, end_date, city_name):
+                return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+            try:
+                job = self.backfill_handler.enqueue(city_name=city_name,
+                                                    start_date=start_date,
+                                                    end_date=end_date,
+                                                    mode=mode,
+                                                    update_changed=update_changed)
+            except ValueError as e:
+                self.messages.append(f'error : Invalid parameters {e}')
+                return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+            return Response({'message': self.messages, 'status': 202,
+                             'result_data': {'job': BackfillJobSerializer(job).data}}, 202)
+        counts_only = stream or parameters.get('response_format', 'rows') == 'counts'
+
         coordinates = self.meteo_api_handler.get_coordinates(city_name=city_name)
-        if coordinates:
-            temperatures, precipitations, times = self.meteo_api_handler.get_hourly_weather_data(
+        if coordinates and stream:
+            location_model, inserted_hours, updated_hours = self.ingestion_handler.ingest_stream(
+                city_name=city_name,
+                coordinates=coordinates,
+                start_date=start_date,
+                end_date=end_date,
+                mode=mode,
+                update_changed=update_changed
+            )
+            if location_model and (inserted_hours or mode == 'upsert'):
+                result_data = {
+                    'location': LocationSerializer(location_model).data,
+                    'inserted_hours': inserted_hours,
+                    'updated_hours': updated_hours
+                }
+            else:
+                self.messages.append('No inserted data in database')
+                result_data = None
+        elif coordinates:
+            date_ranges = self.ingestion_handler.get_date_ranges(city_name, start_date, end_date,
+                                                                 mode, update_changed)
+            temperatures, precipitations, times = self.meteo_api_handler.get_hourly_weather_data_for_ranges(
                                                       latitude=coordinates['lat'],
                                                       longitude=coordinates['lon'],
-                                                      start_date=start_date,
-                                                      end_date=end_date)
-
-            location_model = self.model_handler.insert_location(
-                                          locality=city_name,
-                                          latitude=coordinates['lat'],
-                                          longitude=coordinates['lon'])
-
-            if location_model:
-                hourly_weather_data_models = list()
-                for i in range(len(times)):
-                    hourly_weather_data_model = self.model_handler.insert_hourly_weather_data(
-                        temperature=temperatures[i],
-                        precipitation=precipitations[i],
-                        date=times[i],
-                        location=location_model
-                    )
-                    hourly_weather_data_models.append(hourly_weather_data_model)
+                                                      date_ranges=date_ranges)
 
-            else:
-                hourly_weather_data_models = None
+            location_model, hourly_weather_data_models, updated_models = self.ingestion_handler.store(
+                city_name=city_name,
+                coordinates=coordinates,
+                temperatures=temperatures,
+                precipitations=precipitations,
+                times=times,
+                mode=mode,
+                update_changed=update_changed
+            )
 
-            if location_model and hourly_weather_data_models:
+            result_data = self.ingestion_result_data(location_model, hourly_weather_data_models, updated_models,
+                                                     mode, counts_only)
+        else:
+            self.messages.append('No coordinates for city name')
+            result_data = None
+        response = {
+            'message': self.messages,
+            'status': status,
+            'result_data': result_data
+        }
+        return Response(response, status)
+
+    def get_flag(self, parameters, name: str):
+        """
+        Obtains a boolean parameter of the request, false when missing. Only a JSON boolean is accepted, so
+        "false" or 0 don't turn the option on or off by their truthiness.
+        :param parameters:
+        :param name:
+        :return: the flag, None when it isn't a boolean
+        """
+        value = parameters.get(name, False)
+        if not isinstance(value, bool):
+            self.messages.append(f'error : {name} must be true or false')
+            return None
+        return value
+
+    def ingestion_result_data(self, location_model, hourly_weather_data_models, updated_models, mode,
+                              counts_only):
+        """
+        Builds the result of an ingestion: the stored location with its inserted and updated hours, or
+        only their counts.
+        :param location_model:
+        :param hourly_weather_data_models:
+        :param updated_models:
+        :param mode:
+        :param counts_only:
+        :return:
+        """
+        if location_model and (hourly_weather_data_models or mode == 'upsert') and counts_only:
+            result_data = {
+                'location': LocationSerializer(location_model).data,
+                'inserted_hours': len(hourly_weather_data_models),
+                'updated_hours': len(updated_models)
+            }
+        elif location_model and (hourly_weather_data_models or mode == 'upsert'):
+            with phase('serialize'):
                 location_serialized = LocationSerializer(location_model)
-                hourly_weather_data_serialized = HourlyWeatherDataSerializer(hourly_weather_data_models, many=True)
                 result_data = {
                    'location':  location_serialized.data,
-                   'hourly_weather_data': hourly_weather_data_serialized.data
+                   'hourly_weather_data': hourly_weather_data_rows(hourly_weather_data_models)
                 }
-            else:
-                self.messages.append('No inserted data in database')
-                result_data = None
+                if mode == 'upsert':
+                    result_data['updated_hourly_weather_data'] = hourly_weather_data_rows(updated_models)
         else:
-            self.messages.append('No coordinates for city name')
+            self.messages.append('No inserted data in database')
             result_data = None
+        return result_data
+
+    def post_batch(self, request):
+        status = 200
+        parameters = request.data
+        start_date = None
+        end_date = None
+        city_names = None
+        try:
+            start_date = parameters['start_date']
+            if start_date is None:
+                self.messages.append('error : start_date is null')
+                status = 400
+            end_date = parameters['end_date']
+            if end_date is None:
+                self.messages.append('error : end_date is null')
+                status = 400
+            city_names = parameters['city_names']
+            if not isinstance(city_names, list) or not city_names or \
+                    not all(isinstance(city_name, str) for city_name in city_names):
+                self.messages.append('error : city_names must be a non empty list of names')
+                status = 400
+        except Exception as e:
+            self.messages.append(f'error : Invalid parameters {e}')
+            status = 400
+
+        mode = parameters.get('mode', 'insert')
+        update_changed = self.get_flag(parameters, 'update_changed')
+        if mode not in INGESTION_MODES:
+            self.messages.append(f'error : Invalid mode {mode}')
+            status = 400
+        if update_changed is None:
+            status = 400
+
+        result_data = None
+        if status == 200:
+            result_data = {
+                'cities': self.ingestion_handler.ingest_many(city_names=city_names,
+                                                             start_date=start_date,
+                                                             end_date=end_date,
+                                                             mode=mode,
+                                                             update_changed=update_changed)
+            }
         response = {
             'message': self.messages,
             'status': status,
@@ -85,14 +230,92 @@ class WeatherController(APIView):
         }
         return Response(response, status)
 
-    def get(self, request, type):
+    def get(self, request, type, job_id=None):
+        if type == "cache_stats":
+            return Response({'message': self.messages, 'status': 200, 'result_data': result_cache.stats()}, 200)
+        if type == "backfill_job":
+            job = BackfillJob.objects.filter(id=job_id).first()
+            if job is None:
+                self.messages.append(f'error : Backfill job {job_id} doesnt exist')
+                return Response({'message': self.messages, 'status': 404, 'result_data': None}, 404)
+            return Response({'message': self.messages, 'status': 200,
+                             'result_data': {'job': BackfillJobSerializer(job).data}}, 200)
+        if type == "timeseries":
+            return self.get_timeseries(request)
+
         status = 200
         parameters = request.data
         start_date = None
         end_date = None
         city_name = None
+        city_names = None
         threshold_high = None
         threshold_low = None
+        try:
+            start_date = parameters['start_date']
+            if start_date is None:
+                self.messages.append('error : start_date is null')
+                status = 400
+            end_date = parameters['end_date']
+            if end_date is None:
+                self.messages.append('error : end_date is null')
+                status = 400
+            if type in ("temperature", "precipitation") and 'city_names' in parameters:
+                # several cities are answered with one query, keyed by locality
+                city_names = parameters['city_names']
+                if not isinstance(city_names, list) or not city_names or \
+                        not all(isinstance(city_name, str) for city_name in city_names):
+                    self.messages.append('error : city_names must be a non empty list of names')
+                    status = 400
+            else:
+                city_name = parameters['city_name']
+                if city_name is None:
+                    self.messages.append('error : city_name is null')
+                    status = 400
+            threshold_high = parameters['threshold_high']
+            threshold_low = parameters['threshold_low']
+        except Exception as e:
+            self.messages.append(f'error : Invalid parameters {e}')
+
+        statistics_handler = self.get_statistics_handler(parameters.get('backend'))
+        if statistics_handler is None:
+            return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+
+        if type not in ("temperature", "precipitation", "general_statistics"):
+            self.messages.append('The url doesnt exits')
+            return Response({'message': self.messages, 'status': 404, 'result_data': None}, 404)
+
+        # results depend only on the normalized parameters and the stored rows, ingestion invalidates them
+        cache_parameters, locality, start, end = self.get_cache_parameters(type, city_name, start_date, end_date,
+                                                                           threshold_high, threshold_low,
+                                                                           city_names, parameters.get('backend'))
+        version = result_cache.version(locality, start, end) if status == 200 else None
+        result_data = result_cache.get(type, cache_parameters, version) if status == 200 else None
+        cache_status = 'HIT' if result_data is not None else 'MISS'
+        if result_data is None and city_names is not None and status == 200:
+            result_data = self.calculate_statistics_by_locality(type, statistics_handler, city_names,
+                                                                start_date, end_date,
+                                                                threshold_high, threshold_low)
+        elif result_data is None and city_names is None:
+            result_data = self.calculate_statistics(type, statistics_handler, parameters.get('backend'),
+                                                    city_name, start_date, end_date,
+                                                    threshold_high, threshold_low)
+        if cache_status == 'MISS' and status == 200 and result_data is not None:
+            result_cache.set(type, cache_parameters, result_data, version)
+
+        response = {
+            'message': self.messages,
+            'status': status,
+            'result_data': result_data
+        }
+        return Response(response, status, headers={'X-Cache': cache_status})
+
+    def get_timeseries(self, request):
+        status = 200
+        parameters = request.data
+        start_date = None
+        end_date = None
+        city_name = None
         try:
             start_date = parameters['start_date']
             if start_date is None:
@@ -106,54 +329,249 @@ class WeatherController(APIView):
             if city_name is None:
                 self.messages.append('error : city_name is null')
                 status = 400
-            threshold_high = parameters['threshold_high']
-            threshold_low = parameters['threshold_low']
         except Exception as e:
             self.messages.append(f'error : Invalid parameters {e}')
+            status = 400
 
-        if (type == "temperature"):
-            all_weather_data = self.model_handler.get_all_weather_data()
-            filtered_weather_data = all_weather_data.filter(location__locality=city_name,
-                                                            date__range=(start_date, end_date))
-            temperature_data = self.meteo_api_handler.calculate_temperature_statistics(
-                weather_data=filtered_weather_data,
-                threshold_high=threshold_high,
-                threshold_low=threshold_low
-            )
-            response = {
-                'message': self.messages,
-                'status': status,
-                'result_data': temperature_data
+        bucket = parameters.get('bucket', 'day')
+        aggregates = parameters.get('aggregates', ['mean'])
+        variables = parameters.get('variables', list(VARIABLES))
+        max_points = parameters.get('max_points', settings.WEATHER_TIMESERIES_MAX_POINTS)
+        if bucket not in BUCKETS:
+            self.messages.append(f'error : Invalid bucket {bucket}')
+            status = 400
+        if not isinstance(aggregates, list) or not aggregates or \
+                not all(aggregate in AGGREGATES for aggregate in aggregates):
+            self.messages.append(f'error : aggregates must be a non empty list of {", ".join(AGGREGATES)}')
+            status = 400
+        if not isinstance(variables, list) or not variables or \
+                not all(variable in VARIABLES for variable in variables):
+            self.messages.append(f'error : variables must be a non empty list of {", ".join(VARIABLES)}')
+            status = 400
+        if not isinstance(max_points, int) or max_points < 1:
+            self.messages.append('error : max_points must be a positive integer')
+            status = 400
+
+        statistics_handler = self.get_statistics_handler(parameters.get('backend'))
+        if statistics_handler is None or status != 200:
+            return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+        # pandas has no time buckets, the numpy engine answers them
+        if not isinstance(statistics_handler, DatabaseStatisticsHandler):
+            statistics_handler = ProcessStatisticsHandler(self.messages)
+
+        try:
+            start, end = self.model_handler.get_date_range(start_date, end_date)
+        except Exception as e:
+            self.messages.append(f'error : Invalid date range {e}')
+            return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+        # long ranges are downsampled to coarser buckets instead of answering more points than the cap
+        max_points = min(max_points, settings.WEATHER_TIMESERIES_MAX_POINTS)
+        timeseries_bucket = choose_bucket(start, end, bucket, max_points)
+        if timeseries_bucket is None:
+            self.messages.append(f'error : The date range has more than {max_points} years')
+            return Response({'message': self.messages, 'status': 400, 'result_data': None}, 400)
+
+        start, end = self.model_handler.isoformat_utc(start), self.model_handler.isoformat_utc(end)
+        cache_parameters = {'city_name': city_name, 'start': start, 'end': end, 'bucket': timeseries_bucket,
+                            'aggregates': aggregates, 'variables': variables,
+                            'backend': parameters.get('backend') or settings.WEATHER_STATISTICS_BACKEND}
+        version = result_cache.version(city_name, start, end)
+        result_data = result_cache.get('timeseries', cache_parameters, version)
+        cache_status = 'HIT' if result_data is not None else 'MISS'
+        if result_data is None:
+            weather_data = self.get_weather_data(statistics_handler, city_name, start_date, end_date)
+            with phase('statistics'):
+                points = statistics_handler.calculate_timeseries(weather_data, timeseries_bucket, aggregates,
+                                                                 variables)
+            result_data = {
+                'bucket': timeseries_bucket,
+                'downsampled': timeseries_bucket != bucket,
+                'points': points
             }
-            return Response(response, status)
+            result_cache.set('timeseries', cache_parameters, result_data, version)
+
+        response = {
+            'message': self.messages,
+            'status': status,
+            'result_data': result_data
+        }
+        return Response(response, status, headers={'X-Cache': cache_status})
+
+    def calculate_statistics(self, type, statistics_handler, backend, city_name, start_date, end_date,
+                             threshold_high, threshold_low):
+        """
+        Calculates the statistics of the endpoint type with the statistics handler.
+        :param type:
+        :param statistics_handler:
+        :param backend:
+        :param city_name:
+        :param start_date:
+        :param end_date:
+        :param threshold_high:
+        :param threshold_low:
+        :return:
+        """
+        # whole days are answered from the daily rollup of the row storage unless a backend is requested explicitly
+        daily_summaries = None
+        if type in ("temperature", "precipitation") and backend is None \
+                and self.model_handler.storage == 'rows' and settings.WEATHER_STATISTICS_USE_DAILY_SUMMARY:
+            day_range = self.model_handler.get_whole_day_range(start_date, end_date)
+            if day_range:
+                with phase('load'):
+                    daily_summaries = self.summary_statistics_handler.get_daily_summaries(city_name, *day_range)
+
+        if (type == "temperature"):
+            if daily_summaries:
+                with phase('statistics'):
+                    return self.summary_statistics_handler.calculate_temperature_statistics(
+                        daily_summaries=daily_summaries,
+                        locality=city_name,
+                        threshold_high=threshold_high,
+                        threshold_low=threshold_low
+                    )
+            filtered_weather_data = self.get_weather_data(statistics_handler, city_name, start_date, end_date)
+            with phase('statistics'):
+                return statistics_handler.calculate_temperature_statistics(
+                    weather_data=filtered_weather_data,
+                    threshold_high=threshold_high,
+                    threshold_low=threshold_low
+                )
 
         elif (type == "precipitation"):
-            all_weather_data = self.model_handler.get_all_weather_data()
-            filtered_weather_data = all_weather_data.filter(location__locality=city_name,
-                                                            date__range=(start_date, end_date))
-            precipitation_data = self.meteo_api_handler.calculate_precipitation_statistics(filtered_weather_data)
-            response = {
-                'message': self.messages,
-                'status': status,
-                'result_data': precipitation_data
-            }
-            return Response(response, status)
+            if daily_summaries:
+                with phase('statistics'):
+                    return self.summary_statistics_handler.calculate_precipitation_statistics(daily_summaries)
+            filtered_weather_data = self.get_weather_data(statistics_handler, city_name, start_date, end_date)
+            with phase('statistics'):
+                return statistics_handler.calculate_precipitation_statistics(filtered_weather_data)
 
         elif (type == "general_statistics"):
-            all_weather_data = self.model_handler.get_all_weather_data()
-            general_statistics = self.meteo_api_handler.calculate_general_statistics(
-                weather_data=all_weather_data,
-                threshold_high=threshold_high,
-                threshold_low=threshold_low
-            )
+            # the SQL aggregates have no general statistics, pandas calculates them
+            if not isinstance(statistics_handler, NumpyStatisticsHandler):
+                statistics_handler = self.meteo_api_handler
+            all_weather_data = self.get_weather_data(statistics_handler)
+            with phase('statistics'):
+                return statistics_handler.calculate_general_statistics(
+                    weather_data=all_weather_data,
+                    threshold_high=threshold_high,
+                    threshold_low=threshold_low
+                )
 
-            response = {
-                'message': self.messages,
-                'status': status,
-                'result_data': general_statistics
-            }
-            return Response(response, status)
+    def calculate_statistics_by_locality(self, type, statistics_handler, city_names, start_date, end_date,
+                                         threshold_high, threshold_low):
+        """
+        Calculates the temperature or precipitation statistics of several cities from one scan of their
+        weather data, grouped by location in a single pass.
+        :param type:
+        :param statistics_handler:
+        :param city_names:
+        :param start_date:
+        :param end_date:
+        :param threshold_high:
+        :param threshold_low:
+        :return: dict of statistics by locality, None for a city without weather data
+        """
+        weather_data = self.get_weather_data(statistics_handler, start_date=start_date, end_date=end_date,
+                                             city_names=city_names)
+        with phase('statistics'):
+            if type == "temperature":
+                statistics = statistics_handler.calculate_temperature_statistics_by_location(
+                    weather_data=weather_data,
+                    threshold_high=threshold_high,
+                    threshold_low=threshold_low
+                )
+            else:
+                statistics = statistics_handler.calculate_precipitation_statistics_by_location(weather_data)
+        localities = dict(Location.objects.filter(id__in=list(statistics)).values_list('locality', 'id'))
+
+        statistics_by_locality = dict()
+        for city_name in city_names:
+            statistics_by_locality[city_name] = statistics.get(localities.get(city_name))
+            if statistics_by_locality[city_name] is None:
+                self.messages.append(f'error : No weather data for {city_name}')
+        return statistics_by_locality
+
+    def get_weather_data(self, statistics_handler, city_name=None, start_date=None, end_date=None,
+                         city_names=None):
+        """
+        Obtains the weather data of the locality in the date range, or of every location, in the form the
+        statistics handler takes: the arrays of an HourlySeries for numpy, records for pandas and the SQL
+        aggregates. The columnar storage has no records, pandas gets the DataFrame of its arrays.
+        :param statistics_handler:
+        :param city_name:
+        :param start_date:
+        :param end_date:
+        :param city_names: several localities read with one query instead of city_name
+        :return:
+        """
+        with phase('load'):
+            if isinstance(statistics_handler, NumpyStatisticsHandler):
+                return self.model_handler.get_hourly_series(city_name, start_date, end_date, localities=city_names)
+            if self.model_handler.storage == 'columnar':
+                return self.model_handler.get_hourly_series(city_name, start_date, end_date,
+                                                            localities=city_names).to_frame()
+            if city_names is not None:
+                return self.model_handler.get_weather_data_by_localities(city_names, start_date, end_date)
+            if city_name is None:
+                return self.model_handler.get_all_weather_data()
+            return self.model_handler.get_weather_data_by_locality(city_name, start_date, end_date)
+
+    def get_cache_parameters(self, type, city_name, start_date, end_date, threshold_high, threshold_low,
+                             city_names=None, backend=None):
+        """
+        Normalizes the parameters a statistics result depends on, the backend calculating it included. Results
+        of several cities are not tied to one locality, any ingestion invalidates them.
+        :return: tuple with the parameters, the locality and the ISO date range of the result
+        """
+        backend = backend or settings.WEATHER_STATISTICS_BACKEND
+        thresholds = list()
+        for threshold in (threshold_high, threshold_low):
+            try:
+                thresholds.append(None if threshold is None else float(threshold))
+            except (TypeError, ValueError):
+                thresholds.append(str(threshold))
+        if type == "general_statistics":
+            cache_parameters = {'threshold_high': thresholds[0], 'threshold_low': thresholds[1], 'backend': backend}
+            return cache_parameters, None, None, None
+        try:
+            start, end = (self.model_handler.isoformat_utc(bound) for bound in
+                          self.model_handler.get_date_range(start_date, end_date))
+        except Exception:
+            start, end = str(start_date), str(end_date)
+        cache_parameters = {'city_name': city_name, 'start': start, 'end': end}
+        if city_names is not None:
+            cache_parameters = {'city_names': city_names, 'start': start, 'end': end}
+        cache_parameters['backend'] = backend
+        if type == "temperature":
+            cache_parameters.update(threshold_high=thresholds[0], threshold_low=thresholds[1])
+        return cache_parameters, city_name, start, end
+
+    def get_statistics_handler(self, backend=None):
+        """
+        Obtains the handler calculating the statistics: the numpy engine of NumpyStatisticsHandler, run in the
+        process pool for large series by ProcessStatisticsHandler, the pandas calculations of MeteoApiHandler
+        or the SQL aggregates of DatabaseStatisticsHandler.
+        :param backend: 'numpy', 'pandas' or 'database', WEATHER_STATISTICS_BACKEND when None
+        :return:
+        """
+        backend = backend or settings.WEATHER_STATISTICS_BACKEND
+        if backend == 'numpy':
+            return ProcessStatisticsHandler(self.messages)
+        if backend == 'pandas':
+            return self.meteo_api_handler
+        if backend == 'database' and self.model_handler.storage == 'columnar':
+            self.messages.append("error : backend database needs WEATHER_STORAGE_BACKEND 'rows'")
+            return None
+        if backend == 'database':
+            return DatabaseStatisticsHandler(self.messages)
+        self.messages.append(f'error : Invalid backend {backend}')
+        return None
 
-        else:
-            self.messages.append('The url doesnt exits')
 
+def metrics_view(request):
+    """
+    Answers the request metrics of this process in the Prometheus text exposition format.
+    :param request:
+    :return:
+    """
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
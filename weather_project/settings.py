@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'weather_app.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -122,3 +124,111 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Weather app ingestion
+# Number of hourly rows written per INSERT when loading archive data.
+
+WEATHER_INGEST_BATCH_SIZE = 500
+# Days requested per archive call by the streaming ingestion, bounds the memory of one request
+WEATHER_STREAM_WINDOW_DAYS = 31
+# Threads fetching the cities of one batch ingestion request
+WEATHER_INGEST_MAX_WORKERS = 8
+
+# Storage of the hourly series: 'rows' keeps one HourlyWeatherData row per hour, 'columnar' keeps month
+# blocks of float32 arrays per location (HourlySeriesBlock), decoded rounded to WEATHER_COLUMNAR_DECIMALS.
+# The daily rollup and the 'database' statistics backend need the rows.
+WEATHER_STORAGE_BACKEND = 'rows'
+WEATHER_COLUMNAR_DECIMALS = 2
+
+# Background backfill jobs: worker processes of process_backfill_jobs, seconds a worker holds a job without
+# committing a chunk before another worker can resume it, claims of a job before failing it, seconds before
+# a job with a failed chunk is retried and seconds waited by an idle worker.
+WEATHER_BACKFILL_WORKERS = 2
+WEATHER_BACKFILL_LEASE_SECONDS = 300
+WEATHER_BACKFILL_MAX_ATTEMPTS = 5
+WEATHER_BACKFILL_RETRY_DELAY = 60
+WEATHER_BACKFILL_POLL_INTERVAL = 5
+
+# Geocoding cache: entries kept in the per-process LRU and lifetime in seconds of the coordinates
+# found and of the names without results (0 never expires).
+
+GEOCODING_CACHE_SIZE = 1024
+GEOCODING_CACHE_TTL = 30 * 24 * 3600
+GEOCODING_NEGATIVE_CACHE_TTL = 24 * 3600
+
+# Open Meteo APIs and the pooled HTTP client used to call them. Timeouts are in seconds and
+# retries back off exponentially (backoff factor * 2 ** retry) on 429 and 5xx answers.
+
+OPEN_METEO_GEOCODING_URL = 'https://geocoding-api.open-meteo.com/v1/search'
+OPEN_METEO_ARCHIVE_URL = 'https://archive-api.open-meteo.com/v1/archive'
+# Coordinates sent in one archive request when loading many locations
+OPEN_METEO_ARCHIVE_MAX_LOCATIONS = 10
+# Long archive requests are split in chunks ('month', 'year' or a number of days) fetched by a pool of
+# threads, a failed chunk is retried on its own before being left out of the answer
+OPEN_METEO_ARCHIVE_CHUNK = 'year'
+OPEN_METEO_ARCHIVE_CHUNK_WORKERS = 4
+OPEN_METEO_ARCHIVE_CHUNK_RETRIES = 2
+HTTP_CLIENT_POOL_SIZE = 10
+HTTP_CLIENT_CONNECT_TIMEOUT = 5
+HTTP_CLIENT_READ_TIMEOUT = 60
+HTTP_CLIENT_MAX_RETRIES = 3
+HTTP_CLIENT_BACKOFF_FACTOR = 0.5
+# Upstream requests in flight at the same time in the whole process, to stay under the Open Meteo rate limits
+HTTP_CLIENT_MAX_CONCURRENCY = 8
+# Upstream requests in flight at the same time from the event loop of the async views (weather_app/async/...),
+# sent with httpx without holding a thread
+HTTP_CLIENT_ASYNC_MAX_CONCURRENCY = 200
+# Threads running the ORM work and the statistics of the async views
+WEATHER_ASYNC_EXECUTOR_WORKERS = 16
+
+# Weather app statistics: 'numpy' reduces the arrays of the hourly series, 'pandas' loads the rows in a DataFrame,
+# 'database' computes SQL aggregates. All of them answer the same JSON, a request can choose with the 'backend'
+# parameter.
+
+WEATHER_STATISTICS_BACKEND = 'numpy'
+# Answer the statistics of whole days from the DailyWeatherSummary rollup when it covers the range.
+WEATHER_STATISTICS_USE_DAILY_SUMMARY = True
+# Points of a timeseries response at most, a range with more buckets is answered with coarser buckets.
+WEATHER_TIMESERIES_MAX_POINTS = 2000
+# Processes computing the numpy statistics of series with WEATHER_STATISTICS_PROCESS_MIN_ROWS hours or more,
+# the arrays are shared with them through shared memory and the locations split between them. 0 disables them,
+# a single core gains nothing from them.
+WEATHER_STATISTICS_PROCESSES = min(4, os.cpu_count() or 1) if (os.cpu_count() or 1) > 1 else 0
+WEATHER_STATISTICS_PROCESS_MIN_ROWS = 500000
+
+# Cache of the statistics endpoint results, keyed on a version of the rows they depend on that is stored in the
+# database and bumped by their ingestion, so a write in any process outdates the results cached by every process.
+# BACKEND: 'local' (per process LRU), 'file' (LOCATION is a directory), 'django' (LOCATION is a CACHES alias)
+# or None to disable it.
+
+WEATHER_RESULT_CACHE = {
+    'BACKEND': 'local',
+    'MAX_ENTRIES': 1024,
+    'LOCATION': None,
+}
+
+# Request instrumentation: every request is counted in the metrics of /weather_app/metrics/ (Prometheus text),
+# SAMPLE_RATE of them also record the time of their phases (upstream, db, load, dataframe, statistics, serialize),
+# answered in a Server-Timing header (SERVER_TIMING) and a JSON line of the weather_app.middleware logger (LOG),
+# written at INFO level so LOGGING decides where the lines go and whether they are written at all.
+
+WEATHER_INSTRUMENTATION = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,
+    'SERVER_TIMING': True,
+    'LOG': True,
+    # query string and JSON body in the log line, a request log for the load_test command
+    'LOG_BODY': False,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'weather_app.middleware': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}